@@ -0,0 +1,285 @@
+########################################################################################
+#
+# File
+#	accumulators.py
+#
+# Description
+#	This file contains streaming accumulators for the samples of many runs.
+#	The moments are folded with Welford's update, the extrema keep the run
+#	that produced them and the quantiles are kept in a sketch of logarithmic
+#	buckets with a bounded relative error. All of them use constant memory
+#	and can be merged, so partial results of workers or of new runs are
+#	combined without keeping the samples
+#
+########################################################################################
+
+import numpy as np
+from math import sqrt, log, ceil
+
+# Relative error of the quantiles and the most buckets a sketch keeps
+SKETCH_ACCURACY = 0.005
+SKETCH_BUCKETS = 2048
+
+# Magnitudes below this are counted as zero by the sketch
+SKETCH_ZERO = 1e-9
+
+class moment_stats(object):
+	""" Count, mean, deviation and extrema, with their runs, of a stream of samples """
+
+	def __init__(self):
+		self.count = 0
+		self.mean = 0.0
+		self.m2 = 0.0
+		self.min = self.max = None
+		self.min_file = self.max_file = None
+
+		return
+
+	def add(self, value, run):
+		""" Fold a single sample into the aggregates """
+
+		value = float(value)
+
+		# Welford's update of the mean and the sum of squared deviations
+		self.count += 1
+		delta = value - self.mean
+		self.mean += delta / self.count
+		self.m2 += delta * (value - self.mean)
+
+		if self.max is None or value > self.max:
+			self.max = value
+			self.max_file = run
+
+		if self.min is None or value < self.min:
+			self.min = value
+			self.min_file = run
+
+		return
+
+	def add_array(self, values, runs):
+		""" Fold the samples of many runs at once """
+
+		values = np.asarray(values, dtype = np.float64)
+
+		if len(values) == 0:
+			return
+
+		# Summarize the block and merge it like the result of another worker
+		block = moment_stats()
+		block.count = len(values)
+		block.mean = float(np.mean(values))
+		block.m2 = float(np.sum((values - block.mean) ** 2))
+
+		high = np.argmax(values)
+		low = np.argmin(values)
+		block.max, block.max_file = float(values[high]), int(runs[high])
+		block.min, block.min_file = float(values[low]), int(runs[low])
+
+		self.merge(block)
+
+		return
+
+	def merge(self, other):
+		""" Fold the aggregates of another moment_stats into these """
+
+		if other.count == 0:
+			return
+
+		# Chan's pairwise combination of the means and squared deviations
+		count = self.count + other.count
+		delta = other.mean - self.mean
+		self.mean += delta * other.count / count
+		self.m2 += other.m2 + delta * delta * self.count * other.count / count
+		self.count = count
+
+		# Ties keep the run seen first
+		if self.max is None or other.max > self.max:
+			self.max, self.max_file = other.max, other.max_file
+
+		if self.min is None or other.min < self.min:
+			self.min, self.min_file = other.min, other.min_file
+
+		return
+
+	def std(self):
+		""" Return the population standard deviation of the samples """
+
+		return sqrt(self.m2 / self.count) if self.count else 0.0
+
+	def text(self, name):
+		""" Return ' | <name> mean (std) [max @ run] (min @ run)' for the samples """
+
+		return ' | <%s> %.3f (%.3f) [%.3f @ %d] (%.3f @ %d)' % (name, self.mean, self.std(), self.max, self.max_file, self.min, self.min_file)
+
+class quantile_sketch(object):
+	""" Counts of the samples in logarithmic buckets. Every quantile is found
+	    within a relative error of 'accuracy' until more than 'buckets' buckets
+	    are needed, when the smallest buckets are folded together """
+
+	def __init__(self, accuracy = SKETCH_ACCURACY, buckets = SKETCH_BUCKETS):
+		self.accuracy = accuracy
+		self.buckets = buckets
+		self.gamma = (1 + accuracy) / (1 - accuracy)
+		self.log_gamma = log(self.gamma)
+
+		# Counts by bucket index of the positive samples and of the magnitude
+		# of the negative samples
+		self.positive = {}
+		self.negative = {}
+		self.zero = 0
+		self.count = 0
+
+		return
+
+	def bucket_values(self, indexes):
+		""" Return the value standing for every bucket index """
+
+		return 2 * np.power(self.gamma, np.asarray(indexes, dtype = np.float64)) / (self.gamma + 1)
+
+	def add_array(self, values):
+		""" Fold many samples into the buckets """
+
+		values = np.asarray(values, dtype = np.float64)
+
+		for store, magnitudes in ((self.positive, values[values >= SKETCH_ZERO]), (self.negative, -values[values <= -SKETCH_ZERO])):
+			if len(magnitudes) == 0:
+				continue
+
+			indexes, counts = np.unique(np.ceil(np.log(magnitudes) / self.log_gamma).astype(np.int64), return_counts = True)
+			for index, count in zip(indexes.tolist(), counts.tolist()):
+				store[index] = store.get(index, 0) + count
+
+			self.collapse(store)
+
+		self.zero += int(np.count_nonzero(np.abs(values) < SKETCH_ZERO))
+		self.count += len(values)
+
+		return
+
+	def add(self, value):
+		""" Fold a single sample into the buckets """
+
+		self.add_array([value])
+
+		return
+
+	def merge(self, other):
+		""" Fold the buckets of another sketch of the same accuracy into these """
+
+		if other.gamma != self.gamma:
+			raise ValueError, 'Sketches of different accuracies (%g, %g) can not be merged' % (self.accuracy, other.accuracy)
+
+		for store, counts in ((self.positive, other.positive), (self.negative, other.negative)):
+			for index, count in counts.items():
+				store[index] = store.get(index, 0) + count
+
+			self.collapse(store)
+
+		self.zero += other.zero
+		self.count += other.count
+
+		return
+
+	def collapse(self, store):
+		""" Fold the buckets of the smallest magnitudes into one until the store
+		    fits, which only loses accuracy close to zero """
+
+		if len(store) <= self.buckets:
+			return
+
+		indexes = sorted(store)
+		folded = indexes[:len(indexes) - self.buckets + 1]
+		store[folded[-1]] = sum([store.pop(index) for index in folded])
+
+		return
+
+	def histogram(self):
+		""" Return the bucket values and counts in increasing order of value """
+
+		negative = sorted(self.negative, reverse = True)
+		positive = sorted(self.positive)
+
+		values = np.concatenate((-self.bucket_values(negative), [0.0] if self.zero else [], self.bucket_values(positive)))
+		counts = np.array([self.negative[index] for index in negative] + ([self.zero] if self.zero else []) + [self.positive[index] for index in positive], dtype = np.int64)
+
+		return values, counts
+
+	def quantiles(self, fractions):
+		""" Return the values at the given fractions of the samples, using the
+		    same ranks as np.percentile without interpolation """
+
+		if self.count == 0:
+			return np.zeros(len(fractions)) * np.nan
+
+		values, counts = self.histogram()
+		ranks = np.round(np.asarray(fractions, dtype = np.float64) * (self.count - 1))
+
+		return values[np.searchsorted(np.cumsum(counts), ranks, side = 'right')]
+
+class run_summary(object):
+	""" The moments, extrema and quantile sketch of the samples of some runs """
+
+	def __init__(self, values = None, runs = None):
+		self.moments = moment_stats()
+		self.sketch = quantile_sketch()
+
+		if values is not None:
+			self.add_array(values, runs)
+
+		return
+
+	def __len__(self):
+		return self.moments.count
+
+	def add(self, value, run):
+		""" Fold the sample of a single run """
+
+		self.moments.add(value, run)
+		self.sketch.add(value)
+
+		return
+
+	def add_array(self, values, runs):
+		""" Fold the samples of many runs at once """
+
+		self.moments.add_array(values, runs)
+		self.sketch.add_array(values)
+
+		return
+
+	def merge(self, other):
+		""" Fold another run_summary into this one """
+
+		self.moments.merge(other.moments)
+		self.sketch.merge(other.sketch)
+
+		return
+
+	def quantiles(self, fractions):
+		""" Return the sketched quantiles, kept within the seen extrema """
+
+		return np.clip(self.sketch.quantiles(fractions), self.moments.min, self.moments.max)
+
+	def box_stats(self, whis = 1.5):
+		""" Return the box-and-whisker statistics and the extrema of the samples
+		    in the keys used by matplotlib's bxp. The whiskers reach the furthest
+		    bucket within 'whis' times the IQR of the box and the buckets beyond
+		    it are fliers """
+
+		q1, med, q3 = self.quantiles([0.25, 0.5, 0.75])
+		low = q1 - whis * (q3 - q1)
+		high = q3 + whis * (q3 - q1)
+
+		values, counts = self.sketch.histogram()
+		values = np.clip(values, self.moments.min, self.moments.max)
+		inside = values[(values >= low) & (values <= high)]
+
+		return {"mean" : self.moments.mean, "med" : med, "q1" : q1, "q3" : q3,
+			"whislo" : min(inside.min(), q1) if len(inside) else q1, "whishi" : max(inside.max(), q3) if len(inside) else q3,
+			"min" : self.moments.min, "max" : self.moments.max,
+			"fliers" : values[(values < low) | (values > high)]}
+
+	def text(self, name):
+		""" Return ' | <name> mean (std) [max @ run] (min @ run)' for the summarized runs """
+
+		return self.moments.text(name)
@@ -0,0 +1,287 @@
+########################################################################################
+#
+# File
+#	benchmark.py
+#
+# Description
+#	This file contains a benchmark of the analysis scripts themselves. The
+#	parse, aggregate and render stages of 'mem_plots', 'mem_colors_single',
+#	'mem_bins' and 'mem_accesses' are timed separately on a synthetic data
+#	tree, and the timings can be stored and compared against a baseline
+#
+########################################################################################
+
+import sys, getopt
+import os
+import json
+import shutil
+import tempfile
+from timeit import default_timer as timer
+
+import leaf_cache
+import figure_manifest
+from leaf_cache import load_perf_leaf, load_color_leaf, leaf_runs
+from results import perf_result, color_result, performance_result
+from mem_plots import performance_utilizations, plot_performance_boxplots
+from mem_colors_single import clr_std_matrix, plot_clr_figure, ALLD_COLORS
+from mem_bins import mem_color, mem_page, bins_histogram_plot
+from mem_accesses import advanced_analysis
+from render_pipeline import queue_render, flush_renders
+from worker_pool import close_pool
+from synth_data import write_tree, write_mempages
+
+# The stages timed for every script
+STAGES = ['parse', 'aggregate', 'render']
+
+# Stages faster than this many seconds are too noisy to count as regressions
+NOISE_FLOOR = 0.005
+
+def timed(times, stage, function, *args):
+	""" Call a function, add its run time to the stage and return its result """
+
+	start = timer()
+	result = function(*args)
+	times[stage] = times.get(stage, 0.0) + timer() - start
+
+	return result
+
+def bench_mem_plots(platform, jobs):
+	""" Time the boxplots of all the utilizations of a corun directory """
+
+	times = {}
+	parent_dir = '../data/%s/BW/UN/PL/PF/00/' % (platform)
+	platform_name, utilization = performance_utilizations(parent_dir)
+
+	leaves = [timed(times, 'parse', load_perf_leaf, parent_dir + util + '/', platform_name, leaf_runs(parent_dir + util + '/'), jobs) for util in utilization]
+
+	performance = performance_result()
+	for util, leaf in zip(utilization, leaves):
+		timed(times, 'aggregate', performance.add, util, perf_result(leaf["runs"], leaf["accesses"], leaf["misses"], leaf["time"]))
+
+	timed(times, 'render', plot_performance_boxplots, parent_dir, False, performance)
+	timed(times, 'render', flush_renders, jobs)
+
+	return times
+
+def bench_mem_colors_single(platform, jobs):
+	""" Time the PDF of the color distribution of a single leaf """
+
+	times = {}
+	parent_dir = '../data/%s/BW/UN/PL/CL/00/100/' % (platform)
+
+	leaf = timed(times, 'parse', load_color_leaf, parent_dir, leaf_runs(parent_dir), jobs)
+
+	alld_clr_pages, rest_clr_pages, std_clr_pages = timed(times, 'aggregate', clr_std_matrix, leaf["pages"], leaf["colors"], ALLD_COLORS)
+	result = color_result(leaf["runs"], leaf["total_pages"], alld_clr_pages, rest_clr_pages, std_clr_pages)
+
+	timed(times, 'render', plot_clr_figure, parent_dir, False, result)
+	timed(times, 'render', flush_renders, jobs)
+
+	return times
+
+def bench_mem_bins(platform, jobs):
+	""" Time the bin histograms of the first and last runs of a leaf """
+
+	times = {}
+	parent_dir = '../data/%s/BW/UN/PL/CL/00/100/' % (platform)
+	runs = leaf_runs(parent_dir)
+
+	for bins_type, run in (('MN', runs[0]), ('MX', runs[-1])):
+		color = timed(times, 'parse', mem_color, parent_dir + str(run))
+		page = timed(times, 'parse', mem_page, (parent_dir + str(run)).replace('CL', 'PF'), platform)
+
+		miss_rate = timed(times, 'aggregate', lambda : (float(page.misses) / page.accesses) * 100)
+
+		figname = '../figs/' + ('_'.join(parent_dir.split('/')[2:]))[:-1] + '_' + bins_type + '.png'
+		timed(times, 'render', queue_render, bins_histogram_plot, figname, '', list(color.alld_pages), miss_rate, page.time, color.std_clr_pages)
+
+	timed(times, 'render', flush_renders, jobs)
+
+	return times
+
+def bench_mem_accesses(platform, jobs):
+	""" Time the join of the memory page profile with the memory areas """
+
+	times = {}
+	analysis = advanced_analysis('../data_1/mempages.dat.out', analyze = False)
+
+	timed(times, 'parse', analysis.parse)
+	timed(times, 'parse', analysis.parse_memareas)
+
+	index = timed(times, 'aggregate', analysis.index_areas)
+
+	# The binary pages and the summary are the output of this script
+	timed(times, 'render', analysis.store_data, index)
+	timed(times, 'render', analysis.summarize, index)
+
+	return times
+
+# The benchmarked scripts in the order of the report
+BENCHMARKS = [
+	('mem_plots', bench_mem_plots),
+	('mem_colors_single', bench_mem_colors_single),
+	('mem_bins', bench_mem_bins),
+	('mem_accesses', bench_mem_accesses),
+]
+
+def run_benchmarks(platform, jobs, repeat, warm):
+	""" Return the best time of every stage of every script over 'repeat' rounds """
+
+	# Cold runs parse every text file, warm runs read the leaf cache
+	leaf_cache.cache_enabled = warm
+
+	# Every round draws all of its figures
+	figure_manifest.tracking_enabled = False
+
+	if warm:
+		for name, function in BENCHMARKS:
+			function(platform, jobs)
+
+	best = {}
+	for index in range(repeat):
+		for name, function in BENCHMARKS:
+			times = function(platform, jobs)
+			times["total"] = sum(times.values())
+
+			for stage, value in times.items():
+				best.setdefault(name, {})[stage] = min(value, best.get(name, {}).get(stage, value))
+
+	return best
+
+def print_report(best, baseline, tolerance):
+	""" Print the timings next to the baseline and return the regressed entries """
+
+	regressions = []
+
+	print '%-20s' % ('Script') + ''.join(['%12s' % (stage) for stage in STAGES + ['total']])
+
+	for name, function in BENCHMARKS:
+		line = '%-20s' % (name)
+
+		for stage in STAGES + ['total']:
+			if stage not in best[name]:
+				line += '%12s' % ('-')
+				continue
+
+			line += '%11.3fs' % (best[name][stage])
+
+		print line
+
+		# Show the change against the baseline on a second line
+		if baseline is None or name not in baseline:
+			continue
+
+		line = '%-20s' % ('  vs baseline')
+		for stage in STAGES + ['total']:
+			if stage not in best[name] or not baseline[name].get(stage):
+				line += '%12s' % ('-')
+				continue
+
+			ratio = best[name][stage] / baseline[name][stage]
+			line += '%11.2fx' % (ratio)
+
+			if ratio > 1 + tolerance and best[name][stage] > NOISE_FLOOR:
+				regressions.append('%s.%s' % (name, stage))
+
+		print line
+
+	return regressions
+
+def main(argv):
+
+	# Create an internal help function for printing help information
+	def help():
+
+		print 'benchmark.py [-d <root>] [-p <platform>] [-r <runs>] [-m <pages>] [-n <repeat>] [-j <jobs>] [-w] [-o <file>] [-b <file> [-t <tolerance>]]'
+		print 'Times the parse, aggregate and render stages of the scripts and reports the best of <repeat> rounds'
+		print 'Without -d a synthetic tree of <runs> runs per leaf and <pages> memory pages is generated in a temporary directory'
+		print 'Use -w to time the parse stage on a filled leaf cache instead of the text files'
+		print 'Use -o to store the timings and -b to compare them against stored timings, failing when a stage'
+		print 'is slower than the baseline by more than <tolerance> (default 0.2 for 20%)'
+
+		return
+
+	# Assign default values to command line arguments
+	root		= None
+	platform	= 'TG'
+	runs		= 250
+	pages		= 100000
+	repeat		= 3
+	jobs		= 1
+	warm		= False
+	output		= None
+	baseline	= None
+	tolerance	= 0.2
+
+	try:
+		opts, args = getopt.getopt(argv, "hd:p:r:m:n:j:wo:b:t:", ["root=", "platform=", "runs=", "mempages=", "repeat=", "jobs=", "warm", "output=", "baseline=", "tolerance="])
+	except:
+		help()
+		sys.exit(2)
+
+	for opt, arg in opts:
+		if opt == '-h':
+			help()
+			sys.exit()
+		elif opt in ("-d", "--root"):
+			root = os.path.abspath(arg)
+		elif opt in ("-p", "--platform"):
+			platform = arg
+		elif opt in ("-r", "--runs"):
+			runs = int(arg)
+		elif opt in ("-m", "--mempages"):
+			pages = int(arg)
+		elif opt in ("-n", "--repeat"):
+			repeat = int(arg)
+		elif opt in ("-j", "--jobs"):
+			jobs = int(arg)
+		elif opt in ("-w", "--warm"):
+			warm = True
+		elif opt in ("-o", "--output"):
+			output = os.path.abspath(arg)
+		elif opt in ("-b", "--baseline"):
+			with open(arg, 'r') as fdi:
+				baseline = json.load(fdi)
+		elif opt in ("-t", "--tolerance"):
+			tolerance = float(arg)
+
+	# Generate a synthetic tree unless an existing one was given
+	temp_root = None
+	if root is None:
+		root = temp_root = tempfile.mkdtemp(prefix = 'membench')
+		write_tree(root, [platform], coruns = ['00'], runs = runs)
+		write_mempages(root, pages = pages)
+
+	# The scripts address the tree relative to a sibling of 'data'
+	work_dir = os.path.join(root, 'scripts')
+	for path in (work_dir, os.path.join(root, 'figs')):
+		if not os.path.isdir(path):
+			os.makedirs(path)
+
+	cwd = os.getcwd()
+	os.chdir(work_dir)
+
+	try:
+		best = run_benchmarks(platform, jobs, repeat, warm)
+	finally:
+		close_pool()
+		os.chdir(cwd)
+
+		if temp_root is not None:
+			shutil.rmtree(temp_root)
+
+	regressions = print_report(best, baseline, tolerance)
+
+	if output is not None:
+		with open(output, 'w') as fdo:
+			json.dump(best, fdo, indent = 1, sort_keys = True)
+
+	if regressions:
+		print 'Regressions : %s' % (', '.join(regressions))
+		sys.exit(1)
+
+	return
+
+if __name__ == "__main__":
+	# Invoke the main function
+	main(sys.argv[1:])
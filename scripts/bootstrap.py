@@ -0,0 +1,163 @@
+########################################################################################
+#
+# File
+#	bootstrap.py
+#
+# Description
+#	This file contains the bootstrap confidence intervals of the run statistics.
+#	The resamples of a leaf are drawn as index matrices of a bounded size
+#	from a seeded generator and reduced along their rows, and the leaves are
+#	spread over the worker processes, so no statistic is computed in a
+#	per-sample loop. A leaf kept as a run_summary is resampled from the
+#	buckets of its sketch
+#
+########################################################################################
+
+import os
+import zlib
+import numpy as np
+
+from worker_pool import pool_map
+from accumulators import run_summary
+
+# Number of resamples, confidence level and seed of the bootstrap
+BOOTSTRAP_SAMPLES = 2000
+BOOTSTRAP_CONFIDENCE = 0.95
+BOOTSTRAP_SEED = 1
+
+# Samples drawn at a time, which bounds the memory used for a leaf of any
+# size. A block holds at least one resample
+BOOTSTRAP_ELEMENTS = 1 << 20
+
+# The statistics given an interval, as quantiles of the sorted samples
+STATISTICS = ['mean', 'median', 'p95']
+QUANTILES = {'median' : 0.5, 'p95' : 0.95}
+
+def sorted_quantile(rows, quantile):
+	""" Return the linearly interpolated quantile of every sorted row """
+
+	position = quantile * (rows.shape[1] - 1)
+	low = int(np.floor(position))
+	high = int(np.ceil(position))
+
+	return rows[:, low] + (rows[:, high] - rows[:, low]) * (position - low)
+
+def row_statistics(rows):
+	""" Return a hash of statistic -> value of every row of a samples matrix """
+
+	rows = np.sort(rows, axis = 1)
+	statistics = {'mean' : rows.mean(axis = 1)}
+
+	for name, quantile in QUANTILES.items():
+		statistics[name] = sorted_quantile(rows, quantile)
+
+	return statistics
+
+def bootstrap_intervals(values, samples = BOOTSTRAP_SAMPLES, confidence = BOOTSTRAP_CONFIDENCE, seed = BOOTSTRAP_SEED):
+	""" Return a hash of statistic -> (estimate, low, high) holding the percentile
+	    bootstrap interval of every statistic of the samples in 'values' """
+
+	values = np.asarray(values, dtype = np.float64)
+	estimates = row_statistics(values[np.newaxis, :])
+
+	if len(values) < 2:
+		return dict((name, (estimates[name][0],) * 3) for name in STATISTICS)
+
+	# Draw the resamples of all statistics from the same seeded indices
+	generator = np.random.RandomState(seed)
+	resampled = dict((name, np.empty(samples)) for name in STATISTICS)
+
+	rows = block_rows(len(values), samples)
+	for start in range(0, samples, rows):
+		count = min(rows, samples - start)
+		statistics = row_statistics(values[generator.randint(0, len(values), size = (count, len(values)))])
+
+		for name in STATISTICS:
+			resampled[name][start:start + count] = statistics[name]
+
+	tail = (1 - confidence) / 2 * 100
+	intervals = {}
+	for name in STATISTICS:
+		low, high = np.percentile(resampled[name], [tail, 100 - tail])
+		intervals[name] = (estimates[name][0], low, high)
+
+	return intervals
+
+def histogram_statistics(values, weights):
+	""" Return a hash of statistic -> value of every row of a matrix of the
+	    counts of the bucket 'values', with the ranks of the sketch quantiles """
+
+	total = weights[0].sum()
+	cumulative = np.cumsum(weights, axis = 1)
+	statistics = {'mean' : weights.dot(values) / total}
+
+	for name, quantile in QUANTILES.items():
+		statistics[name] = values[np.sum(cumulative <= round(quantile * (total - 1)), axis = 1)]
+
+	return statistics
+
+def summary_intervals(summary, samples = BOOTSTRAP_SAMPLES, confidence = BOOTSTRAP_CONFIDENCE, seed = BOOTSTRAP_SEED):
+	""" Return the intervals of bootstrap_intervals for the runs of a
+	    run_summary. Every resample draws the counts of the buckets of its
+	    sketch from the multinomial of the seen counts """
+
+	median, p95 = summary.quantiles([QUANTILES['median'], QUANTILES['p95']])
+	estimates = {'mean' : summary.moments.mean, 'median' : median, 'p95' : p95}
+
+	if len(summary) < 2:
+		return dict((name, (estimates[name],) * 3) for name in STATISTICS)
+
+	values, counts = summary.sketch.histogram()
+	values = np.clip(values, summary.moments.min, summary.moments.max)
+
+	# Draw the bucket counts of all statistics from the same seeded generator
+	generator = np.random.RandomState(seed)
+	resampled = dict((name, np.empty(samples)) for name in STATISTICS)
+
+	rows = block_rows(len(values), samples)
+	for start in range(0, samples, rows):
+		count = min(rows, samples - start)
+		statistics = histogram_statistics(values, generator.multinomial(counts.sum(), counts / float(counts.sum()), size = count))
+
+		for name in STATISTICS:
+			resampled[name][start:start + count] = statistics[name]
+
+	tail = (1 - confidence) / 2 * 100
+	intervals = {}
+	for name in STATISTICS:
+		low, high = np.percentile(resampled[name], [tail, 100 - tail])
+		intervals[name] = (estimates[name], low, high)
+
+	return intervals
+
+def block_rows(width, samples):
+	""" Return the number of resamples of 'width' samples drawn at a time """
+
+	return min(samples, max(1, BOOTSTRAP_ELEMENTS / width))
+
+def leaf_seed(leaf_dir, metric):
+	""" Return the seed of the resamples of a metric of a leaf, which only
+	    depends on the leaf and the metric """
+
+	return zlib.crc32('%s:%s' % (os.path.normpath(leaf_dir), metric), BOOTSTRAP_SEED) & 0xffffffff
+
+def bootstrap_job(job):
+	""" Pool job for the intervals of a single (values, seed) leaf """
+
+	if isinstance(job[0], run_summary):
+		return summary_intervals(job[0], seed = job[1])
+
+	return bootstrap_intervals(job[0], seed = job[1])
+
+def bootstrap_leaves(leaves, keys, jobs = 1):
+	""" Return the intervals of every array of samples or run_summary in
+	    'leaves', computed by 'jobs' worker processes. Every array is resampled with the seed of its
+	    (leaf directory, metric) key in 'keys', so its intervals do not depend
+	    on the other leaves or the number of jobs """
+
+	return pool_map(bootstrap_job, [(values, leaf_seed(*key)) for values, key in zip(leaves, keys)], jobs)
+
+def interval_text(name, intervals):
+	""" Return ' | <name> mean [low, high] ...' for the intervals of a leaf """
+
+	return ' | <%s>' % (name) + ''.join([' %s [%.3f, %.3f]' % (statistic, intervals[statistic][1], intervals[statistic][2]) for statistic in STATISTICS])
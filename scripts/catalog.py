@@ -0,0 +1,229 @@
+########################################################################################
+#
+# File
+#	catalog.py
+#
+# Description
+#	This file contains a queryable catalog of the data tree. Every leaf of the
+#	nomenclature tree is indexed in an SQLite database with its dimensions, run
+#	count, byte size and modification time. Rescans only re-read the archived
+#	and packed leaves that have been rewritten, and queries never touch the
+#	data tree
+#
+########################################################################################
+
+import sys, getopt
+import os
+import re
+import time
+import sqlite3
+
+from data_source import leaf_source, storage, storage_mtime, ARCHIVE_SUFFIXES, DATA_ROOT, CACHE_ROOT
+from data_pack import open_pack, name_order, PACK_SUFFIX
+
+# Location of the catalog database
+CATALOG_FILE = os.path.join(CACHE_ROOT, 'catalog.db')
+
+# Levels of the data tree, from the root down to the leaves
+DIMENSIONS = ['platform', 'benchmark', 'linux', 'buddy', 'data', 'corun', 'utilization']
+
+# Comparisons accepted in a query value, e.g. '>=02'
+compare_regex = re.compile(r'^(>=|<=|!=|>|<|=)(.*)$')
+
+def open_catalog(filename = CATALOG_FILE):
+	""" Open the catalog database, creating its table on first use """
+
+	catalog_dir = os.path.dirname(filename)
+	if catalog_dir and not os.path.isdir(catalog_dir):
+		os.makedirs(catalog_dir)
+
+	connection = sqlite3.connect(filename)
+	connection.row_factory = sqlite3.Row
+
+	connection.execute('CREATE TABLE IF NOT EXISTS leaves (path TEXT PRIMARY KEY, ' +
+			   ', '.join(['%s TEXT NOT NULL' % (dimension) for dimension in DIMENSIONS]) +
+			   ', runs INTEGER, bytes INTEGER, mtime REAL, dir_mtime REAL)')
+
+	for dimension in DIMENSIONS:
+		connection.execute('CREATE INDEX IF NOT EXISTS leaves_%s ON leaves (%s)' % (dimension, dimension))
+
+	connection.commit()
+
+	return connection
+
+def leaf_dirs(root):
+	""" Yield the (path, dimensions) of every leaf below 'root'. A leaf is a
+	    directory, a tar archive or a directory of a pack, and its path is
+	    that of the directory it is or replaces """
+
+	def walk(path, values):
+		if len(values) == len(DIMENSIONS):
+			yield path, values
+			return
+
+		for name in sorted(os.listdir(path)):
+			child = os.path.join(path, name)
+			if os.path.isdir(child):
+				for leaf in walk(child, values + [name]):
+					yield leaf
+				continue
+
+			# Archived leaves are named after the directory they replace
+			if len(values) == len(DIMENSIONS) - 1:
+				for suffix in ARCHIVE_SUFFIXES:
+					if name.endswith(suffix) and not os.path.isdir(os.path.join(path, name[:-len(suffix)])):
+						yield os.path.join(path, name[:-len(suffix)]), values + [name[:-len(suffix)]]
+						break
+
+			# The leaves of a pack are its directories at the depth of a leaf
+			if name.endswith(PACK_SUFFIX) and not os.path.isdir(child[:-len(PACK_SUFFIX)]):
+				packed = [[name[:-len(PACK_SUFFIX)]] + (directory.split('/') if directory else []) for directory in open_pack(child).directories()]
+
+				for parts in sorted(packed, key = lambda parts : [name_order(part) for part in parts]):
+					if len(values) + len(parts) == len(DIMENSIONS):
+						yield os.path.join(path, *parts), values + parts
+
+		return
+
+	return walk(root, [])
+
+def leaf_stats(path):
+	""" Return the run count, byte size and newest mtime of the runs in a leaf """
+
+	source = leaf_source(path)
+	stamps = source.stamps(source.runs())
+
+	return len(stamps), sum([stamp[1] for stamp in stamps]), max([stamp[0] for stamp in stamps] or [0.0])
+
+def scan_catalog(connection, root = DATA_ROOT):
+	""" Bring the catalog up to date with the data tree. The run files of the
+	    leaves stored in directories are stat'ed on every scan, archived and
+	    packed leaves are only re-read once their archive or pack changes.
+	    Returns the number of updated and removed leaves """
+
+	known = dict((row['path'], (row['dir_mtime'], row['runs'], row['bytes'], row['mtime'])) for row in connection.execute('SELECT path, dir_mtime, runs, bytes, mtime FROM leaves'))
+	updated = 0
+
+	for path, values in leaf_dirs(root):
+		key = '/'.join(values)
+		dir_mtime = storage_mtime(path)
+		row = known.pop(key, None)
+
+		# Rewriting an archive or a pack changes its mtime, while runs appended
+		# in place leave the mtime of their directory untouched
+		if row is not None and row[0] == dir_mtime and storage(path)[0] != 'dir':
+			continue
+
+		runs, size, mtime = leaf_stats(path)
+		if row == (dir_mtime, runs, size, mtime):
+			continue
+
+		connection.execute('INSERT OR REPLACE INTO leaves VALUES (?, ' + ', '.join(['?'] * len(DIMENSIONS)) + ', ?, ?, ?, ?)',
+				   [key] + values + [runs, size, mtime, dir_mtime])
+		updated += 1
+
+	# The leaves left over have disappeared from the tree
+	connection.executemany('DELETE FROM leaves WHERE path = ?', [(path,) for path in known])
+	connection.commit()
+
+	return updated, len(known)
+
+def value_condition(dimension, value):
+	""" Return the SQL condition and its parameters for a single query value """
+
+	compare = compare_regex.match(value)
+
+	# Numbered values like the corun and utilization compare as numbers
+	if compare and compare.group(2).isdigit():
+		return ('(%s GLOB \'[0-9]*\' AND CAST(%s AS INTEGER) %s ?)' % (dimension, dimension, compare.group(1)), [int(compare.group(2))])
+
+	if compare:
+		return ('%s %s ?' % (dimension, compare.group(1)), [compare.group(2)])
+
+	# Shell wildcards behave like the wildcards of 'main.py'
+	return ('%s GLOB ?' % (dimension), [value])
+
+def query_catalog(connection, **conditions):
+	""" Return the catalog rows matching all the given dimensions. Each dimension
+	    takes a value, a wildcard, a comparison like '>=02' or a list of these,
+	    which match when any of them does """
+
+	clauses = []
+	parameters = []
+
+	for dimension, values in sorted(conditions.items()):
+		if dimension not in DIMENSIONS:
+			raise ValueError, 'Unknown catalog dimension (%s)' % (dimension)
+
+		if isinstance(values, basestring):
+			values = [values]
+
+		terms = [value_condition(dimension, value) for value in values]
+		clauses.append('(' + ' OR '.join([term[0] for term in terms]) + ')')
+		parameters += [parameter for term in terms for parameter in term[1]]
+
+	sql = 'SELECT * FROM leaves'
+	if clauses:
+		sql += ' WHERE ' + ' AND '.join(clauses)
+
+	# Numbered values are listed in numeric order
+	order = ['CAST(%s AS INTEGER), %s' % (dimension, dimension) for dimension in DIMENSIONS]
+
+	return connection.execute(sql + ' ORDER BY ' + ', '.join(order), parameters).fetchall()
+
+def main(argv):
+
+	# Create an internal help function for printing help information
+	def help():
+
+		print 'catalog.py [-s] [-p <platform>] [-b <benchmark>] [-l <linux>] [-a <buddy>] [-d <data>] [-c <corun>] [-u <utilization>]'
+		print 'Lists the leaves of the data tree matching every given dimension. Each dimension takes a comma'
+		print 'separated list of values, wildcards and comparisons, e.g. -p TG -d PF -c \'>=02\' -u \'<=50\''
+		print 'Use -s to rescan the data tree first. Only the leaves whose runs, archive or pack have changed are updated'
+
+		return
+
+	# Map the options to the dimensions they filter
+	options = {'-p' : 'platform', '-b' : 'benchmark', '-l' : 'linux', '-a' : 'buddy', '-d' : 'data', '-c' : 'corun', '-u' : 'utilization'}
+	conditions = {}
+	scan = False
+
+	try:
+		opts, args = getopt.getopt(argv, "hsp:b:l:a:d:c:u:", ["scan"] + [dimension + '=' for dimension in DIMENSIONS])
+	except:
+		help()
+		sys.exit(2)
+
+	for opt, arg in opts:
+		if opt == '-h':
+			help()
+			sys.exit()
+		elif opt in ("-s", "--scan"):
+			scan = True
+		elif opt in options:
+			conditions[options[opt]] = arg.split(',')
+		else:
+			conditions[opt[2:]] = arg.split(',')
+
+	connection = open_catalog()
+
+	# An empty catalog is always filled first
+	if scan or connection.execute('SELECT COUNT(*) FROM leaves').fetchone()[0] == 0:
+		start = time.time()
+		updated, removed = scan_catalog(connection)
+		print 'Scanned %s in %.3f sec : %d leaves updated, %d removed' % (DATA_ROOT, time.time() - start, updated, removed)
+
+	rows = query_catalog(connection, **conditions)
+
+	for row in rows:
+		print '%-32s %5d runs %10d bytes  %s' % ('_'.join([row[dimension] for dimension in DIMENSIONS]), row['runs'], row['bytes'], time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(row['mtime'])))
+
+	print '%d leaves' % (len(rows))
+
+	connection.close()
+
+	return
+
+if __name__ == "__main__":
+	# Invoke the main function
+	main(sys.argv[1:])
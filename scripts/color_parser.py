@@ -0,0 +1,40 @@
+########################################################################################
+#
+# File
+#	color_parser.py
+#
+# Description
+#	This file contains the shared parser for page coloring logs. The total page
+#	count and the per-color page counts are pulled from the whole contents of a
+#	log with compiled patterns instead of matching every line separately
+#
+########################################################################################
+
+import re
+
+from data_source import read_data
+
+# Version of the parsing rules, to be raised whenever they change what is
+# pulled from a log
+PARSER_VERSION = 1
+
+# Compiled patterns for the lines of a color log
+total_pages_regex = re.compile(r'^.*###[^\d\n]*(\d+)', re.M)
+color_regex = re.compile(r'^.*Color.*:[^\d\n]*(\d+)', re.M)
+
+def parse_color_text(text):
+	""" Extract (total_pages, pages) from the contents of a color log """
+
+	# The last total page line wins
+	totals = total_pages_regex.findall(text)
+	total_pages = int(totals[-1]) if totals else 0
+
+	# Each color line carries the page count of the next color
+	pages = [int(count) for count in color_regex.findall(text)]
+
+	return (total_pages, pages)
+
+def parse_color_log(filename):
+	""" Extract (total_pages, pages) from a color log file """
+
+	return parse_color_text(read_data(filename))
@@ -0,0 +1,262 @@
+########################################################################################
+#
+# File
+#	data_pack.py
+#
+# Description
+#	This file contains a single-file container for a directory of the data
+#	tree, a leaf or a whole subtree. The files are concatenated in run order
+#	and followed by an index of their offsets, so the container is read
+#	through one memory mapped file handle instead of thousands of files. A
+#	pack named '<directory>.pack' stands in for the directory it was made of
+#
+########################################################################################
+
+import sys, getopt
+import os
+import mmap
+import shutil
+import struct
+import zlib
+
+# Tail of a pack holding its magic and the offset and size of its index
+PACK_MAGIC = 'MEMPACK1'
+PACK_FOOTER = '<8sQQ'
+PACK_FOOTER_SIZE = struct.calcsize(PACK_FOOTER)
+
+# Suffix of a pack, appended to the directory it replaces
+PACK_SUFFIX = '.pack'
+
+# Packs opened by this process, by file name
+open_packs = {}
+
+class data_pack(object):
+	""" A memory mapped pack with its index of the stored files """
+
+	def __init__(self, filename):
+		self.name = filename
+		self.mtime = os.path.getmtime(filename)
+
+		with open(filename, 'rb') as fdi:
+			self.data = mmap.mmap(fdi.fileno(), 0, access = mmap.ACCESS_READ)
+
+		magic, index_offset, index_size = struct.unpack(PACK_FOOTER, self.data[-PACK_FOOTER_SIZE:]) if len(self.data) >= PACK_FOOTER_SIZE else ('', 0, 0)
+		if magic != PACK_MAGIC:
+			raise ValueError, 'File (%s) is not a data pack!' % (filename)
+
+		# Index every file by its path and list the files of every directory
+		self.entries = {}
+		self.dirs = {}
+
+		for line in zlib.decompress(self.data[index_offset:index_offset + index_size]).splitlines():
+			path, offset, size, mtime = line.split('\t')
+			self.entries[path] = (int(offset), int(size), float(mtime))
+
+			directory, name = os.path.split(path)
+			self.dirs.setdefault(directory, []).append(name)
+
+		return
+
+	def names(self, directory = ''):
+		""" Return the names of the files stored for a directory of the pack """
+
+		return self.dirs.get(directory, [])
+
+	def directories(self):
+		""" Return the directories of the pack which hold files """
+
+		return self.dirs.keys()
+
+	def stamp(self, path):
+		""" Return the (mtime, size) of a stored file """
+
+		offset, size, mtime = self.entries[path]
+
+		return (mtime, size)
+
+	def read(self, path):
+		""" Return the stored contents of a file """
+
+		offset, size, mtime = self.entries[path]
+
+		return self.data[offset:offset + size]
+
+def open_pack(filename):
+	""" Return the data_pack of a file, which is kept open until it changes """
+
+	pack = open_packs.get(filename)
+
+	if pack is None or pack.mtime != os.path.getmtime(filename):
+		pack = open_packs[filename] = data_pack(filename)
+
+	return pack
+
+def find_pack(directory):
+	""" Return (pack, path inside the pack) for a directory that is stored in a
+	    pack, or None. Packs replace a directory, so the only candidate is the
+	    first missing directory on the path """
+
+	directory = os.path.normpath(directory)
+	missing = directory
+
+	while not os.path.isdir(os.path.dirname(missing) or '.'):
+		if os.path.dirname(missing) in ('', missing):
+			return None
+		missing = os.path.dirname(missing)
+
+	if not os.path.isfile(missing + PACK_SUFFIX):
+		return None
+
+	path = os.path.relpath(directory, missing)
+
+	return open_pack(missing + PACK_SUFFIX), '' if path == '.' else path
+
+def name_order(name):
+	""" Sort key placing the numbered files in numeric order """
+
+	number = name.split('.')[0]
+
+	return (0, int(number), name) if number.isdigit() else (1, 0, name)
+
+def write_pack(directory, filename = None):
+	""" Pack all the files below a directory into '<directory>.pack' or the
+	    given file. Returns the number of packed files """
+
+	directory = os.path.normpath(directory)
+	filename = filename or directory + PACK_SUFFIX
+	temp_file = filename + '.tmp'
+	lines = []
+
+	with open(temp_file, 'wb') as fdo:
+		for parent, dirs, files in os.walk(directory):
+			dirs.sort(key = name_order)
+
+			for name in sorted(files, key = name_order):
+				path = os.path.join(parent, name)
+				with open(path, 'rb') as fdi:
+					data = fdi.read()
+
+				lines.append('%s\t%d\t%d\t%r' % (os.path.relpath(path, directory), fdo.tell(), len(data), os.path.getmtime(path)))
+				fdo.write(data)
+
+		index = zlib.compress('\n'.join(lines))
+		index_offset = fdo.tell()
+		fdo.write(index)
+		fdo.write(struct.pack(PACK_FOOTER, PACK_MAGIC, index_offset, len(index)))
+
+	# Readers never see a partial pack
+	os.rename(temp_file, filename)
+
+	return len(lines)
+
+def unpack(filename, directory = None):
+	""" Restore the files of a pack, with their mtimes, below the directory it
+	    replaced or the given one. Returns the number of restored files """
+
+	pack = open_pack(filename)
+	directory = directory or filename[:-len(PACK_SUFFIX)]
+
+	for path in sorted(pack.entries):
+		target = os.path.join(directory, path)
+
+		if not os.path.isdir(os.path.dirname(target)):
+			os.makedirs(os.path.dirname(target))
+
+		with open(target, 'wb') as fdo:
+			fdo.write(pack.read(path))
+
+		mtime = pack.stamp(path)[0]
+		os.utime(target, (mtime, mtime))
+
+	return len(pack.entries)
+
+def verify_pack(filename, directory):
+	""" Return True when a pack holds exactly the files below a directory """
+
+	pack = open_pack(filename)
+	found = 0
+
+	for parent, dirs, files in os.walk(directory):
+		for name in files:
+			path = os.path.join(parent, name)
+			relative = os.path.relpath(path, directory)
+
+			if relative not in pack.entries:
+				return False
+
+			with open(path, 'rb') as fdi:
+				if fdi.read() != pack.read(relative):
+					return False
+
+			found += 1
+
+	return found == len(pack.entries)
+
+def main(argv):
+
+	# Create an internal help function for printing help information
+	def help():
+
+		print 'data_pack.py -c <directory> [-r] | -x <pack> [-o <directory>] | -l <pack>'
+		print 'Use -c to pack all the files below a directory, e.g. a leaf or a whole platform, into <directory>.pack'
+		print 'and -r to remove the directory once the pack has been verified. The scripts read a pack in place'
+		print 'of the directory it replaced. Use -x to restore the files of a pack and -l to list its files'
+
+		return
+
+	create = extract = listing = output = None
+	remove = False
+
+	try:
+		opts, args = getopt.getopt(argv, "hc:rx:o:l:", ["create=", "remove", "extract=", "output=", "list="])
+	except:
+		help()
+		sys.exit(2)
+
+	for opt, arg in opts:
+		if opt == '-h':
+			help()
+			sys.exit()
+		elif opt in ("-c", "--create"):
+			create = arg
+		elif opt in ("-r", "--remove"):
+			remove = True
+		elif opt in ("-x", "--extract"):
+			extract = arg
+		elif opt in ("-o", "--output"):
+			output = arg
+		elif opt in ("-l", "--list"):
+			listing = arg
+
+	if create is not None:
+		if not os.path.isdir(create):
+			print 'Directory (%s) does not exists!' % (create)
+			sys.exit(2)
+
+		filename = os.path.normpath(create) + PACK_SUFFIX
+		print 'Packed %d files into %s' % (write_pack(create), filename)
+
+		if remove:
+			if not verify_pack(filename, create):
+				print 'Pack (%s) does not match the directory, which is kept!' % (filename)
+				sys.exit(1)
+
+			shutil.rmtree(create)
+			print 'Removed %s' % (create)
+	elif extract is not None:
+		print 'Restored %d files from %s' % (unpack(extract, output), extract)
+	elif listing is not None:
+		pack = open_pack(listing)
+		for path in sorted(pack.entries, key = lambda path : [name_order(name) for name in path.split('/')]):
+			mtime, size = pack.stamp(path)
+			print '%-48s %10d' % (path, size)
+		print '%d files' % (len(pack.entries))
+	else:
+		help()
+		sys.exit(2)
+
+	return
+
+if __name__ == "__main__":
+	# Invoke the main function
+	main(sys.argv[1:])
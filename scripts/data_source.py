@@ -0,0 +1,473 @@
+########################################################################################
+#
+# File
+#	data_source.py
+#
+# Description
+#	This file contains the access to the files of the data tree wherever they
+#	are stored. A log may be a plain file or a '.gz', '.bz2' or '.xz' file, and
+#	a whole leaf may be a tar archive next to where its directory would be.
+#	Any directory may also be stored in a data pack (see 'data_pack.py').
+#	Compressed logs are streamed and archived leaves are read in one pass,
+#	so an archived campaign is analysed without extracting it
+#
+########################################################################################
+
+import os
+import gzip
+import bz2
+import zlib
+import hashlib
+import tarfile
+from contextlib import closing
+
+from data_pack import find_pack, PACK_SUFFIX
+
+# The xz format needs the lzma module, which Python 2 only has as a backport
+try:
+	import lzma
+except ImportError:
+	try:
+		from backports import lzma
+	except ImportError:
+		lzma = None
+
+# Root of the data tree and of its mirrored cache tree
+DATA_ROOT = '../data'
+CACHE_ROOT = '../cache'
+
+# Suffixes of the compressed files and of the archived leaves
+COMPRESSED_SUFFIXES = ['.gz', '.bz2', '.xz']
+ARCHIVE_SUFFIXES = ['.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tar.xz']
+
+# Members of the archives listed by this process, by archive name
+archive_listings = {}
+
+# How the directories found by this process are stored, with the mtime of
+# their storage, by directory name
+directory_storage = {}
+
+# The names of the files stored for the directories listed by this process,
+# with the mtime and kind of their storage, by directory name
+directory_listings = {}
+
+# The directories read while the inputs of a job are tracked, with the stamp
+# of their files when first read and, for a directory, the mtime and size of
+# every file, and the process tracking them. Worker processes never track
+# their reads
+tracked_dirs = None
+tracking_pid = None
+
+def need_lzma(filename):
+	""" Raise ValueError when an xz file can not be read """
+
+	if lzma is None:
+		raise ValueError, 'Reading (%s) needs the lzma module (backports.lzma on Python 2)' % (filename)
+
+	return
+
+def plain_name(filename):
+	""" Return a file name without its compression suffix """
+
+	for suffix in COMPRESSED_SUFFIXES:
+		if filename.endswith(suffix):
+			return filename[:-len(suffix)]
+
+	return filename
+
+def open_data(filename):
+	""" Open a plain or compressed file for binary reading, picking the
+	    decompressor from its suffix """
+
+	if filename.endswith('.gz'):
+		return gzip.open(filename, 'rb')
+
+	if filename.endswith('.bz2'):
+		return bz2.BZ2File(filename, 'rb')
+
+	if filename.endswith('.xz'):
+		need_lzma(filename)
+		return lzma.LZMAFile(filename, 'rb')
+
+	return open(filename, 'rb')
+
+def decompress(name, data):
+	""" Decompress the contents of an archive member by the suffix of its name """
+
+	if name.endswith('.gz'):
+		return zlib.decompress(data, 16 + zlib.MAX_WBITS)
+
+	if name.endswith('.bz2'):
+		return bz2.decompress(data)
+
+	if name.endswith('.xz'):
+		need_lzma(name)
+		return lzma.decompress(data)
+
+	return data
+
+def find_archive(leaf_dir):
+	""" Return the name of the tar archive holding a leaf, or None """
+
+	base = leaf_dir.rstrip('/')
+
+	for suffix in ARCHIVE_SUFFIXES:
+		if os.path.isfile(base + suffix):
+			return base + suffix
+
+	return None
+
+def storage_stamp(directory, stored):
+	""" Return the mtime of the directory, archive or pack storing a directory,
+	    or None once it no longer stores it. A directory restored next to its
+	    archive or pack takes over from them """
+
+	try:
+		if stored[0] == 'dir':
+			return os.stat(directory).st_mtime
+
+		if os.path.isdir(directory):
+			return None
+
+		if stored[0] == 'archive':
+			return os.path.getmtime(stored[1])
+
+		return os.path.getmtime(stored[1][0].name)
+	except OSError:
+		return None
+
+def storage(directory):
+	""" Return how a directory is stored, as ('dir', None), ('archive', archive
+	    name) or ('pack', (pack, path in the pack)), or None when it does not
+	    exist. Found directories are remembered until what stores them
+	    changes, so their files are looked up without probing the storage
+	    again """
+
+	directory = os.path.normpath(directory)
+	note_input(directory)
+	known = directory_storage.get(directory)
+
+	if known is not None and storage_stamp(directory, known[1]) == known[0]:
+		return known[1]
+
+	found = None
+
+	if os.path.isdir(directory):
+		found = ('dir', None)
+	elif find_archive(directory) is not None:
+		found = ('archive', find_archive(directory))
+	else:
+		pack = find_pack(directory)
+		if pack is not None and (pack[1] in pack[0].dirs or any([name.startswith(pack[1] + '/') for name in pack[0].dirs])):
+			found = ('pack', pack)
+
+	if found is not None:
+		directory_storage[directory] = (storage_stamp(directory, found), found)
+	else:
+		directory_storage.pop(directory, None)
+
+	return found
+
+def storage_mtime(directory):
+	""" Return the mtime of the directory, archive or pack storing a directory """
+
+	stored = storage(directory)
+
+	if stored is None:
+		raise ValueError, 'Directory (%s) does not exists!' % (directory)
+
+	return storage_stamp(os.path.normpath(directory), stored)
+
+def stored_names(directory):
+	""" Return the names of the files stored for a directory. The directory,
+	    archive or pack index is listed once and the names are kept until what
+	    stores the directory changes """
+
+	directory = os.path.normpath(directory)
+	stored = storage(directory)
+
+	if stored is None:
+		raise ValueError, 'Directory (%s) does not exists!' % (directory)
+
+	stamp = (directory_storage[directory][0], stored)
+	listing = directory_listings.get(directory)
+
+	if listing is None or listing[0] != stamp:
+		if stored[0] == 'dir':
+			names = os.listdir(directory)
+		elif stored[0] == 'archive':
+			names = archive_listing(stored[1]).keys()
+		else:
+			names = stored[1][0].names(stored[1][1])
+
+		listing = (stamp, names)
+		directory_listings[directory] = listing
+
+	return listing[1]
+
+def directory_stamps(directory):
+	""" Return a hash of name -> (mtime, size) of the files of a directory """
+
+	stamps = {}
+
+	for name in stored_names(directory):
+		info = os.stat(os.path.join(directory, name))
+		stamps[name] = (info.st_mtime, info.st_size)
+
+	return stamps
+
+def input_stamp(directory, stamps = None):
+	""" Return a digest of the names, mtimes and sizes of the files stored for
+	    a directory, or of its archive or pack, or None when it does not exist.
+	    The directory_stamps of a directory may be given when already taken """
+
+	stored = storage(directory)
+
+	if stored is None:
+		return None
+
+	if stored[0] == 'dir':
+		if stamps is None:
+			stamps = directory_stamps(directory)
+
+		return hashlib.sha1('\n'.join(['%s %r %d' % (name, stamps[name][0], stamps[name][1]) for name in sorted(stamps)])).hexdigest()
+
+	# Any change to an archive or pack rewrites it
+	container = stored[1] if stored[0] == 'archive' else stored[1][0].name
+	info = os.stat(container)
+
+	return '%s %r %d' % (container, info.st_mtime, info.st_size)
+
+def track_inputs():
+	""" Start recording the directories read by this process """
+	global tracked_dirs, tracking_pid
+
+	tracked_dirs = {}
+	tracking_pid = os.getpid()
+
+	return
+
+def tracked_inputs():
+	""" Stop recording and return a hash of directory -> input_stamp of the
+	    directories read since track_inputs """
+	global tracked_dirs
+
+	inputs = dict((directory, tracked[0]) for directory, tracked in (tracked_dirs or {}).items())
+	tracked_dirs = None
+
+	return inputs
+
+def tracked_stamps(directory):
+	""" Return the hash of name -> (mtime, size) of the files of a directory
+	    taken when the tracked job first read it, or None """
+
+	if tracked_dirs is None or os.getpid() != tracking_pid:
+		return None
+
+	return tracked_dirs.get(os.path.normpath(directory), (None, None))[1]
+
+def note_input(directory):
+	""" Record a directory as read, with the stamp of its files at that time """
+
+	directory = os.path.normpath(directory)
+
+	if tracked_dirs is None or directory in tracked_dirs or os.getpid() != tracking_pid:
+		return
+
+	# The directory is known before its stamp looks up its storage
+	tracked_dirs[directory] = (None, None)
+	stored = storage(directory)
+
+	# The files of a directory are only looked at once by the job
+	stamps = directory_stamps(directory) if stored is not None and stored[0] == 'dir' else None
+	tracked_dirs[directory] = (input_stamp(directory, stamps), stamps)
+
+	return
+
+def leaf_exists(leaf_dir):
+	""" Return True when a leaf is stored as a directory, an archive or a pack """
+
+	return storage(leaf_dir) is not None
+
+def open_archive(archive):
+	""" Open a tar archive for reading """
+
+	if archive.endswith('.xz'):
+		need_lzma(archive)
+		return tarfile.open(fileobj = lzma.LZMAFile(archive, 'rb'), mode = 'r:')
+
+	return tarfile.open(archive, 'r:*')
+
+def archive_listing(archive):
+	""" Return a hash of base name -> TarInfo of the files in an archive. The
+	    listing is kept until the archive changes """
+
+	mtime = os.path.getmtime(archive)
+	listing = archive_listings.get(archive)
+
+	if listing is None or listing[0] != mtime:
+		with closing(open_archive(archive)) as tar:
+			listing = (mtime, dict((os.path.basename(info.name), info) for info in tar.getmembers() if info.isfile()))
+
+		archive_listings[archive] = listing
+
+	return listing[1]
+
+def read_members(archive, names):
+	""" Return a hash of base name -> decompressed contents of some files of an
+	    archive. The files are read in the order they are stored, so a
+	    compressed archive is decompressed in a single pass """
+
+	listing = archive_listing(archive)
+	contents = {}
+
+	with closing(open_archive(archive)) as tar:
+		for info in sorted([listing[name] for name in names], key = lambda info : info.offset_data):
+			name = os.path.basename(info.name)
+			contents[name] = decompress(name, tar.extractfile(info).read())
+
+	return contents
+
+def find_data(filename):
+	""" Return (stored name, container) for a file of the data tree, where the
+	    container is the archive or pack holding the file, or None for a file
+	    of a directory. Returns None when the file does not exist """
+
+	directory, name = os.path.split(filename)
+	stored = storage(directory or '.')
+
+	if stored is None:
+		return None
+
+	candidates = [name] + [name + suffix for suffix in COMPRESSED_SUFFIXES]
+
+	if stored[0] == 'dir':
+		for candidate in candidates:
+			if os.path.isfile(os.path.join(directory, candidate)):
+				return (os.path.join(directory, candidate), None)
+	elif stored[0] == 'archive':
+		listing = archive_listing(stored[1])
+		for candidate in candidates:
+			if candidate in listing:
+				return (os.path.join(directory, candidate), stored[1])
+	else:
+		pack, path = stored[1]
+		names = pack.names(path)
+		for candidate in candidates:
+			if candidate in names:
+				return (os.path.join(directory, candidate), pack.name)
+
+	return None
+
+def stored_stamp(stored, container):
+	""" Return the (mtime, size) of a file as found by find_data, taking the
+	    size it is stored with from its archive or pack when it has one """
+
+	if container is None:
+		info = os.stat(stored)
+		return (info.st_mtime, info.st_size)
+
+	directory, name = os.path.split(stored)
+
+	if container.endswith(PACK_SUFFIX):
+		pack, path = storage(directory or '.')[1]
+		return pack.stamp(os.path.join(path, name))
+
+	info = archive_listing(container)[name]
+
+	return (info.mtime, info.size)
+
+def read_data(filename):
+	""" Return the contents of a plain, compressed, archived or packed file """
+
+	found = find_data(filename)
+	if found is None:
+		raise ValueError, 'File (%s) does not exists!' % (filename)
+
+	stored, archive = found
+
+	# The pack of the directory is already open
+	if archive is not None and archive.endswith(PACK_SUFFIX):
+		pack, path = storage(os.path.dirname(stored) or '.')[1]
+		return decompress(stored, pack.read(os.path.join(path, os.path.basename(stored))))
+
+	if archive is not None:
+		return read_members(archive, [os.path.basename(stored)])[os.path.basename(stored)]
+
+	with open_data(stored) as fdi:
+		return fdi.read()
+
+class leaf_source(object):
+	""" The run files of a leaf, stored in a directory as plain or compressed
+	    files, in a tar archive or in a pack """
+
+	def __init__(self, leaf_dir):
+		self.leaf_dir = leaf_dir
+		self.stored = storage(leaf_dir)
+
+		if self.stored is None:
+			raise ValueError, 'Directory (%s) does not exists!' % (leaf_dir)
+
+		# Map the plain name of every file to the name it is stored under,
+		# from the single listing of the directory, the archive or the pack
+		self.names = dict((plain_name(name), name) for name in stored_names(leaf_dir))
+
+		return
+
+	def runs(self, prefix = ''):
+		""" Return the sorted numbers of the files named '<prefix><number>' """
+
+		runs = [int(name[len(prefix):]) for name in self.names if name.startswith(prefix) and name[len(prefix):].isdigit()]
+		runs.sort()
+
+		return runs
+
+	def stored_name(self, run, prefix = ''):
+		""" Return the name the file of a run is stored under """
+
+		name = self.names.get(prefix + str(run))
+		if name is None:
+			raise ValueError, 'File (%s) does not exists!' % (os.path.join(self.leaf_dir, prefix + str(run)))
+
+		return name
+
+	def stamps(self, runs, prefix = ''):
+		""" Return the (mtime, size) of the stored file of every run """
+
+		names = [self.stored_name(run, prefix) for run in runs]
+
+		if self.stored[0] == 'archive':
+			listing = archive_listing(self.stored[1])
+			return [(listing[name].mtime, listing[name].size) for name in names]
+
+		if self.stored[0] == 'pack':
+			pack, path = self.stored[1]
+			return [pack.stamp(os.path.join(path, name)) for name in names]
+
+		# A rewritten file keeps its name, so every file is looked at, but only
+		# once when the tracked job has already done so
+		known = tracked_stamps(self.leaf_dir) or {}
+
+		stamps = []
+		for name in names:
+			if name in known:
+				stamps.append(known[name])
+			else:
+				info = os.stat(os.path.join(self.leaf_dir, name))
+				stamps.append((info.st_mtime, info.st_size))
+
+		return stamps
+
+	def contents(self, runs, prefix = ''):
+		""" Return a (filename, text) pair for every run. Files in a directory
+		    or a pack are left to be read by their parser and have no text,
+		    the files of an archive are read at once """
+
+		names = [self.stored_name(run, prefix) for run in runs]
+
+		if self.stored[0] != 'archive':
+			return [(os.path.join(self.leaf_dir, name), None) for name in names]
+
+		texts = read_members(self.stored[1], names) if names else {}
+
+		return [(os.path.join(self.leaf_dir, name), texts[name]) for name in names]
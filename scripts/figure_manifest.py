@@ -0,0 +1,170 @@
+########################################################################################
+#
+# File
+#	figure_manifest.py
+#
+# Description
+#	This file contains the dependency tracking of the rendered figures. The
+#	figures of a job, such as the processing of a leaf, are recorded with a
+#	digest of the files of every directory the job has read, of its
+#	parameters and of the scripts. A job whose digest has not changed since
+#	its figures were drawn is skipped before any of its data is loaded, so
+#	refreshing a whole campaign only redraws what has changed
+#
+########################################################################################
+
+import os
+import json
+import hashlib
+
+from data_source import input_stamp, track_inputs, tracked_inputs
+
+# Set to False to render every figure without recording it, and
+# force_renders to True to render every figure and record it again
+tracking_enabled = True
+force_renders = False
+
+# Location of the manifest, next to the leaf cache
+MANIFEST_FILE = '../cache/figures.json'
+
+# Job name -> digest, input directories and figures, loaded on first use,
+# and the digest of the scripts
+manifest = None
+scripts_digest = None
+
+# The job being recorded, the recorded jobs whose figures are not drawn yet
+# and the number of figures of the skipped jobs
+open_job_entry = None
+closed_jobs = []
+skipped_figures = 0
+
+def load_manifest():
+	""" Return the manifest of job name -> entry, reading it on first use """
+	global manifest
+
+	if manifest is None:
+		manifest = {}
+
+		try:
+			with open(MANIFEST_FILE, 'r') as fdi:
+				manifest = json.load(fdi)
+		except (IOError, ValueError):
+			# A missing or damaged manifest renders every figure once
+			pass
+
+	return manifest
+
+def save_manifest():
+	""" Atomically store the manifest """
+
+	if manifest is None:
+		return
+
+	manifest_dir = os.path.dirname(MANIFEST_FILE)
+	if manifest_dir and not os.path.isdir(manifest_dir):
+		os.makedirs(manifest_dir)
+
+	temp_file = MANIFEST_FILE + '.tmp'
+	with open(temp_file, 'w') as fdo:
+		json.dump(manifest, fdo, indent = 0, sort_keys = True)
+
+	os.rename(temp_file, MANIFEST_FILE)
+
+	return
+
+def code_digest():
+	""" Return the digest of the sources of all the scripts """
+	global scripts_digest
+
+	if scripts_digest is None:
+		scripts_dir = os.path.dirname(os.path.abspath(__file__))
+		hasher = hashlib.sha1()
+
+		for name in sorted(os.listdir(scripts_dir)):
+			if name.endswith('.py'):
+				with open(os.path.join(scripts_dir, name), 'rb') as fdi:
+					hasher.update('%s:%s' % (name, hashlib.sha1(fdi.read()).hexdigest()))
+
+		scripts_digest = hasher.hexdigest()
+
+	return scripts_digest
+
+def job_digest(name, params, inputs):
+	""" Return the digest of a job from its parameters and the hash of
+	    directory -> input_stamp of its inputs """
+
+	hasher = hashlib.sha1()
+	hasher.update('%s:%r:%s' % (name, params, code_digest()))
+
+	for directory in sorted(inputs):
+		hasher.update('%s:%s' % (directory, inputs[directory]))
+
+	return hasher.hexdigest()
+
+def job_is_current(name, params):
+	""" Return True when the figures of a job exist and were drawn from the
+	    same inputs, parameters and scripts. Only the files of the inputs are
+	    looked at, none of them is read """
+	global skipped_figures
+
+	if not tracking_enabled or force_renders:
+		return False
+
+	entry = load_manifest().get(name)
+	if not isinstance(entry, dict):
+		return False
+
+	inputs = dict((directory, input_stamp(directory)) for directory in entry["inputs"])
+	if job_digest(name, params, inputs) != entry["digest"] or not all([os.path.isfile(figname) for figname in entry["figures"]]):
+		return False
+
+	skipped_figures += len(entry["figures"])
+
+	return True
+
+def open_job(name, params):
+	""" Start recording the inputs and the figures of a job """
+	global open_job_entry
+
+	if tracking_enabled:
+		open_job_entry = {"name" : name, "params" : params, "figures" : []}
+		track_inputs()
+
+	return
+
+def add_figure(figname):
+	""" Count a queued figure as an output of the open job, if any """
+
+	if open_job_entry is not None:
+		open_job_entry["figures"].append(figname)
+
+	return
+
+def close_job():
+	""" Stop recording a job. It is written to the manifest once its figures
+	    have been drawn """
+	global open_job_entry
+
+	if open_job_entry is None:
+		return
+
+	inputs = tracked_inputs()
+	closed_jobs.append((open_job_entry["name"], {"digest" : job_digest(open_job_entry["name"], open_job_entry["params"], inputs),
+						     "inputs" : sorted(inputs), "figures" : sorted(set(open_job_entry["figures"]))}))
+	open_job_entry = None
+
+	return
+
+def record_jobs():
+	""" Store the closed jobs, whose figures have all been drawn """
+
+	if not closed_jobs:
+		return
+
+	for name, entry in closed_jobs:
+		load_manifest()[name] = entry
+
+	del closed_jobs[:]
+	save_manifest()
+
+	return
@@ -11,11 +11,16 @@
 import os
 import collections
 
+from data_source import find_data, read_data, stored_stamp
+
 class File(object):
-	""" A simple class for handling files """
+	""" A simple class for handling files. The file may also be stored
+	    compressed or inside the tar archive of its leaf """
 	def __init__(self, filename = 'Nill'):
-		if os.path.isfile(filename):
-			self.name = filename
+		found = find_data(filename)
+
+		if found is not None:
+			self.name, self.archive = found
 		else:
 			raise ValueError, 'File (%s) does not exists!' % (filename)
 
@@ -29,3 +34,13 @@ class File(object):
 
 	def get_name(self):
 		return self.name
+
+	def read(self):
+		""" Return the decompressed contents of the file """
+
+		return read_data(self.name)
+
+	def size(self):
+		""" Return the number of bytes the file is stored with """
+
+		return stored_stamp(self.name, self.archive)[1]
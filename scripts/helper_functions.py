@@ -1,3 +1,5 @@
+import numpy as np
+
 class Helper(object):
         """ This class defines helper functions to be used by other classes """
         def bit_mask(self, number):
@@ -19,15 +21,104 @@ class Helper(object):
         def bit_numbers(self, number):
                 """ A function which returns the digit value of set bit positions
                     in a number """
-                bit_list = []
-
-                # Iterate over the set bits in the number
-                index = 0
-                for bits in self.bit_mask(number):
-                        bits >>= index
-                        while (bits):
-                                bits >>= 1
-                                index += 1
-                        bit_list.append(index-1)
-
-                return bit_list
\ No newline at end of file
+
+                return list(ColorMask(number).colors())
+
+class ColorMask(object):
+        """ An immutable set of cache colors stored as the set bits of an integer.
+            Masks may be wider than 64 colors. The bit positions and boolean
+            vectors of a mask value are computed once and shared """
+
+        # Bit positions and boolean vectors of the mask values seen so far
+        positions_cache = {}
+        vector_cache = {}
+
+        def __init__(self, value, width = None):
+                value = long(value)
+
+                if value < 0:
+                        raise ValueError, 'Color mask (%d) is negative' % (value)
+
+                self.value = value
+
+                # The number of colors the complement is taken over
+                self.width = value.bit_length() if width is None else max(width, value.bit_length())
+
+                return
+
+        def colors(self):
+                """ Return the tuple of set bit positions in ascending order """
+
+                positions = ColorMask.positions_cache.get(self.value)
+
+                if positions is None:
+                        positions = []
+                        number = self.value
+
+                        # Isolate the lowest set bit and read its position off its length
+                        while number:
+                                lowest = number & -number
+                                positions.append(lowest.bit_length() - 1)
+                                number ^= lowest
+
+                        positions = ColorMask.positions_cache[self.value] = tuple(positions)
+
+                return positions
+
+        def to_vector(self, colors = None):
+                """ Return a read-only boolean vector marking the allowed colors among
+                    the first 'colors' (the width of the mask by default) """
+
+                colors = self.width if colors is None else colors
+                key = (self.value, colors)
+                vector = ColorMask.vector_cache.get(key)
+
+                if vector is None:
+                        vector = np.zeros(colors, dtype = bool)
+                        vector[[color for color in self.colors() if color < colors]] = True
+                        vector.setflags(write = False)
+                        ColorMask.vector_cache[key] = vector
+
+                return vector
+
+        @staticmethod
+        def width_of(other):
+                """ Return the width of a mask, or the bit length of a plain value """
+
+                return other.width if isinstance(other, ColorMask) else long(other).bit_length()
+
+        def __or__(self, other):
+                return ColorMask(self.value | long(other), max(self.width, ColorMask.width_of(other)))
+
+        def __and__(self, other):
+                return ColorMask(self.value & long(other), max(self.width, ColorMask.width_of(other)))
+
+        def __invert__(self):
+                return ColorMask(((1L << self.width) - 1) & ~self.value, self.width)
+
+        def __contains__(self, color):
+                return color >= 0 and bool((self.value >> color) & 1)
+
+        def __iter__(self):
+                return iter(self.colors())
+
+        def __len__(self):
+                return len(self.colors())
+
+        def __eq__(self, other):
+                return isinstance(other, ColorMask) and self.value == other.value and self.width == other.width
+
+        def __ne__(self, other):
+                return not self == other
+
+        def __hash__(self):
+                return hash((self.value, self.width))
+
+        def __long__(self):
+                return self.value
+
+        def __int__(self):
+                return self.value
+
+        def __repr__(self):
+                return 'ColorMask(0x%x, %d)' % (self.value, self.width)
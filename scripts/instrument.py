@@ -0,0 +1,296 @@
+########################################################################################
+#
+# File
+#	instrument.py
+#
+# Description
+#	This file contains the per-stage instrumentation of the scripts. While a
+#	leaf is open, every 'discover', 'parse', 'aggregate', 'plot' and 'save'
+#	stage adds its wall time, CPU time, file count, bytes and peak memory to
+#	the record of the leaf. Nested stages are only counted once, by the
+#	innermost stage. The wall and CPU time of worker processes, either of the
+#	pool jobs a stage waits for or of the stages they record themselves, are
+#	kept apart from those of this process. The peak memory of a stage is the
+#	most this process used above what it used when the stage started. One
+#	stage may also be run under cProfile
+#
+########################################################################################
+
+import os
+import time
+import json
+import resource
+import cProfile
+from contextlib import contextmanager
+from collections import OrderedDict as od
+
+# The stages recorded for every leaf
+STAGES = ['discover', 'parse', 'aggregate', 'plot', 'save']
+
+# The record of the leaf being processed, None while no leaf is open
+active = None
+
+# The records of all the closed leaves, by leaf name
+leaves = od()
+
+# The stage run under cProfile and its profiler
+cprofile_stage = None
+profiler = None
+
+def start_profile(stage = None):
+	""" Start recording the stages, running the given stage under cProfile """
+	global cprofile_stage, profiler
+
+	leaves.clear()
+	cprofile_stage = stage
+	profiler = cProfile.Profile() if stage is not None else None
+
+	return
+
+def usage():
+	""" Return the wall time and CPU time of this process """
+
+	info = resource.getrusage(resource.RUSAGE_SELF)
+
+	return time.time(), info.ru_utime + info.ru_stime
+
+def memory():
+	""" Return the resident and peak memory (MB) of this process. Without
+	    /proc both are the peak over the lifetime of the process """
+
+	try:
+		with open('/proc/self/status', 'r') as fdi:
+			fields = dict([line.split(':', 1) for line in fdi if line.startswith('Vm')])
+
+		return int(fields['VmRSS'].split()[0]) / 1024.0, int(fields['VmHWM'].split()[0]) / 1024.0
+	except (IOError, KeyError, ValueError):
+		peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+		return peak, peak
+
+def reset_peak():
+	""" Restart the peak memory of this process from its resident memory,
+	    where Linux allows it. Elsewhere a stage only sees the growth of the
+	    lifetime peak """
+
+	try:
+		with open('/proc/self/clear_refs', 'w') as fdo:
+			fdo.write('5')
+	except IOError:
+		pass
+
+	return
+
+def new_record(name):
+	""" Return an empty record for a leaf, made by this process """
+
+	return {"name" : name, "pid" : os.getpid(), "stages" : od(), "stack" : []}
+
+def stage_entry(stages, name):
+	""" Return the counters of a stage, creating them on first use """
+
+	if name not in stages:
+		stages[name] = {"calls" : 0, "wall" : 0.0, "cpu" : 0.0, "worker_wall" : 0.0, "worker_cpu" : 0.0, "files" : 0, "bytes" : 0, "peak_delta_mb" : 0.0}
+
+	return stages[name]
+
+def add_counters(total, entry):
+	""" Add the counters of a stage to a running total """
+
+	for key in ("calls", "wall", "cpu", "worker_wall", "worker_cpu", "files", "bytes"):
+		total[key] += entry[key]
+	total["peak_delta_mb"] = max(total["peak_delta_mb"], entry["peak_delta_mb"])
+
+	return
+
+def open_leaf(name):
+	""" Start recording the stages of a leaf """
+	global active
+
+	active = new_record(name)
+
+	return
+
+def close_leaf():
+	""" Stop recording the open leaf and keep its record """
+	global active
+
+	if active is not None:
+		merge_record(active)
+
+	active = None
+
+	return
+
+def active_leaf():
+	""" Return the name of the open leaf, or None """
+
+	return active["name"] if active is not None else None
+
+def merge_record(record):
+	""" Add the stages of a record to the record of its leaf. The time of the
+	    record of a worker process is counted as worker time, its memory is
+	    not counted """
+
+	stages = leaves.setdefault(record["name"], od())
+	worker = record["pid"] != os.getpid()
+
+	for name, entry in record["stages"].items():
+		if worker:
+			entry = dict(entry, worker_wall = entry["worker_wall"] + entry["wall"], worker_cpu = entry["worker_cpu"] + entry["cpu"],
+				     wall = 0.0, cpu = 0.0, peak_delta_mb = 0.0)
+
+		add_counters(stage_entry(stages, name), entry)
+
+	return
+
+@contextmanager
+def stage(name):
+	""" Record the enclosed code as a stage of the open leaf """
+
+	if active is None:
+		yield
+		return
+
+	record = active
+	rss, peak = memory()
+
+	# A nested stage restarts the peak memory, so the enclosing stage keeps
+	# the peak reached so far
+	if record["stack"]:
+		record["stack"][-1]["peak"] = max(record["stack"][-1]["peak"], peak)
+	reset_peak()
+
+	# Usage and memory at entry, time of the nested stages and of the worker
+	# processes and the peak memory reached by the nested stages
+	wall, cpu = usage()
+	frame = {"name" : name, "wall" : wall, "cpu" : cpu, "rss" : rss, "peak" : rss,
+		 "nested_wall" : 0.0, "nested_cpu" : 0.0, "worker_wall" : 0.0, "worker_cpu" : 0.0}
+	record["stack"].append(frame)
+
+	# Only the outermost call of the chosen stage is handed to cProfile
+	profiled = name == cprofile_stage and [item["name"] for item in record["stack"]].count(name) == 1
+	if profiled:
+		profiler.enable()
+
+	try:
+		yield
+	finally:
+		if profiled:
+			profiler.disable()
+
+		record["stack"].pop()
+		wall, cpu = usage()
+		wall -= frame["wall"]
+		cpu -= frame["cpu"]
+		peak = max(frame["peak"], memory()[1])
+
+		# The time of the nested stages is counted by those stages
+		entry = stage_entry(record["stages"], name)
+		entry["calls"] += 1
+		entry["wall"] += wall - frame["nested_wall"]
+		entry["cpu"] += cpu - frame["nested_cpu"]
+		entry["worker_wall"] += frame["worker_wall"]
+		entry["worker_cpu"] += frame["worker_cpu"]
+		entry["peak_delta_mb"] = max(entry["peak_delta_mb"], peak - frame["rss"])
+
+		if record["stack"]:
+			record["stack"][-1]["nested_wall"] += wall
+			record["stack"][-1]["nested_cpu"] += cpu
+			record["stack"][-1]["peak"] = max(record["stack"][-1]["peak"], peak)
+
+	return
+
+def count_io(files, size):
+	""" Add files and bytes to the innermost stage of the open leaf """
+
+	if active is None or not active["stack"]:
+		return
+
+	entry = stage_entry(active["stages"], active["stack"][-1]["name"])
+	entry["files"] += files
+	entry["bytes"] += int(size)
+
+	return
+
+def stage_open():
+	""" Return True while a stage of the open leaf is being recorded """
+
+	return active is not None and len(active["stack"]) > 0
+
+def timed_job(job):
+	""" Pool job calling function(item) for a (function, item) pair, which
+	    returns the result along with the wall and CPU time of the worker """
+
+	function, item = job
+	start = usage()
+	result = function(item)
+	end = usage()
+
+	return result, (end[0] - start[0], end[1] - start[1])
+
+def add_worker_time(wall, cpu):
+	""" Add the wall and CPU time of worker processes to the innermost stage """
+
+	if stage_open():
+		active["stack"][-1]["worker_wall"] += wall
+		active["stack"][-1]["worker_cpu"] += cpu
+
+	return
+
+def profile_call(leaf, name, function, *args):
+	""" Call a function as a stage of the given leaf and return the record of
+	    the call, so that worker processes can send it back to be merged """
+	global active
+
+	saved = active
+	active = new_record(leaf)
+
+	try:
+		with stage(name):
+			function(*args)
+
+		return active
+	finally:
+		active = saved
+
+def stage_totals():
+	""" Return the counters of every stage summed over all the leaves """
+
+	totals = od()
+
+	for stages in leaves.values():
+		for name, entry in stages.items():
+			add_counters(stage_entry(totals, name), entry)
+
+	return od((name, totals[name]) for name in STAGES if name in totals)
+
+def write_profile(filename, jobs, wall):
+	""" Store the stage records as JSON, along with the cProfile statistics of
+	    the chosen stage next to it. Returns the stage totals """
+
+	totals = stage_totals()
+	report = od([("jobs", jobs), ("wall", wall), ("stages", STAGES), ("totals", totals), ("leaves", leaves)])
+
+	if profiler is not None:
+		report["cprofile"] = cprofile_file(filename)
+		profiler.dump_stats(report["cprofile"])
+
+	with open(filename, 'w') as fdo:
+		json.dump(report, fdo, indent = 1)
+
+	return totals
+
+def print_totals(totals):
+	""" Print a line with the counters of every stage """
+
+	print '%-10s %7s %10s %10s %12s %12s %8s %12s %10s' % ('Stage', 'calls', 'wall (s)', 'cpu (s)', 'worker wall', 'worker cpu', 'files', 'bytes', 'peak (MB)')
+
+	for name, entry in totals.items():
+		print '%-10s %7d %10.3f %10.3f %12.3f %12.3f %8d %12d %10.1f' % (name, entry["calls"], entry["wall"], entry["cpu"], entry["worker_wall"], entry["worker_cpu"], entry["files"], entry["bytes"], entry["peak_delta_mb"])
+
+	return
+
+def cprofile_file(filename):
+	""" Return the name of the cProfile dump belonging to a profile """
+
+	return os.path.splitext(filename)[0] + '_' + cprofile_stage + '.prof'
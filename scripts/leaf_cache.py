@@ -0,0 +1,299 @@
+########################################################################################
+#
+# File
+#	leaf_cache.py
+#
+# Description
+#	This file contains a persistent cache for the parsed contents of a leaf
+#	directory of the data tree. The counters of perf logs and the page vectors
+#	of color logs are stored as numpy arrays, one archive per leaf, and every
+#	run is re-parsed only when the mtime or size of its file has changed. An
+#	archive written in another format or by another parser, such as that of
+#	another platform, is rebuilt
+#
+########################################################################################
+
+import os
+import tempfile
+import numpy as np
+from collections import OrderedDict as od
+
+from perf_parser import get_perf_parser
+from color_parser import parse_color_log, parse_color_text, PARSER_VERSION as COLOR_PARSER_VERSION
+from data_source import leaf_source, note_input, DATA_ROOT, CACHE_ROOT
+from worker_pool import pool_map
+from instrument import stage, count_io
+
+# Version of the layout of the cache archives
+CACHE_FORMAT = 1
+
+# Set to False to always parse the text files
+cache_enabled = True
+
+# The leaves loaded most recently by this process, shared between the scripts
+loaded_leaves = od()
+loaded_leaves_limit = 64
+
+def cache_file(leaf_dir, kind):
+	""" Return the name of the cache archive for a leaf directory """
+
+	leaf_path = os.path.relpath(os.path.abspath(leaf_dir), os.path.abspath(DATA_ROOT))
+
+	# Leaves outside the data tree are mirrored by their absolute path
+	if leaf_path.startswith(os.pardir):
+		leaf_path = os.path.abspath(leaf_dir).lstrip(os.sep)
+
+	return os.path.join(CACHE_ROOT, leaf_path, kind + '.npz')
+
+def remember_leaf(leaf_dir, kind, leaf):
+	""" Keep a loaded leaf around for the other scripts of this process """
+
+	key = (kind, os.path.abspath(leaf_dir))
+	loaded_leaves.pop(key, None)
+	loaded_leaves[key] = leaf
+
+	# Forget the oldest leaves beyond the limit
+	while len(loaded_leaves) > loaded_leaves_limit:
+		loaded_leaves.popitem(last = False)
+
+	return leaf
+
+def loaded_leaf(leaf_dir, kind):
+	""" Return the leaf of the given kind ('perf' or 'color') last loaded by
+	    this process, or None """
+
+	leaf = loaded_leaves.get((kind, os.path.abspath(leaf_dir)))
+
+	# The files of a leaf loaded earlier are still read by the caller
+	if leaf is not None:
+		note_input(leaf_dir)
+
+	return leaf
+
+def discover_runs(leaf_dir, prefix = ''):
+	""" Return the sorted run numbers of the files named '<prefix><number>' in a
+	    leaf. The numbers come from a single listing of the directory, or of
+	    the archive of the leaf """
+
+	runs = leaf_source(leaf_dir).runs(prefix)
+
+	if not runs:
+		raise ValueError, 'Directory (%s) holds no run files!' % (leaf_dir)
+
+	return runs
+
+def run_gaps(runs):
+	""" Return the (first, last) ranges of the run numbers missing from 1 up to
+	    the last of the sorted 'runs' """
+
+	runs = np.asarray(runs, dtype = np.int64)
+	previous = np.concatenate(([0], runs[:-1]))
+	gaps = np.nonzero(runs - previous > 1)[0]
+
+	return zip((previous[gaps] + 1).tolist(), (runs[gaps] - 1).tolist())
+
+def leaf_runs(leaf_dir, prefix = ''):
+	""" Return the sorted run numbers of a leaf, reporting the missing runs """
+
+	with stage('discover'):
+		runs = discover_runs(leaf_dir, prefix)
+		gaps = run_gaps(runs)
+		count_io(len(runs), 0)
+
+	if gaps:
+		print 'Missing runs in %s : %s' % (leaf_dir, ', '.join([str(first) if first == last else '%d-%d' % (first, last) for first, last in gaps]))
+
+	return runs
+
+def file_stamps(source, runs):
+	""" Return the mtime and size of every run file in a leaf_source """
+
+	stamps = source.stamps(runs)
+
+	mtimes = np.array([stamp[0] for stamp in stamps], dtype = np.float64)
+	sizes = np.array([stamp[1] for stamp in stamps], dtype = np.int64)
+
+	return mtimes, sizes
+
+def read_cache(filename, parser):
+	""" Load a cache archive written by the given parser into a hash of arrays """
+
+	if not cache_enabled or not os.path.isfile(filename):
+		return None
+
+	try:
+		with np.load(filename) as archive:
+			count_io(1, os.path.getsize(filename))
+			cached = dict((key, archive[key]) for key in archive.files)
+	except Exception:
+		# A damaged archive is simply rebuilt
+		return None
+
+	# So is an archive of another format or parser
+	if "format" not in cached or int(cached["format"]) != CACHE_FORMAT or str(cached["parser"]) != parser:
+		return None
+
+	return cached
+
+def write_cache(filename, parser, arrays):
+	""" Atomically store a hash of arrays as a cache archive of the given parser """
+
+	if not cache_enabled:
+		return
+
+	cache_dir = os.path.dirname(filename)
+	if not os.path.isdir(cache_dir):
+		os.makedirs(cache_dir)
+
+	# Write to a temporary archive of its own first, so that readers never see
+	# a partial file and concurrent writers never share one
+	fd, temp_file = tempfile.mkstemp(prefix = os.path.basename(filename) + '.', suffix = '.tmp', dir = cache_dir)
+
+	try:
+		with os.fdopen(fd, 'wb') as fdo:
+			np.savez(fdo, format = np.array(CACHE_FORMAT), parser = np.array(parser), **arrays)
+
+		# The temporary file is private, the archive is made as usual
+		umask = os.umask(0)
+		os.umask(umask)
+		os.chmod(temp_file, 0666 & ~umask)
+
+		os.rename(temp_file, filename)
+	except:
+		os.remove(temp_file)
+		raise
+
+	return
+
+def valid_runs(cached, runs, mtimes, sizes):
+	""" Return a hash of run -> cached row index for the still valid runs """
+
+	valid = {}
+
+	if cached is None:
+		return valid
+
+	rows = dict((run, row) for row, run in enumerate(cached["runs"]))
+	for index, run in enumerate(runs):
+		row = rows.get(run)
+		if row is not None and cached["mtimes"][row] == mtimes[index] and cached["sizes"][row] == sizes[index]:
+			valid[run] = row
+
+	return valid
+
+def parse_perf_job(job):
+	""" Pool job for parsing a single (filename, text, platform) perf log. The
+	    file is only read when its text is not given """
+
+	filename, text, platform = job
+
+	if text is None:
+		return get_perf_parser(platform).parse(filename)
+
+	return get_perf_parser(platform).parse_text(text)
+
+def parse_color_job(job):
+	""" Pool job for parsing a single (filename, text) color log """
+
+	filename, text = job
+
+	if text is None:
+		return parse_color_log(filename)
+
+	return parse_color_text(text)
+
+def load_perf_leaf(leaf_dir, platform, runs, jobs = 1):
+	""" Return the counters of all the perf logs in a leaf as a hash of arrays
+	    holding 'runs', 'accesses', 'misses' and 'time'. The changed files
+	    are parsed by 'jobs' worker processes """
+
+	runs = [int(run) for run in runs]
+	kind = 'perf'
+	filename = cache_file(leaf_dir, kind)
+	parser = get_perf_parser(platform).tag
+	source = leaf_source(leaf_dir)
+	mtimes, sizes = file_stamps(source, runs)
+
+	cached = read_cache(filename, parser)
+	valid = valid_runs(cached, runs, mtimes, sizes)
+
+	# Nothing has changed since the archive was written
+	if len(valid) == len(runs) and list(cached["runs"]) == runs:
+		return remember_leaf(leaf_dir, kind, cached)
+
+	accesses = np.zeros(len(runs), dtype = np.int64)
+	misses = np.zeros(len(runs), dtype = np.int64)
+	time = np.zeros(len(runs), dtype = np.float64)
+
+	# Parse the changed files, the results come back in the order of the runs
+	stale = [run for run in runs if run not in valid]
+	count_io(len(stale), sum([sizes[index] for index, run in enumerate(runs) if run not in valid]))
+	parsed = dict(zip(stale, pool_map(parse_perf_job, [(name, text, platform) for name, text in source.contents(stale)], jobs)))
+
+	for index, run in enumerate(runs):
+		if run in valid:
+			row = valid[run]
+			accesses[index] = cached["accesses"][row]
+			misses[index] = cached["misses"][row]
+			time[index] = cached["time"][row]
+		else:
+			accesses[index], misses[index], time[index] = parsed[run]
+
+	leaf = {"runs" : np.array(runs, dtype = np.int64), "accesses" : accesses, "misses" : misses, "time" : time, "mtimes" : mtimes, "sizes" : sizes}
+
+	# Store the refreshed archive for the next run
+	write_cache(filename, parser, leaf)
+
+	return remember_leaf(leaf_dir, kind, leaf)
+
+def load_color_leaf(leaf_dir, runs, jobs = 1):
+	""" Return the page counts of all the color logs in a leaf as a hash of arrays
+	    holding 'runs', 'total_pages', 'pages' (runs x colors) and 'colors' (number
+	    of colors found in each run). The changed files are parsed by 'jobs'
+	    worker processes """
+
+	runs = [int(run) for run in runs]
+	kind = 'color'
+	filename = cache_file(leaf_dir, kind)
+	parser = 'color-%d' % (COLOR_PARSER_VERSION)
+	source = leaf_source(leaf_dir)
+	mtimes, sizes = file_stamps(source, runs)
+
+	cached = read_cache(filename, parser)
+	valid = valid_runs(cached, runs, mtimes, sizes)
+
+	# Nothing has changed since the archive was written
+	if len(valid) == len(runs) and list(cached["runs"]) == runs:
+		return remember_leaf(leaf_dir, kind, cached)
+
+	total_pages = np.zeros(len(runs), dtype = np.int64)
+	colors = np.zeros(len(runs), dtype = np.int64)
+	page_rows = []
+
+	# Parse the changed files, the results come back in the order of the runs
+	stale = [run for run in runs if run not in valid]
+	count_io(len(stale), sum([sizes[index] for index, run in enumerate(runs) if run not in valid]))
+	parsed = dict(zip(stale, pool_map(parse_color_job, source.contents(stale), jobs)))
+
+	for index, run in enumerate(runs):
+		if run in valid:
+			row = valid[run]
+			total_pages[index] = cached["total_pages"][row]
+			colors[index] = cached["colors"][row]
+			page_rows.append(cached["pages"][row, :colors[index]])
+		else:
+			total_pages[index], pages = parsed[run]
+			colors[index] = len(pages)
+			page_rows.append(pages)
+
+	# Pad the page vectors of all runs to the widest one
+	pages = np.zeros((len(runs), max(colors) if len(runs) else 0), dtype = np.int64)
+	for index, row in enumerate(page_rows):
+		pages[index, :colors[index]] = row
+
+	leaf = {"runs" : np.array(runs, dtype = np.int64), "total_pages" : total_pages, "pages" : pages, "colors" : colors, "mtimes" : mtimes, "sizes" : sizes}
+
+	# Store the refreshed archive for the next run
+	write_cache(filename, parser, leaf)
+
+	return remember_leaf(leaf_dir, kind, leaf)
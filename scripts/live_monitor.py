@@ -0,0 +1,258 @@
+########################################################################################
+#
+# File
+#	live_monitor.py
+#
+# Description
+#	This file contains the watch mode used while an experiment campaign is still
+#	running. New run files of a leaf are parsed as they appear, folded into
+#	running aggregates and the affected figures are redrawn on a throttle. The
+#	counters of every run are only kept until a leaf has many runs, its
+#	figures are then drawn from the aggregates alone
+#
+########################################################################################
+
+import os, re, sys, time
+import numpy as np
+
+from perf_parser import parse_perf_log
+from color_parser import parse_color_log
+from leaf_cache import load_perf_leaf, load_color_leaf
+from mem_plots import performance_utilizations, plot_performance_boxplots
+from mem_colors_single import clr_std_matrix, plot_clr_figure, ALLD_COLORS
+from mem_bins import do_cache_bins_histogram
+from render_pipeline import flush_renders
+from results import perf_result, color_result, performance_result, SUMMARY_RUNS
+from accumulators import run_summary
+
+# Run files are named by their number
+run_regex = re.compile(r'^\d+$')
+
+class leaf_monitor(object):
+	""" Follows the run files of a single leaf directory as they are written """
+
+	def __init__(self, leaf_dir, data_type, platform = 'TG', settle = 1.0):
+		self.leaf_dir = leaf_dir
+		self.data_type = data_type
+		self.platform = platform
+
+		# Files modified more recently than this many seconds may still be written
+		self.settle = settle
+
+		# Names of the parsed runs, and their counters or page summaries
+		# until there are more than SUMMARY_RUNS of them
+		self.seen = set()
+		self.records = {}
+
+		if data_type == 'PF':
+			self.stats = {"miss_rate" : run_summary(), "time" : run_summary()}
+		else:
+			self.stats = {"std" : run_summary()}
+
+		return
+
+	def scan(self):
+		""" Return the settled run files that have not been parsed yet """
+
+		now = time.time()
+		new_runs = []
+
+		for name in os.listdir(self.leaf_dir):
+			if not run_regex.match(name) or name in self.seen:
+				continue
+
+			if now - os.path.getmtime(os.path.join(self.leaf_dir, name)) >= self.settle:
+				new_runs.append(int(name))
+
+		return sorted(new_runs)
+
+	def update(self, jobs = 1):
+		""" Fold the new runs into the aggregates and return how many were added """
+
+		new_runs = self.scan()
+
+		if not new_runs:
+			return 0
+
+		if self.data_type == 'PF':
+			return self.add_perf_runs(new_runs, jobs)
+
+		return self.add_color_runs(new_runs, jobs)
+
+	def add_perf_runs(self, new_runs, jobs):
+		""" Parse new perf logs and fold them into the miss-rate and time aggregates """
+
+		if not self.seen:
+			# Pick up the runs written before the monitor started through the cache
+			leaf = load_perf_leaf(self.leaf_dir, self.platform, new_runs, jobs)
+			counters = zip(leaf["accesses"], leaf["misses"], leaf["time"])
+		else:
+			counters = [parse_perf_log(os.path.join(self.leaf_dir, str(run)), self.platform) for run in new_runs]
+
+		added = []
+		for run, (accesses, misses, run_time) in zip(new_runs, counters):
+			# An incomplete log is picked up again on the next scan
+			if accesses == 0 or misses == 0 or run_time == 0:
+				continue
+
+			added.append((run, int(accesses), int(misses), float(run_time)))
+
+		# Summarize the new runs and merge them into the aggregates
+		if added:
+			leaf = perf_result(*zip(*added))
+			self.stats["miss_rate"].merge(run_summary(leaf.miss_rate(), leaf.runs))
+			self.stats["time"].merge(run_summary(leaf.time_ms(), leaf.runs))
+			self.keep([(str(item[0]), item[1:]) for item in added])
+
+		return len(added)
+
+	def add_color_runs(self, new_runs, jobs):
+		""" Parse new color logs and fold them into the color deviation aggregates """
+
+		if not self.seen:
+			# Pick up the runs written before the monitor started through the cache
+			leaf = load_color_leaf(self.leaf_dir, new_runs, jobs)
+			total_pages, pages, colors = leaf["total_pages"], leaf["pages"], leaf["colors"]
+		else:
+			parsed = [parse_color_log(os.path.join(self.leaf_dir, str(run))) for run in new_runs]
+			total_pages = np.array([item[0] for item in parsed], dtype = np.int64)
+			colors = np.array([len(item[1]) for item in parsed], dtype = np.int64)
+			pages = np.zeros((len(parsed), max(colors)), dtype = np.int64)
+			for index, item in enumerate(parsed):
+				pages[index, :colors[index]] = item[1]
+
+		# Summarize the new runs in one pass
+		alld_clr_pages, rest_clr_pages, std_clr_pages = clr_std_matrix(pages, colors, ALLD_COLORS)
+
+		# An incomplete log is picked up again on the next scan
+		complete = np.nonzero((total_pages != 0) & (colors != 0))[0]
+
+		# Merge the summary of the new runs into the aggregates
+		self.stats["std"].merge(run_summary(std_clr_pages[complete], np.asarray(new_runs)[complete]))
+		self.keep([(str(new_runs[index]), (int(total_pages[index]), int(alld_clr_pages[index]), int(rest_clr_pages[index]), std_clr_pages[index])) for index in complete])
+
+		return len(complete)
+
+	def keep(self, records):
+		""" Mark the (run, record) pairs as parsed and keep their records until
+		    the leaf has more than SUMMARY_RUNS runs """
+
+		self.seen.update([run for run, record in records])
+
+		if self.records is not None:
+			self.records.update(records)
+
+			# Past this point the figures are drawn from the aggregates
+			if len(self.seen) > SUMMARY_RUNS:
+				self.records = None
+
+		return
+
+	def status(self):
+		""" Return a single line summary of the aggregates """
+
+		line = '%s : %4d runs' % (self.leaf_dir, len(self.seen))
+
+		for name in sorted(self.stats.keys()):
+			if len(self.stats[name]):
+				line += self.stats[name].text(name)
+
+		return line
+
+	def result(self):
+		""" Return the folded runs as a perf_result or a color_result, or as the
+		    run_summary of their color deviations once only that is kept """
+
+		if self.records is None and self.data_type != 'PF':
+			return self.stats["std"]
+
+		runs = sorted(self.records.keys(), key = int)
+		columns = zip(*[self.records[run] for run in runs]) or [[]] * 4
+
+		if self.data_type == 'PF':
+			return perf_result(runs, *columns)
+
+		return color_result(runs, *columns)
+
+def render_monitors(parent_dir, data, monitors, print_title, jobs = 1):
+	""" Redraw the figures of the watched leaves from the folded runs """
+
+	if data == 'CL':
+		monitor = monitors[0][1]
+
+		# The PDF needs a spread of deviations to draw its histogram
+		moments = monitor.stats["std"].moments
+		if moments.count < 2 or moments.max == moments.min:
+			return
+
+		pdf_clr_hash = plot_clr_figure(parent_dir, print_title, monitor.result())
+
+		# Draw the bin histograms of the extrema whose perf logs are already there
+		for bins_type, run in zip(("MN", "MX"), pdf_clr_hash["extrema_files"]):
+			if os.path.isfile((parent_dir + str(run)).replace('CL', 'PF')):
+				do_cache_bins_histogram(parent_dir, {"file" : str(run), "type" : bins_type}, print_title)
+	else:
+		# Only the utilizations which already have runs get a box
+		monitors = [(util, monitor) for util, monitor in monitors if monitor.seen]
+		if not monitors:
+			return
+
+		performance = performance_result()
+		for util, monitor in monitors:
+			if monitor.records is None:
+				performance.add_summaries(util, monitor.stats["miss_rate"], monitor.stats["time"])
+			else:
+				performance.add(util, monitor.result())
+
+		plot_performance_boxplots(parent_dir, print_title, performance, jobs)
+
+	# Draw the queued figures right away
+	flush_renders(jobs)
+
+	return
+
+def watch_campaign(parent_dir, data, print_title, throttle, jobs = 1, poll = 2.0):
+	""" Follow the leaves below 'parent_dir' as runs are added and redraw their
+	    figures at most once every 'throttle' seconds, until interrupted """
+
+	monitors = {}
+	last_render = 0
+	dirty = False
+
+	if data == 'PF':
+		platform_name, utilization = performance_utilizations(parent_dir)
+	else:
+		platform_name, utilization = None, [None]
+
+	print 'Watching %s (Ctrl-C to stop)' % (parent_dir)
+
+	try:
+		while True:
+			# Start following utilization directories as soon as they show up
+			for util in utilization:
+				leaf_dir = parent_dir if util is None else parent_dir + util + '/'
+				if util not in monitors and os.path.isdir(leaf_dir):
+					monitors[util] = leaf_monitor(leaf_dir, data, platform_name)
+
+			# Keep the monitors in the order of the utilizations
+			ordered = [(util, monitors[util]) for util in utilization if util in monitors]
+
+			for util, monitor in ordered:
+				if monitor.update(jobs):
+					print '[%s] %s' % (time.strftime('%H:%M:%S'), monitor.status())
+					dirty = True
+
+			if dirty and time.time() - last_render >= throttle:
+				render_monitors(parent_dir, data, ordered, print_title, jobs)
+				last_render = time.time()
+				dirty = False
+
+			sys.stdout.flush()
+			time.sleep(min(poll, max(throttle, 0.1)))
+
+	except KeyboardInterrupt:
+		# Make sure the figures reflect every folded run
+		if dirty:
+			render_monitors(parent_dir, data, [(util, monitors[util]) for util in utilization if util in monitors], print_title, jobs)
+
+	return
@@ -1,11 +1,18 @@
 import sys, getopt
 import os
 import re
+import time
+import itertools
+from fnmatch import fnmatch
 
-# Import data from sub-scripts
-from mem_colors_single import *
-from mem_plots import *
-from mem_bins import *
+# Import the light helpers here. The sub-scripts pull in numpy and matplotlib,
+# so they are only imported once the arguments call for them
+from worker_pool import close_pool, job_count
+from render_pipeline import pending_renders, flush_renders
+import figure_manifest
+from data_source import leaf_exists
+import instrument
+from instrument import stage
 
 
 # Global Data
@@ -61,45 +68,162 @@ def build_global_data():
 	return
 
 
+# Parse the data of a single leaf of the data tree and print its aggregates
+def summarize_leaf(platform, benchmark, linux, buddy, data, corun, utilization, jobs):
+	from results import summary_text
+
+	parent_dir = '../data/%s/%s/%s/%s/%s/%s/%s/' % (platform, benchmark, linux, buddy, data, corun, utilization)
+
+	if data == 'CL':
+		from mem_colors_single import load_clr_data
+
+		result = load_clr_data(parent_dir, jobs)
+		print '%s : %4d runs' % ('_'.join((platform, benchmark, linux, buddy, data, corun, utilization)), len(result)) + summary_text('std', result.std, result.runs)
+
+	if data == 'PF':
+		from mem_plots import load_performance_data, performance_utilizations
+		from bootstrap import bootstrap_leaves, interval_text
+
+		# Print a line for every utilization of the corun directory
+		parent_dir = '../data/%s/%s/%s/%s/%s/%s/' % (platform, benchmark, linux, buddy, data, corun)
+		platform_name, utils = performance_utilizations(parent_dir)
+		results = [load_performance_data(parent_dir + util + '/', platform_name, jobs) for util in utils]
+
+		# Resample the miss-rate and time of all utilizations at once
+		with stage('aggregate'):
+			intervals = bootstrap_leaves([result.miss_rate() for result in results] + [result.time_ms() for result in results],
+						     [(parent_dir + util + '/', 'miss_rate') for util in utils] + [(parent_dir + util + '/', 'time') for util in utils], jobs)
+
+		for index, (util, result) in enumerate(zip(utils, results)):
+			print '%s : %4d runs' % ('_'.join((platform, benchmark, linux, buddy, data, corun, util)), len(result)) + summary_text('miss_rate', result.miss_rate(), result.runs) + summary_text('time', result.time_ms(), result.runs)
+			print '%s   CI' % (' ' * len('_'.join((platform, benchmark, linux, buddy, data, corun, util)))) + interval_text('miss_rate', intervals[index]) + interval_text('time', intervals[len(results) + index])
+
+	return
+
+# Name the figures of a single leaf of the data tree
+def leaf_job(platform, benchmark, linux, buddy, data, corun, utilization, selection, metric):
+	""" Return the (name, parameters) of the job drawing the figures of a leaf """
+
+	# Perf data is plotted once for all the utilizations of a corun directory
+	if data == 'PF':
+		return '_'.join((platform, benchmark, linux, buddy, data, corun)), ()
+
+	return '_'.join((platform, benchmark, linux, buddy, data, corun, utilization)), (selection, metric)
+
+# Process the data of a single leaf of the data tree
+def process_leaf(platform, benchmark, linux, buddy, data, corun, utilization, jobs, selection, metric):
+
+	parent_dir = '../data/%s/%s/%s/%s/%s/%s/%s/' % (platform, benchmark, linux, buddy, data, corun, utilization)
+
+	if data == 'CL':
+		from mem_colors_single import load_clr_data, plot_clr_figure
+		from mem_bins import do_cache_bins_histograms
+		from selection import select_runs
+
+		# Plot the data regarding the standard deviation of colors
+		result = load_clr_data(parent_dir, jobs)
+		plot_clr_figure(parent_dir, True, result)
+
+		# Pick the runs whose bin utilization is plotted
+		if metric == 'std':
+			with stage('aggregate'):
+				targets = select_runs(result.std, result.runs, selection)
+		else:
+			from mem_plots import load_performance_data
+
+			performance = load_performance_data(parent_dir.replace('CL', 'PF'), platform, jobs)
+			with stage('aggregate'):
+				targets = [('MR_' + bins_type, run, value) for bins_type, run, value in select_runs(performance.miss_rate(), performance.runs, selection)]
+
+		# Plot the bin utilization of all the selected runs in one batch
+		do_cache_bins_histograms(parent_dir, targets, True)
+
+	if data == 'PF':
+		from mem_plots import do_performance_boxplots
+
+		# Plot the box plots for all utilizations
+		parent_dir = '../data/%s/%s/%s/%s/%s/%s/' % (platform, benchmark, linux, buddy, data, corun)
+		do_performance_boxplots(parent_dir, False, jobs)
+
+	return
+
 # Create a main function for this program
 def main(argv):
 
 	# Create an internal help function for printing help information
 	def help():
 		
-		print 'profile.py -p <platform> -b <benchmark> -l <linux> -a <buddy> -d <data> -c <corun> -u <utilization>'
+		print 'profile.py -p <platform> -b <benchmark> -l <linux> -a <buddy> -d <data> -c <corun> -u <utilization> [-j <jobs>] [-w <seconds>] [-n] [-s <runs>] [-m <metric>] [-f]'
+		print 'Each dimension takes a comma separated list of values and wildcards (e.g. -c \'*\' -u 25,5*) to sweep'
+		print 'over all their combinations, skipping those without a data directory'
+		print 'Use -j <jobs> to parse the data files with <jobs> worker processes (0 uses every core)'
+		print 'Use -w <seconds> to watch a running campaign and redraw its figures at most every <seconds>'
+		print 'Use -n (--no-plot) to only parse the data and print the aggregates of every leaf'
+		print 'Use -s <runs> to pick the runs whose bin histograms are drawn, as a comma separated list of'
+		print 'min, max, top<k>, bottom<k> and p<percentile> (default min,max), ranked by -m std or -m mr (miss-rate)'
+		print 'The figures of a leaf are only redrawn when the files it reads, the options or the scripts have changed'
+		print 'since they were last drawn. Use -f (--force) to redraw every figure'
+		print 'Use --profile <file> to store the wall time, CPU time, file count, bytes and peak memory of the'
+		print 'discover, parse, aggregate, plot and save stages of every leaf as JSON, and --cprofile <stage> to'
+		print 'also dump the cProfile statistics of one stage next to it (use -j 1 to include the worker stages)'
+		print 'The wall and CPU time of a stage are those of this process, the worker wall and CPU time those of the'
+		print 'worker processes it waits for or that draw its figures, and the peak memory is the most this process'
+		print 'used during the stage above what it used when the stage started'
 		print 'For further detail about the CLI arguments, please consult \'nomenclature.txt\' file'
 
 		return
 
 	# Create another internal helper function for updating the default values of CLI arguments after
-	# error checking
+	# error checking. Comma separated values and wildcards expand to a list of values
 	def update_defaults(arg_list, value):
-		if (value not in allowed_cli_arguments[arg_list]):
-			print "Invalid Value [%s] passed for CLI Argument [%s]."  % (value, arg_list)
-			print "Please see / update \'CLI.log\' file for a list of permissable CLI argument values!" 
-			sys.exit()
+		values = []
+
+		for item in value.split(','):
+			matches = [x for x in allowed_cli_arguments[arg_list] if fnmatch(x, item)]
+
+			if matches == []:
+				print "Invalid Value [%s] passed for CLI Argument [%s]."  % (item, arg_list)
+				print "Please see / update \'CLI.log\' file for a list of permissable CLI argument values!" 
+				sys.exit()
 
-		return value
+			values += [x for x in matches if x not in values]
+
+		return values
 
 	# Assign default values to command line arguments
-	platform 	= 'TG'		# Default Platform	: Tegra
-	benchmark	= 'BW'		# Default Benchmakr	: Bandwdith - Read
-	linux 		= 'UN'		# Default Linux		: PALLOC Patched
-	buddy		= 'PL'		# Default Allocator	: Buddy + PALLOC
-	data		= 'PF'		# Default Data		: Perf Data
-	corun		= '00'		# Default Co-runners	: Solo
-	utilization	= '100'		# Default Utilization	: 100%
+	platform 	= ['TG']	# Default Platform	: Tegra
+	benchmark	= ['BW']	# Default Benchmakr	: Bandwdith - Read
+	linux 		= ['UN']	# Default Linux		: PALLOC Patched
+	buddy		= ['PL']	# Default Allocator	: Buddy + PALLOC
+	data		= ['PF']	# Default Data		: Perf Data
+	corun		= ['00']	# Default Co-runners	: Solo
+	utilization	= ['100']	# Default Utilization	: 100%
+	jobs		= 1		# Default Jobs		: Serial parsing
+	watch		= None		# Default Watch		: Process the data once
+	plot		= True		# Default Plot		: Draw the figures
+	selection	= None		# Default Selection	: Extreme runs
+	metric		= 'std'		# Default Metric	: Deviation of colors
+	profile		= None		# Default Profile	: No instrumentation
+	cprofile	= None		# Default cProfile	: No stage
+	force		= False		# Default Force		: Skip the unchanged figures
 
 	# Now get any modified values from command line
 	try:
-		opts, args = getopt.getopt(argv, "hp:b:l:a:d:c:u:o:", [ "platform=", 	\
+		opts, args = getopt.getopt(argv, "hp:b:l:a:d:c:u:o:j:w:ns:m:f", [ "platform=", 	\
 					    				"benchmark=", 	\
 					    				"linux=", 	\
 					    				"buddy=", 	\
 					    				"data=",	\
 					    				"corun=",	\
-					    				"utilization="])
+					    				"utilization=",	\
+					    				"jobs=",	\
+					    				"watch=",	\
+					    				"no-plot",	\
+					    				"select=",	\
+					    				"metric=",	\
+					    				"force",	\
+					    				"profile=",	\
+					    				"cprofile="])
 
 	except:
 		help()
@@ -127,6 +251,47 @@ def main(argv):
 			corun = update_defaults('corunners', arg)
 		elif opt in ("-u", "--utilization"):
 			utilization = update_defaults('utilizations', arg)
+		elif opt in ("-j", "--jobs"):
+			if not arg.isdigit():
+				print "Invalid Value [%s] passed for CLI Argument [jobs]." % (arg)
+				print "Please pass a non-negative number of worker processes!"
+				sys.exit()
+			jobs = int(arg)
+		elif opt in ("-w", "--watch"):
+			if not arg.isdigit():
+				print "Invalid Value [%s] passed for CLI Argument [watch]." % (arg)
+				print "Please pass the minimum number of seconds between redraws!"
+				sys.exit()
+			watch = int(arg)
+		elif opt in ("-n", "--no-plot"):
+			plot = False
+		elif opt in ("-s", "--select"):
+			from selection import parse_selection
+			try:
+				selection = parse_selection(arg)
+			except ValueError, error:
+				print "Invalid Value [%s] passed for CLI Argument [select]. %s" % (arg, error)
+				sys.exit()
+		elif opt in ("-m", "--metric"):
+			if arg not in ('std', 'mr'):
+				print "Invalid Value [%s] passed for CLI Argument [metric]." % (arg)
+				print "Please rank the runs by 'std' or 'mr'!"
+				sys.exit()
+			metric = arg
+		elif opt in ("-f", "--force"):
+			force = True
+		elif opt == "--profile":
+			profile = arg
+		elif opt == "--cprofile":
+			if arg not in instrument.STAGES:
+				print "Invalid Value [%s] passed for CLI Argument [cprofile]." % (arg)
+				print "Please pass one of the stages %s!" % (', '.join(instrument.STAGES))
+				sys.exit()
+			cprofile = arg
+
+	if cprofile is not None and profile is None:
+		print "CLI Argument [cprofile] needs a --profile file to store the stage records!"
+		sys.exit()
 
 	# Print out the values given to the parameters
 	if master_debug:
@@ -137,38 +302,127 @@ def main(argv):
 		print "Data        : ", data
 		print "Corun       : ", corun
 		print "Utilization : ", utilization
+		print "Jobs        : ", jobs
+		print "Watch       : ", watch
+		print "Plot        : ", plot
+		print "Selection   : ", selection
+		print "Metric      : ", metric
+		print "Profile     : ", profile
+		print "cProfile    : ", cprofile
+		print "Force       : ", force
 
-	# Create the name of the parent directory based on CLI arguments
-	parent_dir = '../data/%s/%s/%s/%s/%s/%s/%s/' % (platform, benchmark, linux, buddy, data, corun, utilization)
+	# Unchanged figures are skipped unless every figure is to be redrawn
+	figure_manifest.force_renders = force
+
+	# Plan the sweep over all the combinations of the given values, with the
+	# perf data of a configuration ahead of its color data
+	data = [x for x in data if x == 'PF'] + [x for x in data if x != 'PF']
+	plan = list(itertools.product(platform, benchmark, linux, buddy, data, corun, utilization))
+
+	if watch is not None:
+		if len(plan) > 1:
+			print 'Watch mode follows a single leaf. Please pass one value per CLI argument!'
+			sys.exit()
+
+		platform, benchmark, linux, buddy, data, corun, utilization = plan[0]
+
+		# Create the name of the parent directory based on CLI arguments
+		parent_dir = '../data/%s/%s/%s/%s/%s/%s/%s/' % (platform, benchmark, linux, buddy, data, corun, utilization)
 
-	if not os.path.isdir(parent_dir):
+		# Perf data of a running campaign is watched for all of its utilizations
+		if data == 'PF':
+			parent_dir = '../data/%s/%s/%s/%s/%s/%s/' % (platform, benchmark, linux, buddy, data, corun)
+
+		if not os.path.isdir(parent_dir):
+			print 'Provided CLI arguments do not constitute a valid path to data directory!'
+			print 'Path : %s' % (parent_dir)
+			sys.exit()
+
+		# Follow the campaign until interrupted
+		from live_monitor import watch_campaign
+		watch_campaign(parent_dir, data, data == 'CL', watch, jobs)
+
+		# Shut down the worker processes
+		close_pool()
+
+		return
+
+	leaves = []
+	skipped = []
+	perf_dirs = set()
+
+	for leaf in plan:
+		parent_dir = '../data/%s/%s/%s/%s/%s/%s/%s/' % leaf
+
+		# A leaf may also be stored as a tar archive
+		if not leaf_exists(parent_dir):
+			skipped.append(parent_dir)
+			continue
+
+		# Perf data is plotted once for all the utilizations of a corun directory
+		if leaf[4] == 'PF':
+			if leaf[:6] in perf_dirs:
+				continue
+			perf_dirs.add(leaf[:6])
+
+		leaves.append(leaf)
+
+	if leaves == []:
 		print 'Provided CLI arguments do not constitute a valid path to data directory!'
-		print 'Path : %s' % (parent_dir)
+		for parent_dir in skipped:
+			print 'Path : %s' % (parent_dir)
 		sys.exit()
 
-	if data == 'CL':
-		# Plot the data regarding the standard deviation of colors
-		pdf_clr_std_hash = do_clr_pdf(parent_dir, True)
+	if master_debug or len(plan) > 1:
+		print 'Processing %d leaves, skipping %d combinations without data' % (len(leaves), len(skipped))
 
-		# Create a hash for plotting the bin utilization of extrema files
-		target_hash = {}
-		target_hash["file"] = str(pdf_clr_std_hash["extrema_files"][0])
-		target_hash["type"] = "MN"
+	if profile is not None:
+		instrument.start_profile(cprofile)
+		start = time.time()
 
-		# Plot the bin utilization for max-std case
-		do_cache_bins_histogram(parent_dir, target_hash, True)
+	# Process the whole sweep in this process. The perf data of a configuration
+	# is planned before its color data so that the bin histograms reuse it
+	for leaf in leaves:
+		if master_debug:
+			print 'Leaf : %s' % ('_'.join(leaf))
 
-		# Update the hash for min-std case
-		target_hash["file"] = str(pdf_clr_std_hash["extrema_files"][1])
-		target_hash["type"] = "MX"
+		# A leaf whose inputs have not changed since its figures were drawn is
+		# skipped before any of its data is loaded
+		if plot:
+			name, params = leaf_job(*(leaf + (selection, metric)))
+			if figure_manifest.job_is_current(name, params):
+				continue
 
-		# Plot the bin utilization for min-std case
-		do_cache_bins_histogram(parent_dir, target_hash, True)
+		# Perf data is recorded once for all the utilizations of a corun directory
+		if profile is not None:
+			instrument.open_leaf('_'.join(leaf[:6] if leaf[4] == 'PF' else leaf))
 
-	if data == 'PF':
-		# Plot the box plots for all utilizations
-		parent_dir = '../data/%s/%s/%s/%s/%s/%s/' % (platform, benchmark, linux, buddy, data, corun)
-		do_performance_boxplots(parent_dir, False)
+		if plot:
+			figure_manifest.open_job(name, params)
+			process_leaf(*(leaf + (jobs, selection, metric)))
+			figure_manifest.close_job()
+		else:
+			summarize_leaf(*(leaf + (jobs,)))
+
+		instrument.close_leaf()
+
+		# Render in batches that keep every worker busy
+		if pending_renders() >= 4 * job_count(jobs):
+			flush_renders(jobs)
+
+	# Render the remaining figures
+	flush_renders(jobs)
+
+	if figure_manifest.skipped_figures:
+		print 'Skipped %d unchanged figures' % (figure_manifest.skipped_figures)
+
+	# Shut down the worker processes
+	close_pool()
+
+	# Store and print the stage records
+	if profile is not None:
+		instrument.print_totals(instrument.write_profile(profile, jobs, time.time() - start))
+		print 'Profile : %s' % (profile)
 
 	# All done
 	return
@@ -1,90 +1,171 @@
+import numpy as np
 from generic_page import *
 from collections import OrderedDict as od
+from page_parser import parse_page_dump
+from data_source import plain_name, read_data
+
+# Number of hottest pages listed for every memory area in the summary
+hot_pages = 10
+
+# Layout of a page in the binary output
+page_dtype = np.dtype([('address', '<u8'), ('count', '<i8')])
 
 class advanced_analysis(File):
 	""" This is a subclass of 'File' type objects which is created
 	    to carry out second level of memory page analysis """
 
-	def __init__(self, filename):
+	def __init__(self, filename, analyze = True, text = False):
 		super(advanced_analysis, self).__init__(filename)
 
-		# Create a hash for parsed data
-		self.data_hash = {}
+		# Create the arrays for parsed data and a hash for memory areas
+		self.addresses = np.zeros(0, dtype = np.uint64)
+		self.counts = np.zeros(0, dtype = np.int64)
 		self.mem_areas = {}
 
-		# Create the name for output file
-		self.out_file = self.name + '.ord'
+		# Create the names for output files, next to the uncompressed name
+		base_name = plain_name(self.name)
+		self.out_file = base_name + '.ord'
+		self.pages_file = base_name + '.pages.npy'
+		self.index_file = base_name + '.index.npz'
+		self.summary_file = base_name + '.sum'
 		self.memar_fd = '../data_1/memareas.profile'
 
+		# The caller may run the steps one at a time
+		if not analyze:
+			return
+
 		# Call the parse method
 		self.parse()
 
 		# Call the mem-areas profile
 		self.parse_memareas()
 
-		# Print the parsed data
-		self.print_data()
+		# Find the pages of every memory area
+		index = self.index_areas()
+
+		# Store the pages with their area index and the summary
+		self.store_data(index)
+		self.summarize(index)
+
+		# Print the parsed data as text when asked for
+		if text:
+			self.print_data()
+
+		return
 
 	def parse(self):
 		""" Parse the data in the file """
 
-		# Open and parse the file
-		with open(self.name, 'r') as fdi:
-			for line in fdi:
-				words = [word for word in line.split(' ') if word != ' ' and word != ':']
-				
-				# Store the data in the hash
-				self.data_hash[int(words[0], 16)] = int(words[1])
-
-		# Sort the dictionary by addresses
-		self.data_hash = od(sorted(self.data_hash.items(), key = lambda t : t[0]))
+		# Load the page addresses and counts sorted by address
+		self.addresses, self.counts = parse_page_dump(self.name)
 
-		print 'Total Bytes :', float(sum(self.data_hash.values())) / 1024 / 1024
+		print 'Total Bytes :', float(self.counts.sum()) / 1024 / 1024
 
 		return
 
 	def parse_memareas(self):
 		""" Parse the file which contains memareas profile """
 
-		# Open and parse the memareas-file
-		with open(self.memar_fd) as fdi:
-			for line in fdi:
-				words = [word for word in line.split(' ') if word != '']
+		# Read and parse the memareas-file, which may be compressed
+		for line in read_data(self.memar_fd).splitlines(True):
+			words = [word for word in line.split(' ') if word != '']
 
-				# Extract the start and end address of the memory area
-				mem_range = words[0].split('-')
+			# Extract the start and end address of the memory area
+			mem_range = words[0].split('-')
 
-				try:
-					start_address = int(mem_range[0], 16)
-					end_address   = int(mem_range[1], 16)
-				except:
-					raise ValueError, 'Unable to convert mem-range : (%s)' % (words[0])
+			try:
+				start_address = int(mem_range[0], 16)
+				end_address   = int(mem_range[1], 16)
+			except:
+				raise ValueError, 'Unable to convert mem-range : (%s)' % (words[0])
 
-				# Push the end address, size and designation of this area in the hash
-				self.mem_areas[start_address] = (end_address, end_address - start_address, words[-1])
+			# Push the end address, size and designation of this area in the hash
+			self.mem_areas[start_address] = (end_address, end_address - start_address, words[-1].strip())
 
 		# Sort the dictionary by start addresses
 		self.mem_areas = od(sorted(self.mem_areas.items(), key = lambda t : t[0]))
 
 		return
 
+	def index_areas(self):
+		""" Return a hash of per-area arrays holding the start, end and name of
+		    every memory area and the [first, last) range of its pages in the
+		    sorted page arrays """
+
+		index = {}
+		index["start"] = np.array(self.mem_areas.keys(), dtype = np.uint64)
+		index["end"] = np.array([area[0] for area in self.mem_areas.values()], dtype = np.uint64)
+		index["name"] = np.array([area[2] for area in self.mem_areas.values()], dtype = np.string_)
+
+		# Find the pages lying strictly inside each memory area
+		index["first"] = np.searchsorted(self.addresses, index["start"], 'right')
+		index["last"] = np.maximum(index["first"], np.searchsorted(self.addresses, index["end"], 'left'))
+
+		return index
+
+	def store_data(self, index):
+		""" Store the sorted pages as a binary array along with the area index """
+
+		pages = np.empty(len(self.addresses), dtype = page_dtype)
+		pages['address'] = self.addresses
+		pages['count'] = self.counts
+
+		np.save(self.pages_file, pages)
+		np.savez(self.index_file, **index)
+
+		return
+
+	def summarize(self, index):
+		""" Store the page count, total accesses and hottest pages of every area """
+
+		with open(self.summary_file, 'w') as fdo:
+			for start, end, name, first, last in zip(index["start"], index["end"], index["name"], index["first"], index["last"]):
+				counts = self.counts[first:last]
+
+				fdo.write('\nArea Range : 0x%.9x - 0x%.9x | %s\n' % (start, end, name))
+				fdo.write('Pages : %d | Accesses : %d\n\n' % (len(counts), counts.sum()))
+
+				# Pick the hottest pages without sorting the whole area
+				hottest = np.argpartition(counts, -hot_pages)[-hot_pages:] if len(counts) > hot_pages else np.arange(len(counts))
+				hottest = hottest[np.lexsort((hottest, -counts[hottest]))]
+
+				fdo.writelines(['0x%.8x : %d\n' % item for item in zip(self.addresses[first + hottest].tolist(), counts[hottest].tolist())])
+
+		return
+
 	def print_data(self):
 		""" This is the function for storing the output data """
 
 		# Open the output file
 		fdo = open(self.out_file, 'w')
 
-		for area in self.mem_areas.keys():
+		index = self.index_areas()
+
+		for area, first, last in zip(self.mem_areas.keys(), index["first"], index["last"]):
 			fdo.write('\nArea Range : 0x%.9x - 0x%.9x\n\n' % (area, self.mem_areas[area][0]))
-			for key in self.data_hash.keys():
-				if key > area and key < self.mem_areas[area][0]:
-					# Find out if the page lies in the memory area
-					fdo.write('0x%.8x : %d\n' % (key, self.data_hash[key]))
+
+			fdo.writelines(['0x%.8x : %d\n' % item for item in zip(self.addresses[first:last].tolist(), self.counts[first:last].tolist())])
 
 		fdo.close()
 
 		return
 
+def load_area(filename, area):
+	""" Return the pages of a single memory area, given by its start address, from
+	    the binary output of a page dump. Only the pages of the area are read """
+
+	with np.load(filename + '.index.npz') as archive:
+		index = dict((key, archive[key]) for key in archive.files)
+
+	row = np.nonzero(index["start"] == np.uint64(area))[0]
+	if len(row) == 0:
+		raise ValueError, 'Memory area (0x%x) is not part of the index' % (area)
+
+	# Map the page array and copy out the slice of the area
+	pages = np.load(filename + '.pages.npy', mmap_mode = 'r')
+
+	return np.array(pages[index["first"][row[0]]:index["last"][row[0]]])
+
 def main():
 	""" This is the primary entry point into the application """
 
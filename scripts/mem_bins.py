@@ -1,17 +1,20 @@
-import re
+import re, sys
+import os
 import numpy as np
-import pylab as pl
-import scipy.stats as stats
 
 from generic_page import *
+from perf_parser import parse_perf_log
 from helper_functions import *
+from color_parser import parse_color_log
+from data_source import plain_name
+from leaf_cache import loaded_leaf
+from render_pipeline import queue_render, flush_renders
+from instrument import stage, count_io, active_leaf
 
 # Set to 1 if debugging required
 bins_histogram_debug = 0
 
-# Global Data
-plot_bins_data = {}
-plot_performance_data = {}
+# Colors the pages are allowed to be placed in
 ALLD_COLORS = 0x0FFFFFFF
 
 class mem_page(File):
@@ -32,44 +35,20 @@ class mem_page(File):
 
 	def parse(self):
 		""" This is the primary function for extracting miss-rate from a perf log file """
-		accesses = misses = time = 0
-
-		# Open and parse the file
-		with open(self.name, 'r') as fdi:
-			for line in fdi:
-				# Check the platform type to select appropriate regex
-				if self.platform == 'XE':
-					# Get the required lines
-					refsLine = re.match('^\D*([\d,]+) cache-references.*$', line)
-					missLine = re.match('^\D*([\d,]+) cache-misses.*$', line)
-					timeLine = re.match('^\D*([\d.]+) seconds time.*$', line)
-				elif self.platform == 'TG':
-					# Get the required lines
-					refsLine = re.match('^\D*([\d,]+) r50.*$', line)
-					missLine = re.match('^\D*([\d,]+) r52.*$', line)
-					timeLine = re.match('^\D*([\d.]+) seconds time.*$', line)
-
-				if refsLine:
-					accesses = int(re.sub('\D', '', refsLine.group(1)))
-
-				if missLine:
-					misses   = int(re.sub('\D', '', missLine.group(1)))
-
-				if timeLine:
-					try:
-						time = float(timeLine.group(1))
-					except:
-						raise ValueError, 'Could not convert string (%s) to float' % (time.group(1))
+		# Extract the counters using the shared parser of this platform
+		accesses, misses, time = parse_perf_log(self.name, self.platform)
 
 		if accesses == 0 or misses == 0 or time == 0:
 			print 'Unexpected File : %s' % (self.name)
 			sys.exit(2)
 
 		# Extract the file number
-		file_number = (re.match("^.*/(\d+)", self.name)).group(1)
+		self.run = int((re.match("^.*/(\d+)", self.name)).group(1))
 
-		# Insert the data in the hash
-		plot_performance_data[file_number] = (accesses, misses, time)
+		# Keep the counters with this file object
+		self.accesses = accesses
+		self.misses = misses
+		self.time = time
 
 		return
 
@@ -90,36 +69,24 @@ class mem_color(File, Helper):
 		""" This is the primary function for extracting color distribution information
 		    from pagetype data """
 
-		# Get a bit-list of allowed color bins
-		bit_list = self.bit_numbers(ALLD_COLORS)
+		# Get the mask of allowed color bins
+		allowed = ColorMask(ALLD_COLORS)
 
-		total_pages = alld_clr_pages = rest_clr_pages = 0
-		pages = []
+		alld_clr_pages = rest_clr_pages = 0
 		alld_pages = []
 
-		# Open and parse the file
-		with open(self.name, 'r') as fdi:
-			for line in fdi:
-				# Get the required lines
-				total_pages_line = re.match("^.*###\D*(\d+)", line)
-				color_line = re.match("^.*Color.*:\D*(\d+)", line)
-
-				if total_pages_line:
-					total_pages = int(total_pages_line.group(1))
-
-				if color_line:
-					pages.append(int(color_line.group(1)))
-
+		# Extract the page counts using the shared parser
+		total_pages, pages = parse_color_log(self.name)
 
 		if total_pages == 0 or pages == []:
 			print 'Unexpected File : %s' % (self.name)
 
 		# Extract the file number
-		file_number = (re.match("^.*/(\d+)$", self.name)).group(1)
+		self.run = int((re.match("^.*/(\d+)$", plain_name(self.name))).group(1))
 
 		color = 0
 		for page_items in pages:
-			if color in bit_list:
+			if color in allowed:
 				alld_clr_pages += pages[color]
 				alld_pages.append(pages[color])
 			else:
@@ -134,61 +101,107 @@ class mem_color(File, Helper):
 		std_clr_pages = np.std(sorted_clr_pages)
 		
 
-		# Insert the data in the hash
-		plot_bins_data[file_number] = (total_pages, alld_clr_pages, rest_clr_pages, std_clr_pages, alld_pages)
+		# Keep the summary with this file object
+		self.total_pages = total_pages
+		self.alld_clr_pages = alld_clr_pages
+		self.rest_clr_pages = rest_clr_pages
+		self.std_clr_pages = std_clr_pages
+		self.alld_pages = alld_pages
 
 		return
 
 # bins_histogram_plot
 # Function to plot histogram using the data parsed from the target file
-def bins_histogram_plot(target_hash, title):
+def bins_histogram_plot(figname, title, alld_pages, miss_rate, run_time, std_clr_pages):
 	""" Function for plotting the collected data about page distribution """
 
+	# The plotting modules are only loaded once a figure is drawn
+	from matplotlib.figure import Figure
+	from matplotlib.backends.backend_agg import FigureCanvasAgg
+
 	# Font size for plot titles
 	pl_fontsize = 15
-	pl_rows = 1
-	pl_cols = 1
 	top = 35
-	right = 28
 
-	pl.bar(range(28), plot_bins_data[target_hash["file"]][-1], 1, color = 'g')
+	# One bar for each allowed color found in the run
+	right = len(alld_pages)
+
+	# Draw on a private Agg figure
+	fig = Figure(figsize = (15, 5))
+	FigureCanvasAgg(fig)
+	ax = fig.add_subplot(111)
+
+	ax.bar(range(right), alld_pages, 1, color = 'g')
 
-	pl.xlim(0, right)
-	pl.ylim(0, top)
+	ax.set_xlim(0, right)
+	ax.set_ylim(0, top)
 
-	pl.xlabel('Cache Colors', fontsize = pl_fontsize)
-	pl.ylabel('Page Count', fontsize = pl_fontsize)
+	ax.set_xlabel('Cache Colors', fontsize = pl_fontsize)
+	ax.set_ylabel('Page Count', fontsize = pl_fontsize)
 
-	pl.text(0.5, top - 2, 'Miss-Rate = ' + '%.2f' % target_hash["miss_rate"] + '%', fontsize = pl_fontsize)
-	pl.text(0.5, top - 4, 'Time = ' + '%.2f' % target_hash["time"] + ' sec', fontsize = pl_fontsize)
-	pl.text(0.5, top - 6, r'$\sigma$ = ' + '%.2f' % plot_bins_data[target_hash["file"]][-2], fontsize = pl_fontsize)
+	ax.text(0.5, top - 2, 'Miss-Rate = ' + '%.2f' % miss_rate + '%', fontsize = pl_fontsize)
+	ax.text(0.5, top - 4, 'Time = ' + '%.2f' % run_time + ' sec', fontsize = pl_fontsize)
+	ax.text(0.5, top - 6, r'$\sigma$ = ' + '%.2f' % std_clr_pages, fontsize = pl_fontsize)
 
 	# Give the prescribed title to the plot
-	pl.title(title)
+	ax.set_title(title)
 
-	return
+	# Save the figure
+	with stage('save'):
+		fig.savefig(figname)
+		count_io(1, os.path.getsize(figname))
 
-def do_cache_bins_histogram(parent_dir, target_hash, print_title):
-	""" Helper function for plotting the histogram of a single experiment run """
+	return
 
-	# Create a figure to save all plots
-	fig = pl.figure(figsize = (15, 5))
-	figname = ('_'.join(parent_dir.split('/')[2:]))[:-1] + '_' + target_hash["type"] + '.png'
+def bins_runs_data(parent_dir, runs):
+	""" Return a hash of run -> (allowed pages, std of allowed pages, miss-rate, time)
+	    for some runs of a color leaf. The leaves already loaded by this process
+	    are used and only the runs missing from them are parsed """
 
 	# Extract the platform name from the given path
 	platform_name = str(re.match(r'^.*/data/([A-Z]+)/.*$', parent_dir).group(1))
-
-	# Parse the data in the target file
-	target_file = parent_dir + target_hash["file"]
-
-	# Create the target performance file name corresponding to this color file
-	target_perf_file = target_file.replace('CL', 'PF')
-	mem_color(target_file)
-	mem_page(target_perf_file, platform = platform_name)
-
-	# Update the data in plot_bins_data hash as per the performance data
-	target_hash["miss_rate"] = ((float(plot_performance_data[target_hash["file"]][1])/plot_performance_data[target_hash["file"]][0]) * 100)
-	target_hash["time"] = plot_performance_data[target_hash["file"]][2]
+	perf_dir = parent_dir.replace('CL', 'PF')
+
+	color_leaf = loaded_leaf(parent_dir, 'color')
+	perf_leaf = loaded_leaf(perf_dir, 'perf')
+
+	color_rows = dict((run, row) for row, run in enumerate(color_leaf["runs"])) if color_leaf is not None else {}
+	perf_rows = dict((run, row) for row, run in enumerate(perf_leaf["runs"])) if perf_leaf is not None else {}
+
+	runs_data = {}
+	for run in set(runs):
+		if run in color_rows:
+			row = color_rows[run]
+			pages = color_leaf["pages"][row, :color_leaf["colors"][row]]
+			alld_pages = pages[ColorMask(ALLD_COLORS).to_vector(len(pages))]
+			std_clr_pages = np.std(alld_pages)
+		else:
+			with stage('parse'):
+				color = mem_color(parent_dir + str(run))
+				if active_leaf() is not None:
+					count_io(1, color.size())
+			alld_pages, std_clr_pages = color.alld_pages, color.std_clr_pages
+
+		if run in perf_rows:
+			row = perf_rows[run]
+			accesses, misses, time = perf_leaf["accesses"][row], perf_leaf["misses"][row], perf_leaf["time"][row]
+		else:
+			with stage('parse'):
+				page = mem_page(perf_dir + str(run), platform = platform_name)
+				if active_leaf() is not None:
+					count_io(1, page.size())
+			accesses, misses, time = page.accesses, page.misses, page.time
+
+		runs_data[run] = ([int(count) for count in alld_pages], std_clr_pages, (float(misses)/accesses) * 100, float(time))
+
+	return runs_data
+
+def do_cache_bins_histograms(parent_dir, targets, print_title):
+	""" Helper function for plotting the histograms of a batch of experiment runs,
+	    given as (type, run, ...) tuples. Returns the hash of bins_runs_data """
+
+	with stage('aggregate'):
+		runs_data = bins_runs_data(parent_dir, [int(target[1]) for target in targets])
 
 	# Perform the actual plotting
 	util  = str(re.match(r'^.*/(\d+)/$', parent_dir).group(1))
@@ -199,10 +212,22 @@ def do_cache_bins_histogram(parent_dir, target_hash, print_title):
 	else:
 		title = ''
 
-	bins_histogram_plot(target_hash, title)
+	for target in targets:
+		figname = ('_'.join(parent_dir.split('/')[2:]))[:-1] + '_' + target[0] + '.png'
+		alld_pages, std_clr_pages, miss_rate, time = runs_data[int(target[1])]
 
-	# Save the figure
-	fig.savefig('../figs/' + figname)
+		# Queue the histogram for the rendering stage
+		queue_render(bins_histogram_plot, '../figs/' + figname, title, alld_pages, miss_rate, time, std_clr_pages)
+
+	return runs_data
+
+def do_cache_bins_histogram(parent_dir, target_hash, print_title):
+	""" Helper function for plotting the histogram of a single experiment run """
+
+	runs_data = do_cache_bins_histograms(parent_dir, [(target_hash["type"], int(target_hash["file"]))], print_title)
+
+	# Update the target hash as per the performance data
+	target_hash["miss_rate"], target_hash["time"] = runs_data[int(target_hash["file"])][2:]
 
 	return
 
@@ -228,6 +253,9 @@ def main():
 	# Make the histogram plot
 	do_cache_bins_histogram(parent_dir, data_hash, False)
 
+	# Render the queued figures
+	flush_renders()
+
 	return
 
 # Desginate main as the entry point
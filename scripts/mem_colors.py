@@ -5,15 +5,14 @@ import scipy.stats as stats
 
 from generic_page import *
 from helper_functions import *
+from color_parser import parse_color_log
+from results import color_result
+from leaf_cache import leaf_runs
 
 # Set to 1 if debugging required
 debug = 0
 
-# Global Data
-plot_data = {}
-avg_std = []
-extrema_std = []
-extrema_files = []
+# Colors the pages are allowed to be placed in
 ALLD_COLORS = 0x00FFFFFF
 
 class mem_color(File, Helper):
@@ -33,36 +32,24 @@ class mem_color(File, Helper):
 		""" This is the primary function for extracting color distribution information
 		    from pagetype data """
 
-		# Get a bit-list of allowed color bins
-		bit_list = self.bit_numbers(ALLD_COLORS)
+		# Get the mask of allowed color bins
+		allowed = ColorMask(ALLD_COLORS)
 
-		total_pages = alld_clr_pages = rest_clr_pages = 0
-		pages = []
+		alld_clr_pages = rest_clr_pages = 0
 		alld_pages = []
 
-		# Open and parse the file
-		with open(self.name, 'r') as fdi:
-			for line in fdi:
-				# Get the required lines
-				total_pages_line = re.match("^.*###\D*(\d+)", line)
-				color_line = re.match("^.*Color.*:\D*(\d+)", line)
-
-				if total_pages_line:
-					total_pages = int(total_pages_line.group(1))
-
-				if color_line:
-					pages.append(int(color_line.group(1)))
-
+		# Extract the page counts using the shared parser
+		total_pages, pages = parse_color_log(self.name)
 
 		if total_pages == 0 or pages == []:
 			print 'Unexpected File : %s' % (self.name)
 
 		# Extract the file number
-		file_number = (re.match("^.*colors(\d+)", self.name)).group(1)
+		self.run = int((re.match("^.*colors(\d+)", self.name)).group(1))
 
 		color = 0
 		for page_items in pages:
-			if color in bit_list:
+			if color in allowed:
 				alld_clr_pages += pages[color]
 				alld_pages.append(pages[color])
 			else:
@@ -77,56 +64,42 @@ class mem_color(File, Helper):
 		std_clr_pages = np.std(sorted_clr_pages)
 		
 
-		# Insert the data in the hash
-		plot_data[file_number] = (total_pages, alld_clr_pages, rest_clr_pages, std_clr_pages)
+		# Keep the summary with this file object
+		self.total_pages = total_pages
+		self.alld_clr_pages = alld_clr_pages
+		self.rest_clr_pages = rest_clr_pages
+		self.std_clr_pages = std_clr_pages
 
 		if debug:
-			print 'plot_data[' + file_number + '] : ', plot_data[file_number]
+			print 'colors[%d]    : ' % (self.run), (total_pages, alld_clr_pages, rest_clr_pages, std_clr_pages)
 			print 'pages        : ', pages
 			print 'alld_pages   : ', alld_pages
-			print 'bit_list     : ', bit_list
+			print 'allowed      : ', allowed
 
 		return
 
 # plot_data
 # Function to plot_data parsed from the files
-def plotdata(position, title):
-	""" Function for plotting the collected data about page distribution """
+def plotdata(result, position, title):
+	""" Function for plotting the page distribution of a color_result. Returns
+	    a hash summarizing the plotted data """
 
 	# Font size for plot titles
 	pl_fontsize = 15
 	pl_rows = 2
 	pl_cols = 7
 
-	std_clr_array = []
-	alld_pages_array = []
-	rest_pages_array = []
-	total_pages_array = []
-	number = 0
-	max_std = 0.0
-	min_std = 100.0
-	for item in plot_data.keys():
-		std_clr_array.append(plot_data[item][3])
-		rest_pages_array.append(plot_data[item][2])
-		alld_pages_array.append(plot_data[item][1])
-		total_pages_array.append(plot_data[item][0])
-
-		if std_clr_array[number] > max_std:
-			max_std = std_clr_array[number]
-			max_file = int(item)
-
-		if std_clr_array[number] < min_std:
-			min_std = std_clr_array[number]
-			min_file = int(item)
-			
-		number += 1
-	
-	net_pages = sum(total_pages_array)
-	net_alld_pages = sum(alld_pages_array)
-	net_rest_pages = sum(rest_pages_array)
+	plot_hash = {}
+
+	# Find the runs with the extreme deviations
+	(min_std, max_std), (min_file, max_file) = result.extrema()
+
+	net_pages = result.total_pages.sum()
+	net_alld_pages = result.alld_pages.sum()
+	net_rest_pages = result.rest_pages.sum()
 
 	# Sort the data
-	std_array = sorted(std_clr_array)
+	std_array = np.sort(result.std)
 
 	if debug:
 		# Display the data
@@ -137,10 +110,10 @@ def plotdata(position, title):
 	std_clr_mean = np.mean(std_array)
 	std_clr_std  = np.std(std_array)
 	
-	# Push the data into the global arrays
-	avg_std.append(std_clr_mean)
-	extrema_std.append((min_std, max_std))
-	extrema_files.append((min_file, max_file))
+	# Summarize the data regarding the plots
+	plot_hash['average'] = std_clr_mean
+	plot_hash['extrema_std'] = (min_std, max_std)
+	plot_hash['extrema_files'] = (min_file, max_file)
 
 	# Fit a normal curve on the sorted data
 	fit = stats.norm.pdf(std_array, std_clr_mean, std_clr_std)
@@ -186,13 +159,11 @@ def plotdata(position, title):
 	pl.xlabel('Pages in Allowed vs Restricted Colors')
 	pl.ylabel('% of Pages')
 
-	return
+	return plot_hash
 
 def do_set(platform, corun, mint, part, util, pos):
-	""" Helper function for plotting mutiple data sets """
-
-	# Reset the global plot-data hash
-	plot_data = {}
+	""" Helper function for plotting mutiple data sets. Returns the summary
+	    of the plotted set """
 
 	# Set the parent directory path based on platform name
 	parent_dir = ''
@@ -202,15 +173,14 @@ def do_set(platform, corun, mint, part, util, pos):
 	else:
 		parent_dir = '../data/'
 
-	# Parse the data in each file
-	for item in range(1, 1000):
-		mem_color(parent_dir + part + '/' + corun + '/data_' + mint + '_' + part + '/' + util + '/colors' + str(item))
+	# Parse the data in each file found in the directory
+	leaf_dir = parent_dir + part + '/' + corun + '/data_' + mint + '_' + part + '/' + util + '/'
+	colors = [mem_color(leaf_dir + 'colors' + str(item)) for item in leaf_runs(leaf_dir, 'colors')]
+	result = color_result([color.run for color in colors], [color.total_pages for color in colors], [color.alld_clr_pages for color in colors], [color.rest_clr_pages for color in colors], [color.std_clr_pages for color in colors])
 
 	# Perform the actual plotting
 	title = util + '%'
-	plotdata(pos, title)
-
-	return
+	return plotdata(result, pos, title)
 
 def main():
 	""" This is the primary entry point into the script """
@@ -218,6 +188,9 @@ def main():
 	# Create a figure to save all plots
 	fig = pl.figure(1, figsize = (35, 15))
 
+	# Summaries of the plotted sets
+	sets = []
+
 	# Set the partition type
 	part = 'sets'
 	platform = 'tegra'
@@ -241,7 +214,7 @@ def main():
 			util = str(util)
 
 			# Plot the data one set at a time
-			do_set(platform, 'solo', 'modf', part, util, pos)
+			sets.append(do_set(platform, 'solo', 'modf', part, util, pos))
 
 			# Update the position for the next plot
 			pos += 1		
@@ -252,17 +225,17 @@ def main():
 		pl.suptitle('Xeon | BW-R | ' + part_size + ' | ' + ws_size + ' | ' + part[0].upper() + part[1:] + ' | Colors');
 
 		# Plot the data one set at a time
-		do_set(platform, 'solo', 'mint', '', part, 1)
-		do_set(platform, 'corun', 'mint', '', part, 3)
-		do_set(platform, 'solo', 'modf', '', part, 2)
-		do_set(platform, 'corun', 'modf', '', part, 4)		
+		sets.append(do_set(platform, 'solo', 'mint', '', part, 1))
+		sets.append(do_set(platform, 'corun', 'mint', '', part, 3))
+		sets.append(do_set(platform, 'solo', 'modf', '', part, 2))
+		sets.append(do_set(platform, 'corun', 'modf', '', part, 4))		
 
 	fig.savefig(figname)
 	
-	# Print the global data
-	print '<Std>      : ', avg_std
-	print '[Std]      : ', extrema_std
-	print 'Files      : ', extrema_files
+	# Print the summary of all sets
+	print '<Std>      : ', [item['average'] for item in sets]
+	print '[Std]      : ', [item['extrema_std'] for item in sets]
+	print 'Files      : ', [item['extrema_files'] for item in sets]
 	
 	return
 
@@ -1,17 +1,22 @@
 import re, sys
+import os
 import numpy as np
-import pylab as pl
-import scipy.stats as stats
 from math import ceil
 
 from generic_page import *
 from helper_functions import *
+from color_parser import parse_color_log
+from data_source import plain_name
+from leaf_cache import load_color_leaf, leaf_runs
+from render_pipeline import queue_render, flush_renders
+from results import color_result
+from accumulators import run_summary
+from instrument import stage, count_io
 
 # Set to 1 if debugging required
 pdf_std_debug = 0
 
-# Global Data
-plot_std_clr_data = {}
+# Colors the pages are allowed to be placed in
 ALLD_COLORS = 0x0FFFFFFF
 
 class mem_color(File, Helper):
@@ -31,163 +36,208 @@ class mem_color(File, Helper):
 		""" This is the primary function for extracting color distribution information
 		    from pagetype data """
 
-		# Get a bit-list of allowed color bins
-		bit_list = self.bit_numbers(ALLD_COLORS)
-
-		total_pages = alld_clr_pages = rest_clr_pages = 0
-		pages = []
-		alld_pages = []
-
-		# Open and parse the file
-		with open(self.name, 'r') as fdi:
-			for line in fdi:
-				# Get the required lines
-				total_pages_line = re.match("^.*###\D*(\d+)", line)
-				color_line = re.match("^.*Color.*:\D*(\d+)", line)
-
-				if total_pages_line:
-					total_pages = int(total_pages_line.group(1))
-
-				if color_line:
-					pages.append(int(color_line.group(1)))
-
+		# Extract the page counts using the shared parser
+		total_pages, pages = parse_color_log(self.name)
 
 		if total_pages == 0 or pages == []:
 			print 'Unexpected File : %s' % (self.name)
 			sys.exit(2)
 
 		# Extract the file number
-		file_number = (re.match("^.*/(\d+)$", self.name)).group(1)
+		self.run = int((re.match("^.*/(\d+)$", plain_name(self.name))).group(1))
 
-		color = 0
-		for page_items in pages:
-			if color in bit_list:
-				alld_clr_pages += pages[color]
-				alld_pages.append(pages[color])
-			else:
-				rest_clr_pages += pages[color]
+		# Summarize the page distribution as a single row matrix
+		alld_clr_pages, rest_clr_pages, std_clr_pages = clr_std_matrix(np.array([pages]), np.array([len(pages)]), ALLD_COLORS)
 
-			color += 1
+		# Keep the summary with this file object
+		self.total_pages = total_pages
+		self.alld_pages = int(alld_clr_pages[0])
+		self.rest_pages = int(rest_clr_pages[0])
+		self.std = std_clr_pages[0]
 
-		# Sort the pages in allowed colors
-		sorted_clr_pages = sorted(alld_pages)
+		return
 
-		# Calculate the standard deviation of allowed color pages
-		std_clr_pages = np.std(sorted_clr_pages)
+# clr_mask_vector
+# Function to expand a color mask into a boolean vector
+def clr_mask_vector(mask, colors):
+	""" Return a boolean vector marking the allowed bins among the first 'colors' """
+
+	return ColorMask(mask).to_vector(colors)
+
+# clr_std_matrix
+# Function to summarize the page distribution of many runs in one pass
+def clr_std_matrix(pages, colors, mask):
+	""" Return the allowed pages, restricted pages and standard deviation of the
+	    allowed pages for every row of a (runs x colors) page matrix, where
+	    'colors' holds the number of valid colors in each row """
+
+	# Select the allowed and restricted bins present in each run
+	present = np.arange(pages.shape[1]) < colors[:, np.newaxis]
+	alld = present & clr_mask_vector(mask, pages.shape[1])
+	rest = present & ~alld
+
+	alld_count = alld.sum(axis = 1)
+	alld_clr_pages = np.where(alld, pages, 0).sum(axis = 1)
+	rest_clr_pages = np.where(rest, pages, 0).sum(axis = 1)
+
+	# Calculate the standard deviation of allowed color pages of every run
+	with np.errstate(invalid = 'ignore', divide = 'ignore'):
+		mean = alld_clr_pages / alld_count.astype(np.float64)
+		std_clr_pages = np.sqrt(np.where(alld, (pages - mean[:, np.newaxis]) ** 2, 0).sum(axis = 1) / alld_count)
+
+	return alld_clr_pages, rest_clr_pages, std_clr_pages
+
+# load_clr_data
+# Function to load the page distribution of all the runs in a leaf
+def load_clr_data(leaf_dir, jobs = 1):
+	""" Load the color data of all the runs in a leaf as a color_result """
+
+	# Every run file of the leaf is loaded, cached page vectors are used for
+	# every run whose file has not changed
+	runs = leaf_runs(leaf_dir)
+	with stage('parse'):
+		leaf = load_color_leaf(leaf_dir, runs, jobs)
+
+	# Apply the same sanity check as the per-file parser
+	unexpected = np.nonzero((leaf["total_pages"] == 0) | (leaf["colors"] == 0))[0]
+	if len(unexpected):
+		print 'Unexpected File : %s' % (leaf_dir + str(leaf["runs"][unexpected[0]]))
+		sys.exit(2)
+
+	# Summarize all the runs of the leaf at once
+	with stage('aggregate'):
+		alld_clr_pages, rest_clr_pages, std_clr_pages = clr_std_matrix(leaf["pages"], leaf["colors"], ALLD_COLORS)
+
+	return color_result(leaf["runs"], leaf["total_pages"], alld_clr_pages, rest_clr_pages, std_clr_pages)
+
+# clr_summary
+# Function to summarize the color distribution of pages
+def clr_summary(result):
+	""" Return a hash with the average, extrema and extrema files of the
+	    deviations in a color_result or in the run_summary of many runs """
 
-		# Insert the data in the hash
-		plot_std_clr_data[file_number] = (total_pages, alld_clr_pages, rest_clr_pages, std_clr_pages)
+	pdf_clr_std_data = {}
 
-		return
+	if isinstance(result, run_summary):
+		moments = result.moments
+		(min_std, max_std), (min_file, max_file) = (moments.min, moments.max), (moments.min_file, moments.max_file)
+		std_clr_mean = moments.mean
+	else:
+		# Find the runs with the extreme deviations
+		(min_std, max_std), (min_file, max_file) = result.extrema()
+
+		# Calculate the mean of the deviations
+		std_clr_mean = np.mean(result.std)
+
+	# Push the data into the summary hash
+	pdf_clr_std_data['average'] = std_clr_mean
+	pdf_clr_std_data['extrema_std'] = (min_std, max_std)
+	pdf_clr_std_data['extrema_files'] = (min_file, max_file)
+
+	if pdf_std_debug:
+		print "Max File : %d | Min File : %d" % (max_file, min_file)
+		print "Max Std : %.3f | Min Std : %.3f " % (max_std, min_std)
+
+	return pdf_clr_std_data
 
 # plot_clr_pdf
-# Function to plot probability density function of color distribution of pages
-def plot_clr_pdf(title):
-	""" Function for plotting the collected data about page distribution """
+# Function to summarize the color distribution of pages and queue its plot
+def plot_clr_pdf(figname, title, result):
+	""" Function for plotting the page distribution summarized in a color_result
+	    or in a run_summary """
+
+	pdf_clr_std_data = clr_summary(result)
+
+	# Queue the figure for the rendering stage, a run_summary is drawn from
+	# the buckets of its sketch
+	if isinstance(result, run_summary):
+		values, counts = result.sketch.histogram()
+		queue_render(render_clr_pdf, figname, title, np.clip(values, result.moments.min, result.moments.max), counts)
+	else:
+		queue_render(render_clr_pdf, figname, title, np.sort(result.std))
+
+	return pdf_clr_std_data
+
+# render_clr_pdf
+# Function to draw the probability density function of color distribution of pages
+def render_clr_pdf(figname, title, std_array, weights = None):
+	""" Function for drawing the PDF of the sorted deviations of all runs, or of
+	    sorted deviations seen as many times as their 'weights' """
+
+	# The plotting modules are only loaded once a figure is drawn
+	import scipy.stats as stats
+	from matplotlib.figure import Figure
+	from matplotlib.backends.backend_agg import FigureCanvasAgg
+	from matplotlib.ticker import NullLocator
 
 	# Font size for plot titles
 	pl_fontsize = 15
-	pl_rows = 1
-	pl_cols = 1
-
-	pdf_clr_std_data = {}
-	std_clr_array = []
-	alld_pages_array = []
-	rest_pages_array = []
-	total_pages_array = []
-	number = 0
-	max_std = 0.0
-	min_std = 100.0
-
-	for item in plot_std_clr_data.keys():
-		std_clr_array.append(plot_std_clr_data[item][3])
-		rest_pages_array.append(plot_std_clr_data[item][2])
-		alld_pages_array.append(plot_std_clr_data[item][1])
-		total_pages_array.append(plot_std_clr_data[item][0])
-
-		if std_clr_array[number] > max_std:
-			max_std = std_clr_array[number]
-			max_file = int(item)
-
-		if std_clr_array[number] < min_std:
-			min_std = std_clr_array[number]
-			min_file = int(item)
-			
-		number += 1
-	
-	net_pages = sum(total_pages_array)
-	net_alld_pages = sum(alld_pages_array)
-	net_rest_pages = sum(rest_pages_array)
 
-	# Sort the data
-	std_array = sorted(std_clr_array)
+	min_std = std_array[0]
+	max_std = std_array[-1]
 
 	# Calculate the mean and standard deviation
-	std_clr_mean = np.mean(std_array)
-	std_clr_std  = np.std(std_array)
-	
-	# Push the data into the global arrays
-	pdf_clr_std_data['average'] = std_clr_mean
-	pdf_clr_std_data['extrema_std'] = (min_std, max_std)
-	pdf_clr_std_data['extrema_files'] = (min_file, max_file)
+	std_clr_mean = np.average(std_array, weights = weights)
+	std_clr_std  = np.sqrt(np.average((std_array - std_clr_mean) ** 2, weights = weights))
+
+	# Create a standalone Agg figure for this plot
+	fig = Figure(figsize = (10, 8))
+	FigureCanvasAgg(fig)
+	ax = fig.add_subplot(111)
 
 	# Fit a normal curve on the sorted data
 	fit = stats.norm.pdf(std_array, std_clr_mean, std_clr_std)
 
 	# Plot the normal curve
-	pl.plot(std_array, fit)
+	ax.plot(std_array, fit)
 
 	# Plot the histogram along the curve
 	hist_bins = np.arange(min_std, max_std, ((max_std - min_std) / 10))
-	hist_x, hist_y, _ = pl.hist(std_array, normed = True, bins = hist_bins)
+	hist_x, hist_y, _ = ax.hist(std_array, normed = True, bins = hist_bins, weights = weights)
 	y_limit = ceil(hist_x.max()) + 0.1
 
 	# Plot vertical lines to indicate min-max values
-	pl.plot([max_std, max_std], [0, y_limit], '-r')
-	pl.plot([min_std, min_std], [0, y_limit], '-g')
+	ax.plot([max_std, max_std], [0, y_limit], '-r')
+	ax.plot([min_std, min_std], [0, y_limit], '-g')
 
 	# State the x-label and y-label
-	pl.xlabel(r'$\sigma$ of Page Distribution')
-	pl.ylabel('PDF')
+	ax.set_xlabel(r'$\sigma$ of Page Distribution')
+	ax.set_ylabel('PDF')
 
 	# Hide the ticks on the y-axis
-	pl.gca().yaxis.set_major_locator(pl.NullLocator())
+	ax.yaxis.set_major_locator(NullLocator())
 
 	# Set axes limits
-	pl.xlim(0, 12)
-	pl.ylim(0, y_limit)
+	ax.set_xlim(0, 12)
+	ax.set_ylim(0, y_limit)
 
 	# Set the title of the plot
 	if ((max_std - min_std) < 2):
-		pl.text(max_std + 0.1, y_limit - 5, r'$\mu$ = ' + format(std_clr_mean, '0.2f'))
+		ax.text(max_std + 0.1, y_limit - 5, r'$\mu$ = ' + format(std_clr_mean, '0.2f'))
 	else:
-		pl.text(std_clr_mean + 0.2, y_limit - 0.4, r'$\mu$ = ' + format(std_clr_mean, '0.2f'))
+		ax.text(std_clr_mean + 0.2, y_limit - 0.4, r'$\mu$ = ' + format(std_clr_mean, '0.2f'))
 
-	pl.text(max_std + 0.1, 5, r'max( $\sigma$ ) = ' + format(max_std, '0.2f'), color = 'r')
+	ax.text(max_std + 0.1, 5, r'max( $\sigma$ ) = ' + format(max_std, '0.2f'), color = 'r')
 
 	if (min_std < 2):
-		pl.text(max_std + 0.1, 2, r'min( $\sigma$ ) = ' + format(min_std, '0.2f'), color = 'g')
+		ax.text(max_std + 0.1, 2, r'min( $\sigma$ ) = ' + format(min_std, '0.2f'), color = 'g')
 	else:
-		pl.text(min_std - 1.75, 0.5, r'min( $\sigma$ ) = ' + format(min_std, '0.2f'), color = 'g')
+		ax.text(min_std - 1.75, 0.5, r'min( $\sigma$ ) = ' + format(min_std, '0.2f'), color = 'g')
 		
-	pl.title(title)
+	ax.set_title(title)
 
-	if pdf_std_debug:
-		pl.show()
+	# Save the figure
+	with stage('save'):
+		fig.savefig(figname)
+		count_io(1, os.path.getsize(figname))
 
-	return pdf_clr_std_data
+	return
 
-def do_clr_pdf(parent_dir, print_title):
-	""" Helper function for making a single plot """
+def plot_clr_figure(parent_dir, print_title, result):
+	""" Queue the PDF of the color distribution of the runs in a color_result """
 
-	# Create dimensions for the plot
-	fig = pl.figure(1, figsize = (10, 8))
 	figname = ('_'.join(parent_dir.split('/')[2:]))[:-1] + '.png'
 
-	# Parse the data in each file
-	for item in range(1, 251):
-		mem_color(parent_dir + str(item))
-
 	# Perform the actual plotting
 	util  = str(re.match(r'^.*/(\d+)/$', parent_dir).group(1))
 	corun = str(re.match(r'^.*/(\d+)/.*/$', parent_dir).group(1))
@@ -197,18 +247,25 @@ def do_clr_pdf(parent_dir, print_title):
 	else:
 		title = ''
 
-	pdf_clr_hash = plot_clr_pdf(title)
+	return plot_clr_pdf('../figs/' + figname, title, result)
 
-	# Save the figure
-	fig.savefig('../figs/' + figname)
+def do_clr_pdf(parent_dir, print_title, jobs = 1):
+	""" Helper function for making a single plot """
 
-	return pdf_clr_hash
+	# Parse the data in each file
+	result = load_clr_data(parent_dir, jobs)
+
+	# Plot the parsed data
+	return plot_clr_figure(parent_dir, print_title, result)
 
 def main():
 
 	# Plot the data set
 	do_clr_pdf('../data/TG/BW/UN/PL/CL/00/100/', True)
 
+	# Render the queued figures
+	flush_renders()
+
 	return
 
 # Desginate main as the entry point
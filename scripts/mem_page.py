@@ -4,18 +4,14 @@ import pylab as pl
 import scipy.stats as stats
 
 from generic_page import *
+from perf_parser import parse_perf_log
+from results import perf_result
+from leaf_cache import leaf_runs
+from accumulators import moment_stats
 
 # Set to 1 for debugging
 debug = 0
 
-# Global Data
-plot_data = {}
-avg_miss_rate = []
-avg_time = []
-extrema_miss_rate = []
-extrema_time = []
-extrema_files = []
-
 class mem_page(File):
 	""" A subclass of file-type objects to process miss-rate in tegra
 	    platform """
@@ -34,83 +30,53 @@ class mem_page(File):
 
 	def parse(self):
 		""" This is the primary function for extracting miss-rate from a perf log file """
-		accesses = misses = time = 0
-
-		# Open and parse the file
-		with open(self.name, 'r') as fdi:
-			for line in fdi:
-				# Check the platform type to select appropriate regex
-				if self.platform == 'Xeon':
-					# Get the required lines
-					refsLine = re.match('^\D*([\d,]+) cache-references.*$', line)
-					missLine = re.match('^\D*([\d,]+) cache-misses.*$', line)
-					timeLine = re.match('^\D*([\d.]+) seconds time.*$', line)
-				else:
-					# Get the required lines
-					refsLine = re.match('^\D*([\d,]+) r50.*$', line)
-					missLine = re.match('^\D*([\d,]+) r52.*$', line)
-					timeLine = re.match('^\D*([\d.]+) seconds time.*$', line)
-
-				if refsLine:
-					accesses = int(re.sub('\D', '', refsLine.group(1)))
-
-				if missLine:
-					misses   = int(re.sub('\D', '', missLine.group(1)))
-
-				if timeLine:
-					try:
-						time = float(timeLine.group(1))
-					except:
-						raise ValueError, 'Could not convert string (%s) to float' % (time.group(1))
+		# Extract the counters using the shared parser of this platform
+		accesses, misses, time = parse_perf_log(self.name, self.platform)
 
 		if accesses == 0 or misses == 0 or time == 0:
 			print 'Unexpected File : %s' % (self.name)
 
 		# Extract the file number
-		file_number = (re.match("^.*log(\d+)", self.name)).group(1)
+		self.run = int((re.match("^.*log(\d+)", self.name)).group(1))
 
-		# Insert the data in the hash
-		plot_data[file_number] = (accesses, misses, time)
+		# Keep the counters with this file object
+		self.accesses = accesses
+		self.misses = misses
+		self.time = time
 
 		return
 
 # plot_data
 # Function to plot_data parsed from the files
-def plotdata(position, title):
-	""" Function for plotting the collected data about miss-rate """
+def plotdata(result, position, title):
+	""" Function for plotting the miss-rate of a perf_result. Returns a hash
+	    summarizing the plotted data """
 
 	# Font size for plot titles
 	pl_fontsize = 10
 	pl_rows = 2
 	pl_cols = 7
 
-	mr_array_usort = []
-	time_array = []
-	number = 0
-	max_rate = 0.0
-	min_rate = 100.0
-	for item in plot_data.keys():
-		mr_array_usort.append((float(plot_data[item][1])/plot_data[item][0]) * 100)
-		time_array.append(plot_data[item][2])
-
-		if mr_array_usort[number] > max_rate:
-			max_rate = mr_array_usort[number]
-			max_file = int(item)
-
-		if mr_array_usort[number] < min_rate:
-			min_rate = mr_array_usort[number]
-			min_file = int(item)
-			
-		number += 1
-
-	# Sort the data
-	mr_array = sorted(mr_array_usort)
-	time_array = sorted(time_array)
+	plot_hash = {}
+
+	# Summarize the miss-rate and time of all the runs in one pass each
+	mr_stats = moment_stats()
+	mr_stats.add_array(result.miss_rate(), result.runs)
+	tm_stats = moment_stats()
+	tm_stats.add_array(result.time, result.runs)
+
+	# Find the runs with the extreme miss-rates
+	max_rate, max_file = mr_stats.max, mr_stats.max_file
+	min_rate, min_file = mr_stats.min, mr_stats.min_file
+
+	# The curves and histograms are drawn over the sorted samples
+	mr_array = np.sort(result.miss_rate())
+	time_array = np.sort(result.time)
 
 	if debug:
 		print "Max File : %d | Min File : %d" % (max_file, min_file)
-		print "Max Time : %.3f | Max Accesses : %10d | Max Misses : %10d | Max Miss-Rate : %.3f %%" % (float(plot_data[str(max_file)][2]), int(plot_data[str(max_file)][0]), int(plot_data[str(max_file)][1]), float(mr_array[-1]))
-		print "Min Time : %.3f | Min Accesses : %10d | Min Misses : %10d | Min Miss-Rate : %.3f %%" % (float(plot_data[str(min_file)][2]), int(plot_data[str(min_file)][0]), int(plot_data[str(min_file)][1]), float(mr_array[0]))
+		print "Max Time : %.3f | Max Accesses : %10d | Max Misses : %10d | Max Miss-Rate : %.3f %%" % (result.counters(max_file)[2], result.counters(max_file)[0], result.counters(max_file)[1], float(mr_array[-1]))
+		print "Min Time : %.3f | Min Accesses : %10d | Min Misses : %10d | Min Miss-Rate : %.3f %%" % (result.counters(min_file)[2], result.counters(min_file)[0], result.counters(min_file)[1], float(mr_array[0]))
 
 		# Parse the max file and min file
 		fdmx = mem_page(fileDir + filePre + str(max_file))
@@ -122,19 +88,19 @@ def plotdata(position, title):
 		print "Min Pages - %d -> %.3f MB" % (min_pages, float(min_pages * 4) / 1024)
 
 	# Calculate the mean and standard deviation
-	mr_mean = np.mean(mr_array)
-	mr_std  = np.std(mr_array)
-	tm_mean = np.mean(time_array)
-	tm_std  = np.std(time_array)
-	tm_min  = time_array[0]
-	tm_max  = time_array[-1]
-
-	# Push the data regarding the plots in the global arrays
-	avg_miss_rate.append(mr_mean)
-	avg_time.append(tm_mean)
-	extrema_files.append((min_file, max_file))
-	extrema_miss_rate.append((min_rate, max_rate))
-	extrema_time.append((tm_min, tm_max))
+	mr_mean = mr_stats.mean
+	mr_std  = mr_stats.std()
+	tm_mean = tm_stats.mean
+	tm_std  = tm_stats.std()
+	tm_min  = tm_stats.min
+	tm_max  = tm_stats.max
+
+	# Summarize the data regarding the plots
+	plot_hash['average_miss_rate'] = mr_mean
+	plot_hash['average_time'] = tm_mean
+	plot_hash['extrema_files'] = (min_file, max_file)
+	plot_hash['extrema_miss_rate'] = (min_rate, max_rate)
+	plot_hash['extrema_time'] = (tm_min, tm_max)
 
 	# Fit a normal curve on the sorted data
 	fit = stats.norm.pdf(mr_array, mr_mean, mr_std)
@@ -190,13 +156,11 @@ def plotdata(position, title):
 	pl.xlim(0, 2)
 	# pl.ylim(0, 1)
 
-	return
+	return plot_hash
 
 def do_set(platform, corun, mint, part, util, pos):
-	""" Helper function for plotting mutiple data sets """
-
-	# Reset the global plot-data hash
-	plot_data = {}
+	""" Helper function for plotting mutiple data sets. Returns the summary
+	    of the plotted set """
 
 	# Set the parent directory path based on platform name
 	parent_dir = ''
@@ -206,15 +170,14 @@ def do_set(platform, corun, mint, part, util, pos):
 	else:
 		parent_dir = '../data/'
 
-	# Parse the data in each file
-	for item in range(1, 1000):
-		mem_page(parent_dir + part + '/' + corun + '/data_' + mint + '_' + part + '/' + util + '/log' + str(item), platform)
+	# Parse the data in each file found in the directory
+	leaf_dir = parent_dir + part + '/' + corun + '/data_' + mint + '_' + part + '/' + util + '/'
+	pages = [mem_page(leaf_dir + 'log' + str(item), platform) for item in leaf_runs(leaf_dir, 'log')]
+	result = perf_result([page.run for page in pages], [page.accesses for page in pages], [page.misses for page in pages], [page.time for page in pages])
 
 	# Perform the actual plotting
 	title = util + '%'
-	plotdata(pos, title)
-
-	return
+	return plotdata(result, pos, title)
 
 def main():
 	""" This is the primary entry point into the script """
@@ -222,6 +185,9 @@ def main():
 	# Create a figure to save all plots
 	fig = pl.figure(1, figsize = (35, 15))
 
+	# Summaries of the plotted sets
+	sets = []
+
 	# Set the partition type
 	part = 'sets'
 	platform = 'tegra'
@@ -245,7 +211,7 @@ def main():
 			util = str(util)
 
 			# Plot the data one set at a time
-			do_set(platform, 'solo', 'mint', part, util, pos)
+			sets.append(do_set(platform, 'solo', 'mint', part, util, pos))
 
 			# Update the position for the next plot
 			pos += 1
@@ -256,20 +222,20 @@ def main():
 		pl.suptitle('Xeon | BW-R | ' + part_size + ' | ' + ws_size + ' | ' + part[0].upper() + part[1:])
 
 		# Plot the data one set at a time
-		do_set(platform, 'solo', 'mint', '', part, 1)
-		do_set(platform, 'corun', 'mint', '', part, 3)
-		do_set(platform, 'solo', 'modf', '', part, 2)
-		do_set(platform, 'corun', 'modf', '', part, 4)
+		sets.append(do_set(platform, 'solo', 'mint', '', part, 1))
+		sets.append(do_set(platform, 'corun', 'mint', '', part, 3))
+		sets.append(do_set(platform, 'solo', 'modf', '', part, 2))
+		sets.append(do_set(platform, 'corun', 'modf', '', part, 4))
 
 	# Save the figure
 	fig.savefig(figname)
 
-	# Print the global data
-	print '<Time>      : ', avg_time
-	print '<Miss Rate> : ', avg_miss_rate
-	print '[Time]      : ', extrema_time
-	print '[Miss-Rate] : ', extrema_miss_rate
-	print 'Files       : ', extrema_files
+	# Print the summary of all sets
+	print '<Time>      : ', [item['average_time'] for item in sets]
+	print '<Miss Rate> : ', [item['average_miss_rate'] for item in sets]
+	print '[Time]      : ', [item['extrema_time'] for item in sets]
+	print '[Miss-Rate] : ', [item['extrema_miss_rate'] for item in sets]
+	print 'Files       : ', [item['extrema_files'] for item in sets]
 
 	return
 
@@ -1,18 +1,20 @@
 import re, sys
+import os
 import numpy as np
-import pylab as pl
 from math import ceil
 
 from generic_page import File
+from perf_parser import parse_perf_log
+from leaf_cache import load_perf_leaf, leaf_runs
+from render_pipeline import queue_render, flush_renders
+from results import perf_result, performance_result
+from accumulators import run_summary
+from bootstrap import bootstrap_leaves, BOOTSTRAP_CONFIDENCE
+from instrument import stage, count_io
 
 # Set to 1 for debugging
 boxplot_miss_rate_debug = 0
 
-# Global Data
-plot_performance_data = {}
-plot_performance_data["miss_rate"] = []
-plot_performance_data["time"] = []
-
 class mem_page(File):
 	""" A subclass of file-type objects to process miss-rate in tegra
 	    platform """
@@ -31,70 +33,165 @@ class mem_page(File):
 
 	def parse(self):
 		""" This is the primary function for extracting miss-rate from a perf log file """
-		accesses = misses = time = 0
-
-		# Open and parse the file
-		with open(self.name, 'r') as fdi:
-			for line in fdi:
-				# Check the platform type to select appropriate regex
-				if self.platform == 'XE':
-					# Get the required lines
-					refsLine = re.match('^\D*([\d,]+) cache-references.*$', line)
-					missLine = re.match('^\D*([\d,]+) cache-misses.*$', line)
-					timeLine = re.match('^\D*([\d.]+) seconds time.*$', line)
-				elif self.platform == 'TG':
-					# Get the required lines
-					refsLine = re.match('^\D*([\d,]+) r50.*$', line)
-					missLine = re.match('^\D*([\d,]+) r52.*$', line)
-					timeLine = re.match('^\D*([\d.]+) seconds time.*$', line)
-
-				if refsLine:
-					accesses = int(re.sub('\D', '', refsLine.group(1)))
-
-				if missLine:
-					misses   = int(re.sub('\D', '', missLine.group(1)))
-
-				if timeLine:
-					try:
-						time = float(timeLine.group(1))
-					except:
-						raise ValueError, 'Could not convert string (%s) to float' % (time.group(1))
+		# Extract the counters using the shared parser of this platform
+		accesses, misses, time = parse_perf_log(self.name, self.platform)
 
 		if accesses == 0 or misses == 0 or time == 0:
 			print 'Unexpected File : %s' % (self.name)
 			sys.exit(2)
 
 		# Extract the file number
-		file_number = (re.match("^.*/(\d+)", self.name)).group(1)
+		self.run = int((re.match("^.*/(\d+)", self.name)).group(1))
 
-		# Insert the data in the hash
-		plot_performance_data[file_number] = (accesses, misses, time)
+		# Keep the counters with this file object
+		self.accesses = accesses
+		self.misses = misses
+		self.time = time
 
 		return
 
-def performance_boxplots(figname, title, data_type, utilization, parsed_data, y_down, y_up, auto = True):
-	""" This function can be used for drawing box plots """
+def load_performance_data(leaf_dir, platform, jobs = 1):
+	""" Load the counters of all the runs in a leaf as a perf_result """
+
+	# Every run file of the leaf is loaded, cached counters are used for
+	# every run whose file has not changed
+	runs = leaf_runs(leaf_dir)
+	with stage('parse'):
+		leaf = load_perf_leaf(leaf_dir, platform, runs, jobs)
+
+	# Apply the same sanity check as the per-file parser
+	unexpected = np.nonzero((leaf["accesses"] == 0) | (leaf["misses"] == 0) | (leaf["time"] == 0))[0]
+	if len(unexpected):
+		print 'Unexpected File : %s' % (leaf_dir + str(leaf["runs"][unexpected[0]]))
+		sys.exit(2)
+
+	return perf_result(leaf["runs"], leaf["accesses"], leaf["misses"], leaf["time"])
+
+def box_statistics(parsed_data, whis = 1.5):
+	""" Return the quartiles, whiskers, means and extrema of every box in one
+	    pass over the samples of all the boxes, as a hash of arrays with an
+	    entry per box, along with the box and value of every flier. The
+	    statistics follow matplotlib's boxplot, a box given as a run_summary
+	    takes them from its sketch """
+
+	# The boxes of many runs only keep the summary of their samples
+	summarized = [index for index, box in enumerate(parsed_data) if isinstance(box, run_summary)]
+	if summarized:
+		return summarized_box_statistics(parsed_data, summarized, whis)
+
+	lengths = np.array([len(x) for x in parsed_data])
+	boxes = len(lengths)
+	starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+
+	# Line up the sorted samples of all the boxes. Sorting every box on its
+	# own is cheaper than a lexsort of the whole array
+	ids = np.repeat(np.arange(boxes), lengths)
+	values = np.concatenate([np.sort(np.asarray(x, dtype = np.float64)) for x in parsed_data])
+
+	# Linearly interpolated quartiles, as np.percentile finds them
+	def quantile(fraction):
+		rank = starts + fraction * (lengths - 1)
+		low = np.floor(rank).astype(np.int64)
+		high = np.ceil(rank).astype(np.int64)
+		return values[low] + (values[high] - values[low]) * (rank - low)
+
+	q1, med, q3 = quantile(0.25), quantile(0.5), quantile(0.75)
+	iqr = q3 - q1
+
+	# The whiskers reach the furthest samples within 'whis' IQRs of the box
+	inside = (values >= (q1 - whis * iqr)[ids]) & (values <= (q3 + whis * iqr)[ids])
+	whislo = np.minimum(np.minimum.reduceat(np.where(inside, values, np.inf), starts), q1)
+	whishi = np.maximum(np.maximum.reduceat(np.where(inside, values, -np.inf), starts), q3)
+
+	fliers = (values < whislo[ids]) | (values > whishi[ids])
+
+	return {"q1" : q1, "med" : med, "q3" : q3, "whislo" : whislo, "whishi" : whishi,
+		"mean" : np.bincount(ids, weights = values, minlength = boxes) / lengths,
+		"min" : values[starts], "max" : values[starts + lengths - 1],
+		"flier_boxes" : ids[fliers], "flier_values" : values[fliers]}
+
+def summarized_box_statistics(parsed_data, summarized, whis = 1.5):
+	""" Return the statistics of box_statistics for boxes of which those in
+	    'summarized' are a run_summary and the others hold their samples """
+
+	boxes = len(parsed_data)
+	keys = ["q1", "med", "q3", "whislo", "whishi", "mean", "min", "max"]
+	stats = dict((key, np.zeros(boxes)) for key in keys)
+	flier_boxes, flier_values = [], []
+
+	# The boxes with their samples are found in one pass as usual
+	exact = [index for index in range(boxes) if index not in summarized]
+	if exact:
+		partial = box_statistics([parsed_data[index] for index in exact], whis)
+		for key in keys:
+			stats[key][exact] = partial[key]
+
+		flier_boxes.append(np.array(exact)[partial["flier_boxes"]])
+		flier_values.append(partial["flier_values"])
+
+	# The fliers of a summarized box are the buckets beyond its whiskers
+	for index in summarized:
+		box = parsed_data[index].box_stats(whis)
+		for key in keys:
+			stats[key][index] = box[key]
+
+		flier_boxes.append(np.repeat(index, len(box["fliers"])))
+		flier_values.append(box["fliers"])
+
+	stats["flier_boxes"] = np.concatenate(flier_boxes).astype(np.int64)
+	stats["flier_values"] = np.concatenate(flier_values)
+
+	return stats
+
+def performance_boxplots(figname, title, data_type, utilization, parsed_data, y_down, y_up, auto = True, intervals = None, xlabel = 'Percentage Utilization'):
+	""" This function can be used for drawing box plots. When given, 'intervals'
+	    holds the bootstrap intervals of every box, which are drawn beside it """
+
+	# The plotting modules are only loaded once a figure is drawn
+	from matplotlib.figure import Figure
+	from matplotlib.backends.backend_agg import FigureCanvasAgg
+	from matplotlib.collections import PolyCollection, LineCollection
+	from matplotlib.artist import setp
 
 	# Set uniform fontsize for all the captions
 	pl_fontsize = 15
 
-	# Create a figure to save all plots
-	fig, ax1 = pl.subplots(figsize = (10, 8))
-
-	# Calculate the extrema of parsed data
-	maxs = [np.max(x) for x in parsed_data]
-	mins = [np.min(x) for x in parsed_data]  
+	# Create a standalone Agg figure so that no pylab state is shared between plots
+	fig = Figure(figsize = (10, 8))
+	FigureCanvasAgg(fig)
+	ax1 = fig.add_subplot(111)
 
-	bp = pl.boxplot(parsed_data, notch=0, sym='+', vert=1, whis=1.5)
-	pl.setp(bp['boxes'], color='black')
-	pl.setp(bp['whiskers'], color='black')
-	pl.setp(bp['fliers'], color='red', marker='+')
+	# Calculate the statistics of all the boxes at once
+	numBoxes = len(utilization)
+	pos = np.arange(numBoxes) + 1
+	stats = box_statistics(parsed_data)
+	maxs = stats["max"]
+	mins = stats["min"]
+
+	# Box widths as chosen by matplotlib's boxplot, the caps are half as wide
+	width = np.clip(0.15 * (numBoxes - 1), 0.15, 0.5)
+	left = pos - width / 2.0
+	right = pos + width / 2.0
+
+	# Draw the boxes, whiskers, caps and medians as one collection each
+	ax1.add_collection(PolyCollection(np.dstack(([left, left, right, right], [stats["q1"], stats["q3"], stats["q3"], stats["q1"]])).transpose(1, 0, 2),
+					  facecolors = 'darkkhaki', edgecolors = 'black', linewidths = 1, zorder = 2))
+	ax1.add_collection(LineCollection(np.dstack(([pos, pos, pos, pos], [stats["q1"], stats["whislo"], stats["q3"], stats["whishi"]])).transpose(1, 0, 2).reshape(-1, 2, 2),
+					  colors = 'black', linewidths = 1, zorder = 2))
+	ax1.add_collection(LineCollection(np.dstack(([pos - width / 4.0, pos + width / 4.0] * 2, [stats["whislo"]] * 2 + [stats["whishi"]] * 2)).transpose(1, 0, 2).reshape(-1, 2, 2),
+					  colors = 'black', linewidths = 1, zorder = 2))
+	ax1.add_collection(LineCollection(np.dstack(([left, right], [stats["med"], stats["med"]])).transpose(1, 0, 2),
+					  colors = 'black', linewidths = 1, zorder = 3))
+
+	# Overplot the fliers and the sample averages in the center of each box
+	ax1.plot(pos[stats["flier_boxes"]], stats["flier_values"], linestyle = 'none', color = 'red', marker = '+')
+	ax1.plot(pos, stats["mean"], linestyle = 'none', color = 'w', marker = '*', markeredgecolor = 'k')
 
 	ax1.yaxis.grid(True, linestyle='-', which='major', color='lightgrey', alpha=0.5)
 
 	ax1.set_axisbelow(True)
 	ax1.set_title(title, fontsize = pl_fontsize)
-	ax1.set_xlabel('Percentage Utilization', fontsize = pl_fontsize)
+	ax1.set_xlabel(xlabel, fontsize = pl_fontsize)
 
 	if data_type == 'm':
 		ax1.set_ylabel('Miss-Rate', fontsize = pl_fontsize)
@@ -109,89 +206,61 @@ def performance_boxplots(figname, title, data_type, utilization, parsed_data, y_
 		top = y_up
 		bottom = y_down
 
-	ax1.set_xlim(0.5, len(utilization) + 0.5)
+	ax1.set_xlim(0.5, numBoxes + 0.5)
 	ax1.set_ylim(bottom, top)
 
-	xtickNames = pl.setp(ax1, xticklabels = utilization)
-	pl.setp(xtickNames, rotation = 45, fontsize = pl_fontsize)
+	ax1.set_xticks(pos)
+	xtickNames = ax1.set_xticklabels(utilization)
+	setp(xtickNames, rotation = 45, fontsize = pl_fontsize)
 
-	numBoxes = len(utilization)
-	boxColors = ['darkkhaki', 'darkkhaki']
-	medians = list(range(numBoxes))
-	for i in range(numBoxes):
-	    box = bp['boxes'][i]
-	    boxX = []
-	    boxY = []
-	    for j in range(5):
-	        boxX.append(box.get_xdata()[j])
-	        boxY.append(box.get_ydata()[j])
-	    boxCoords = list(zip(boxX, boxY))
-	    # Alternate between Dark Khaki and Royal Blue
-	    k = i % 2
-	    boxPolygon = pl.Polygon(boxCoords, facecolor=boxColors[k])
-	    ax1.add_patch(boxPolygon)
-	    # Now draw the median lines back over what we just filled in
-	    med = bp['medians'][i]
-	    medianX = []
-	    medianY = []
-	    for j in range(2):
-	        medianX.append(med.get_xdata()[j])
-	        medianY.append(med.get_ydata()[j])
-	        pl.plot(medianX, medianY, 'k')
-	        medians[i] = medianY[0]
-	    # Finally, overplot the sample averages, with horizontal alignment
-	    # in the center of each box
-	    pl.plot([np.average(med.get_xdata())], [np.average(parsed_data[i])],
-	             color='w', marker='*', markeredgecolor='k')  
-
-	pos = np.arange(7) + 1
-	boxColors = ['red', 'green']  
-	upperLabels = [str(np.round(s, 2)) for s in maxs]
-	bottomLabels = [str(np.round(s, 2)) for s in mins]
+	# Label the extrema of every box along the top and bottom of the plot
+	boxColors = ['red', 'green']
 	weights = ['bold', 'semibold']
-	for tick, label in zip(range(7), ax1.get_xticklabels()):
+	for tick in range(numBoxes):
 	    k = tick % 2
-	    ax1.text(pos[tick], top - ((top - bottom)*0.05), upperLabels[tick],
+	    ax1.text(pos[tick], top - ((top - bottom)*0.05), str(np.round(maxs[tick], 2)),
 	             horizontalalignment='center', size='small', weight=weights[k], color=boxColors[0])
-	    ax1.text(pos[tick], bottom + ((top - bottom)*0.05), bottomLabels[tick],
+	    ax1.text(pos[tick], bottom + ((top - bottom)*0.05), str(np.round(mins[tick], 2)),
 	             horizontalalignment='center', size='small', weight=weights[k], color=boxColors[1])
-       
-	line_data = []
-	for item in range(1, numBoxes + 1, 1):
-		line_data.append(np.mean(parsed_data[item - 1]))
-		pl.text(item - 0.2, line_data[item - 1], '%.2f' % line_data[item - 1], fontsize = pl_fontsize)
 
-	pl.plot(range(1, numBoxes + 1, 1), line_data, 'r')
+	line_data = stats["mean"]
+	for item in range(numBoxes):
+		ax1.text(pos[item] - 0.2, line_data[item], '%.2f' % line_data[item], fontsize = pl_fontsize)
 
-	# Save the figure
-	fig.savefig(figname)
+	ax1.plot(pos, line_data, 'r')
+
+	# Draw the intervals of the median, mean and p95 to the left, middle and right of each box
+	if intervals:
+		for offset, statistic, color in [(-0.3, 'median', 'green'), (0, 'mean', 'blue'), (0.3, 'p95', 'magenta')]:
+			estimate, low, high = np.array([interval[statistic] for interval in intervals]).T
+			ax1.errorbar(pos + offset, estimate, yerr = [estimate - low, high - estimate],
+				     fmt = 'none', ecolor = color, elinewidth = 2, capsize = 4,
+				     label = '%s %d%% CI' % (statistic, round(BOOTSTRAP_CONFIDENCE * 100)))
 
+		# Keep the legend above the title, clear of the extrema labels
+		handles, labels = ax1.get_legend_handles_labels()
+		fig.legend(handles, labels, loc = 'upper center', ncol = 3, fontsize = 'small', frameon = False)
+
+	# Save the figure
+	with stage('save'):
+		fig.savefig(figname)
+		count_io(1, os.path.getsize(figname))
 
 	# All done here
 	return
 	
 # collate_performance_data
 # Function to collate parsed data from the performance files
-def collate_performance_data():
+def collate_performance_data(performance, util, leaf):
 
-	mr_array   = []
-	time_array = []
-
-	for item in range(1, 251, 1):
-		mr_array.append((float(plot_performance_data[str(item)][1])/plot_performance_data[str(item)][0]) * 100)
-		time_array.append((plot_performance_data[str(item)][2]) * 1000)
-	
-	# Push the miss-rate data into global hash
-	plot_performance_data["miss_rate"].append(mr_array)
-	plot_performance_data["time"].append(time_array)
+	# Push the miss-rate and time data of this utilization as the next box
+	with stage('aggregate'):
+		performance.add(util, leaf)
 
 	return
 	
-def do_performance_boxplots(parent_dir, print_title):
-	""" Helper function for making a single plot """
-
-	# Create dimensions for the plot
-	fig = pl.figure(1, figsize = (10, 8))
+def performance_utilizations(parent_dir):
+	""" Return the platform name and the utilizations plotted for a corun directory """
 
 	# Get the platform name from input string
 	platform_name = str(re.match(r'^.*/data/([A-Z]+)/.*$', parent_dir).group(1))
@@ -207,18 +276,16 @@ def do_performance_boxplots(parent_dir, print_title):
 		utilization = ['CF', 'VG']
 		partitions  = ['12', '25', '37', '50', '63']
 
+	return platform_name, utilization
+
+def plot_performance_boxplots(parent_dir, print_title, performance, jobs = 1):
+	""" Draw the time and miss-rate boxplots of a performance_result along with
+	    the bootstrap intervals of every box """
+
 	fig_prefix = '../figs/' + ('_'.join(parent_dir.split('/')[2:]))[:-1]
 	mr_figname = fig_prefix + '_MR.png'
 	tm_figname = fig_prefix + '_TM.png'
 
-	# Parse the data in each file
-	for util in utilization:
-		for item in range(1, 251):
-			mem_page(parent_dir + util + '/' + str(item), platform = platform_name)
-		
-		# Collate the data collected so far
-		collate_performance_data()
-
 	# Perform the actual plotting
 	corun = str(re.match(r'^.*/(\d+)/$', parent_dir).group(1))
 	
@@ -229,19 +296,59 @@ def do_performance_boxplots(parent_dir, print_title):
 	
 	choice = False
 
-	# Create boxplot for time data
-	performance_boxplots(tm_figname, title, 't', utilization, plot_performance_data["time"], -100, 3*1000, auto = choice)
+	# Resample the time and miss-rate boxes of all utilizations at once
+	with stage('aggregate'):
+		intervals = bootstrap_leaves(performance.time + performance.miss_rate,
+					     [(parent_dir + util + '/', 'time') for util in performance.utilization] +
+					     [(parent_dir + util + '/', 'miss_rate') for util in performance.utilization], jobs)
+	boxes = len(performance.time)
+
+	# Queue the boxplot for time data
+	queue_render(performance_boxplots, tm_figname, title, 't', performance.utilization, performance.time, -100, 3*1000, choice, intervals[:boxes])
 
-	# Create boxplot for miss-rate data
-	performance_boxplots(mr_figname, title, 'm', utilization, plot_performance_data["miss_rate"], -5, 30, auto = choice)
+	# Queue the boxplot for miss-rate data
+	queue_render(performance_boxplots, mr_figname, title, 'm', performance.utilization, performance.miss_rate, -5, 30, choice, intervals[boxes:])
 
 	return
+
+def collect_performance_data(parent_dir, jobs = 1):
+	""" Return the performance_result of all the utilizations of a corun directory """
+
+	# This call owns the data of its boxes
+	performance = performance_result()
+
+	# Get the platform and the utilizations to plot
+	platform_name, utilization = performance_utilizations(parent_dir)
+
+	# Parse the data in each file
+	for util in utilization:
+		leaf = load_performance_data(parent_dir + util + '/', platform_name, jobs)
+
+		# Collate the data collected so far
+		collate_performance_data(performance, util, leaf)
+
+	return performance
+
+def do_performance_boxplots(parent_dir, print_title, jobs = 1):
+	""" Helper function for making a single plot. Returns the performance_result
+	    of the plotted utilizations """
+
+	# Parse the data of all utilizations
+	performance = collect_performance_data(parent_dir, jobs)
+
+	# Draw the boxplots of all utilizations
+	plot_performance_boxplots(parent_dir, print_title, performance, jobs)
+
+	return performance
 	
 def main():
 
 	# Plot the default data set
 	do_performance_boxplots('../data/TG/DP/UN/UN/PF/00/', False)
 
+	# Render the queued figures
+	flush_renders()
+
 	return
 
 # Desginate main as the entry point
@@ -0,0 +1,141 @@
+########################################################################################
+#
+# File
+#	page_parser.py
+#
+# Description
+#	This file contains the loader for page dumps of the form 'address : count'.
+#	The dump is read in fixed size chunks and every chunk is converted with
+#	array operations, so multi-million page dumps load into two numpy arrays
+#	within a bounded amount of memory
+#
+########################################################################################
+
+import numpy as np
+
+from data_source import find_data, open_data
+
+# Bytes of text converted at a time
+chunk_bytes = 1 << 22
+
+# Value of every hexadecimal digit and the characters which are one
+hex_digits = np.zeros(256, dtype = np.uint64)
+hex_valid = np.zeros(256, dtype = bool)
+for digit in '0123456789abcdef':
+	hex_digits[ord(digit)] = hex_digits[ord(digit.upper())] = int(digit, 16)
+	hex_valid[ord(digit)] = hex_valid[ord(digit.upper())] = True
+
+# Fields of the page table, where the sequence number of a line keeps the
+# lines of a repeated address in the order of the file
+page_table_dtype = np.dtype([('address', np.uint64), ('seq', np.int64), ('count', np.int64)])
+
+def hex_array(tokens):
+	""" Convert a list of hexadecimal strings, with or without a '0x' prefix,
+	    into an array of uint64. Raises ValueError like int(token, 16) on a
+	    token that is not a number or does not fit 64 bits """
+
+	strings = np.array(tokens, dtype = np.string_)
+	width = strings.dtype.itemsize
+	chars = strings.view(np.uint8).reshape(-1, width)
+	lengths = np.char.str_len(strings)
+
+	# The digits follow the optional prefix, the padding of the string array
+	# is not part of any token
+	prefixed = (chars[:, 0] == ord('0')) & (np.in1d(chars[:, 1], [ord('x'), ord('X')]) if width > 1 else False)
+	position = np.arange(width)
+	digit = (position >= 2 * prefixed[:, np.newaxis]) & (position < lengths[:, np.newaxis])
+
+	invalid = (digit & ~hex_valid[chars]).any(axis = 1) | ~digit.any(axis = 1)
+	if invalid.any():
+		raise ValueError, 'Invalid address (%s) in page dump' % (tokens[np.argmax(invalid)])
+
+	# Give every digit the weight of its position from the end of its string
+	digits = np.where(digit, hex_digits[chars], 0).astype(np.uint64)
+	shifts = (lengths[:, np.newaxis] - 1 - position) * 4
+
+	# Leading zeros may run past 64 bits, other digits may not
+	if (digits[shifts >= 64] != 0).any():
+		raise ValueError, 'Address (%s) does not fit 64 bits' % (tokens[np.argmax(((digits != 0) & (shifts >= 64)).any(axis = 1))])
+
+	digits[(shifts < 0) | (shifts >= 64)] = 0
+	digits <<= np.clip(shifts, 0, 60).astype(np.uint64)
+
+	return digits.sum(axis = 1, dtype = np.uint64)
+
+def chunks(fdi):
+	""" Yield the contents of a file in chunks which end on a line boundary """
+
+	rest = ''
+
+	while True:
+		data = fdi.read(chunk_bytes)
+		if not data:
+			break
+
+		data = rest + data
+		end = data.rfind('\n') + 1
+
+		# A line longer than a chunk is carried over until it is complete
+		if end == 0:
+			rest = data
+			continue
+
+		rest = data[end:]
+		yield data[:end]
+
+	if rest.strip():
+		yield rest
+
+	return
+
+def parse_page_dump(filename):
+	""" Return the (addresses, counts) arrays of a page dump, sorted by address,
+	    as the columns of a single page table. When an address is listed more
+	    than once its last count wins """
+
+	# A compressed dump is streamed through its decompressor
+	found = find_data(filename)
+	if found is None or found[1] is not None:
+		raise ValueError, 'File (%s) does not exists!' % (filename)
+
+	filename = found[0]
+
+	# Size the table from the number of lines, so it is never regrown
+	lines = 0
+	with open_data(filename) as fdi:
+		for chunk in chunks(fdi):
+			lines += chunk.count('\n') + (not chunk.endswith('\n'))
+
+	table = np.empty(lines, dtype = page_table_dtype)
+	pages = 0
+
+	with open_data(filename) as fdi:
+		for chunk in chunks(fdi):
+			tokens = chunk.split()
+
+			# Every line holds an address, a separator and a count
+			if len(tokens) % 3 or tokens[1::3].count(':') != len(tokens) / 3:
+				raise ValueError, 'Unexpected line in page dump (%s)' % (filename)
+
+			number = len(tokens) / 3
+			table['address'][pages:pages + number] = hex_array(tokens[0::3])
+			table['seq'][pages:pages + number] = np.arange(pages, pages + number)
+			table['count'][pages:pages + number] = np.array(tokens[2::3], dtype = np.string_).astype(np.int64)
+			pages += number
+
+	# Blank lines do not hold a page
+	table = table[:pages]
+
+	# Sort the table in place, the sequence numbers keep the repeated
+	# addresses in the order of the file
+	table.sort(order = ['address', 'seq'])
+
+	last = np.ones(pages, dtype = bool)
+	last[:-1] = table['address'][1:] != table['address'][:-1]
+	if not last.all():
+		table = table[last]
+
+	addresses = table['address']
+	counts = table['count']
+
+	return addresses, counts
@@ -0,0 +1,95 @@
+########################################################################################
+#
+# File
+#	perf_parser.py
+#
+# Description
+#	This file contains the shared parser for perf logs. The event table of the
+#	target platform is compiled once and all counters are pulled from a log in
+#	a single scan of its contents
+#
+########################################################################################
+
+import re
+
+from data_source import read_data
+
+# Perf events which carry the (references, misses) counters on each platform
+PERF_EVENTS = {
+	'TG'	: ('r50', 'r52'),
+	'XE'	: ('cache-references', 'cache-misses'),
+	'XT'	: ('cache-references', 'cache-misses'),
+	'XC'	: ('cache-references', 'cache-misses'),
+	'XM'	: ('cache-references', 'cache-misses'),
+}
+
+# Version of the parsing rules, to be raised whenever they change what is
+# pulled from a log
+PARSER_VERSION = 1
+
+# Platform names used by the older scripts
+PLATFORM_ALIASES = {
+	'tegra'	: 'TG',
+	'Xeon'	: 'XE',
+}
+
+# Compiled parsers indexed by platform name
+perf_parsers = {}
+
+class perf_parser(object):
+	""" A compiled, platform specific parser for perf logs """
+
+	def __init__(self, platform):
+		platform = PLATFORM_ALIASES.get(platform, platform)
+
+		if platform not in PERF_EVENTS:
+			raise ValueError, 'No perf events known for platform (%s)' % (platform)
+
+		self.platform = platform
+		refs_event, miss_event = PERF_EVENTS[platform]
+
+		# The version, platform and events of this parser
+		self.tag = 'perf-%d-%s-%s-%s' % (PARSER_VERSION, platform, refs_event, miss_event)
+
+		# Map each counter event to its slot in the parsed tuple
+		self.slots = {refs_event : 0, miss_event : 1}
+
+		# A single pattern matches both the counter lines and the time line
+		self.regex = re.compile(r'^[^\d\n]*(?:([\d,]+) (%s|%s)|([\d.]+) seconds time)' % (re.escape(refs_event), re.escape(miss_event)), re.M)
+
+		return
+
+	def parse_text(self, text):
+		""" Extract (accesses, misses, time) from the contents of a perf log """
+		counters = [0, 0]
+		time = 0
+
+		# The last occurrence of each counter wins
+		for match in self.regex.finditer(text):
+			if match.group(2):
+				counters[self.slots[match.group(2)]] = int(match.group(1).replace(',', ''))
+			else:
+				try:
+					time = float(match.group(3))
+				except:
+					raise ValueError, 'Could not convert string (%s) to float' % (match.group(3))
+
+		return (counters[0], counters[1], time)
+
+	def parse(self, filename):
+		""" Extract (accesses, misses, time) from a perf log file """
+
+		return self.parse_text(read_data(filename))
+
+def get_perf_parser(platform):
+	""" Return the compiled parser for the given platform """
+
+	if platform not in perf_parsers:
+		perf_parsers[platform] = perf_parser(platform)
+
+	return perf_parsers[platform]
+
+def parse_perf_log(filename, platform):
+	""" Extract (accesses, misses, time) from a perf log file """
+
+	return get_perf_parser(platform).parse(filename)
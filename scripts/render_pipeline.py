@@ -0,0 +1,62 @@
+########################################################################################
+#
+# File
+#	render_pipeline.py
+#
+# Description
+#	This file contains the rendering stage shared by all the scripts. Figures
+#	are queued as (function, arguments) jobs while the data is parsed and are
+#	then drawn on standalone Agg figures, optionally in worker processes.
+#	The figures of a job are recorded once they are drawn, so an unchanged
+#	job is skipped the next time (see 'figure_manifest.py')
+#
+########################################################################################
+
+from worker_pool import pool_map
+from instrument import active_leaf, profile_call, merge_record
+import figure_manifest
+
+# Figures waiting to be rendered
+render_queue = []
+
+def queue_render(function, *args):
+	""" Queue a call to a top-level rendering function, whose first argument
+	    is the figure name. The figure is accounted to the leaf being profiled
+	    and to the job being recorded, if any """
+
+	figure_manifest.add_figure(args[0])
+	render_queue.append((function, args, active_leaf()))
+
+	return
+
+def pending_renders():
+	""" Return the number of queued figures """
+
+	return len(render_queue)
+
+def run_render_job(job):
+	""" Pool job for rendering a single figure """
+
+	function, args, leaf = job
+
+	if leaf is None:
+		function(*args)
+		return None
+
+	# Send the stages of the figure back to the profiling process
+	return profile_call(leaf, 'plot', function, *args)
+
+def flush_renders(jobs = 1):
+	""" Render all the queued figures over 'jobs' worker processes """
+
+	pending = render_queue[:]
+	del render_queue[:]
+
+	for record in pool_map(run_render_job, pending, jobs):
+		if record is not None:
+			merge_record(record)
+
+	# The jobs recorded so far have all their figures drawn
+	figure_manifest.record_jobs()
+
+	return
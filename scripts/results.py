@@ -0,0 +1,152 @@
+########################################################################################
+#
+# File
+#	results.py
+#
+# Description
+#	This file contains the compact result types returned by the analysis
+#	functions. Each call owns its result, so processing many leaves in one
+#	process never grows shared state
+#
+########################################################################################
+
+import numpy as np
+
+from accumulators import moment_stats, run_summary
+
+# Boxes of more runs than this keep a run_summary instead of their samples
+SUMMARY_RUNS = 10000
+
+class perf_result(object):
+	""" The counters of the perf logs of a single leaf """
+
+	__slots__ = ('runs', 'accesses', 'misses', 'time')
+
+	def __init__(self, runs, accesses, misses, time):
+		self.runs = np.asarray(runs, dtype = np.int64)
+		self.accesses = np.asarray(accesses, dtype = np.int64)
+		self.misses = np.asarray(misses, dtype = np.int64)
+		self.time = np.asarray(time, dtype = np.float64)
+
+		return
+
+	def __len__(self):
+		return len(self.runs)
+
+	def miss_rate(self):
+		""" Return the miss-rate of every run in percent """
+
+		return (self.misses.astype(np.float64) / self.accesses) * 100
+
+	def time_ms(self):
+		""" Return the execution time of every run in milliseconds """
+
+		return self.time * 1000
+
+	def counters(self, run):
+		""" Return (accesses, misses, time) of a single run """
+
+		index = np.nonzero(self.runs == int(run))[0]
+		if len(index) == 0:
+			raise KeyError, 'Run (%s) is not part of the result' % (run)
+
+		index = index[0]
+		return (int(self.accesses[index]), int(self.misses[index]), float(self.time[index]))
+
+class color_result(object):
+	""" The page distribution summary of the color logs of a single leaf """
+
+	__slots__ = ('runs', 'total_pages', 'alld_pages', 'rest_pages', 'std')
+
+	def __init__(self, runs, total_pages, alld_pages, rest_pages, std):
+		self.runs = np.asarray(runs, dtype = np.int64)
+		self.total_pages = np.asarray(total_pages, dtype = np.int64)
+		self.alld_pages = np.asarray(alld_pages, dtype = np.int64)
+		self.rest_pages = np.asarray(rest_pages, dtype = np.int64)
+		self.std = np.asarray(std, dtype = np.float64)
+
+		return
+
+	def __len__(self):
+		return len(self.runs)
+
+	def extrema(self):
+		""" Return ((min std, max std), (min file, max file)) over all runs """
+
+		low = np.argmin(self.std)
+		high = np.argmax(self.std)
+
+		return ((self.std[low], self.std[high]), (int(self.runs[low]), int(self.runs[high])))
+
+class join_result(object):
+	""" The color summary and perf counters of the runs found in both the CL
+	    and PF twins of a leaf """
+
+	__slots__ = ('runs', 'std', 'alld_pages', 'rest_pages', 'miss_rate', 'time')
+
+	def __init__(self, runs, std, alld_pages, rest_pages, miss_rate, time):
+		self.runs = np.asarray(runs, dtype = np.int64)
+		self.std = np.asarray(std, dtype = np.float64)
+		self.alld_pages = np.asarray(alld_pages, dtype = np.int64)
+		self.rest_pages = np.asarray(rest_pages, dtype = np.int64)
+		self.miss_rate = np.asarray(miss_rate, dtype = np.float64)
+		self.time = np.asarray(time, dtype = np.float64)
+
+		return
+
+	def __len__(self):
+		return len(self.runs)
+
+	def alld_share(self):
+		""" Return the fraction of the pages of every run in the allowed colors """
+
+		total = self.alld_pages + self.rest_pages
+
+		return self.alld_pages.astype(np.float64) / np.maximum(total, 1)
+
+class performance_result(object):
+	""" The miss-rate and time samples of every utilization of a corun directory.
+	    The box of a utilization with many runs is a run_summary of its samples """
+
+	__slots__ = ('utilization', 'miss_rate', 'time')
+
+	def __init__(self):
+		self.utilization = []
+		self.miss_rate = []
+		self.time = []
+
+		return
+
+	def __len__(self):
+		return len(self.utilization)
+
+	def add(self, util, leaf):
+		""" Append the samples of a perf leaf as the box of a utilization """
+
+		if len(leaf) > SUMMARY_RUNS:
+			self.add_summaries(util, run_summary(leaf.miss_rate(), leaf.runs), run_summary(leaf.time_ms(), leaf.runs))
+			return
+
+		self.utilization.append(util)
+		self.miss_rate.append(leaf.miss_rate())
+		self.time.append(leaf.time_ms())
+
+		return
+
+	def add_summaries(self, util, miss_rate, time):
+		""" Append the run_summary of the miss-rate and time of a utilization as its box """
+
+		self.utilization.append(util)
+		self.miss_rate.append(miss_rate)
+		self.time.append(time)
+
+		return
+
+def summary_text(name, values, runs):
+	""" Return ' | <name> mean (std) [max @ run] (min @ run)' for the samples of some runs """
+
+	# Only the moments and extrema are printed, so no quantiles are sketched
+	moments = moment_stats()
+	moments.add_array(values, runs)
+
+	return moments.text(name)
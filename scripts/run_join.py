@@ -0,0 +1,289 @@
+########################################################################################
+#
+# File
+#	run_join.py
+#
+# Description
+#	This file contains the join of the color (CL) and perf (PF) data of every
+#	run. The runs of each CL leaf are aligned with the runs of its PF twin, so
+#	the deviation and allowed/restricted split of the page colors sit next to
+#	the miss-rate and time of the same run. Correlations and regressions are
+#	computed for all the groups at once from per-group sums
+#
+########################################################################################
+
+import sys, getopt
+import os
+import numpy as np
+
+from data_source import DATA_ROOT
+from catalog import open_catalog, scan_catalog, query_catalog, DIMENSIONS
+from results import join_result
+from mem_plots import load_performance_data
+from mem_colors_single import load_clr_data
+from worker_pool import close_pool
+
+# Pairs of (x, y) columns whose relation is reported
+RELATIONS = [('std', 'miss_rate'), ('std', 'time'), ('alld_share', 'miss_rate')]
+
+# Short names of the columns in the report
+LABELS = {'std' : 'std', 'alld_share' : 'alld', 'miss_rate' : 'MR', 'time' : 'TM'}
+
+# Columns explaining the miss-rate and time in the pooled regression
+REGRESSORS = ['std', 'alld_share']
+
+# Fraction of the runs of a group counted as its most and least uniform
+QUARTER = 0.25
+
+def join_leaf(cl_dir, platform, jobs = 1):
+	""" Return the join_result of a CL leaf and its PF twin. Runs missing from
+	    either of them are left out """
+
+	colors = load_clr_data(cl_dir, jobs)
+	perf = load_performance_data(cl_dir.replace('/CL/', '/PF/'), platform, jobs)
+
+	# Both results hold their runs in ascending order
+	runs, cl_index, pf_index = np.intersect1d(colors.runs, perf.runs, assume_unique = True, return_indices = True)
+
+	return join_result(runs, colors.std[cl_index], colors.alld_pages[cl_index], colors.rest_pages[cl_index],
+			   perf.miss_rate()[pf_index], perf.time_ms()[pf_index])
+
+def join_campaign(connection, jobs = 1, **conditions):
+	""" Return a list of (catalog row, join_result) for every CL leaf matching the
+	    conditions whose PF twin is part of the catalog """
+
+	conditions['data'] = 'CL'
+	perf_paths = set([row['path'] for row in query_catalog(connection, **dict(conditions, data = 'PF'))])
+	joined = []
+
+	for row in query_catalog(connection, **conditions):
+		if row['path'].replace('/CL/', '/PF/') not in perf_paths:
+			continue
+
+		joined.append((row, join_leaf(os.path.join(DATA_ROOT, row['path']) + '/', row['platform'], jobs)))
+
+	return joined
+
+def join_table(joined):
+	""" Stack the joined leaves into a hash of column arrays. The 'leaf' column
+	    holds the position in 'joined' of the leaf of every run """
+
+	results = [result for row, result in joined]
+
+	table = {}
+	table['leaf'] = np.repeat(np.arange(len(results)), [len(result) for result in results])
+	table['run'] = np.concatenate([result.runs for result in results] or [np.zeros(0, dtype = np.int64)])
+
+	for name, column in [('std', lambda result : result.std), ('alld_share', lambda result : result.alld_share()),
+			     ('miss_rate', lambda result : result.miss_rate), ('time', lambda result : result.time)]:
+		table[name] = np.concatenate([column(result) for result in results] or [np.zeros(0)])
+
+	return table
+
+def group_ranks(groups, values):
+	""" Return the rank of every value within its group, counted from zero. Tied
+	    values share the average of their ranks """
+
+	order = np.lexsort((values, groups))
+	sorted_groups = groups[order]
+	sorted_values = values[order]
+	ranks = np.arange(len(values)) - np.searchsorted(sorted_groups, sorted_groups, 'left')
+
+	# Number the blocks of equal values within a group and average their ranks
+	starts = np.ones(len(values), dtype = bool)
+	starts[1:] = (sorted_groups[1:] != sorted_groups[:-1]) | (sorted_values[1:] != sorted_values[:-1])
+	blocks = np.cumsum(starts) - 1
+
+	averaged = np.empty(len(values))
+	averaged[order] = (np.bincount(blocks, ranks) / np.bincount(blocks))[blocks]
+
+	return averaged
+
+def group_fit(groups, x, y, count):
+	""" Return a hash of per-group arrays 'runs', 'r', 'slope' and 'intercept' of
+	    the least squares line of y on x, all computed from the group sums """
+
+	# Centre the columns, so the sums of squares do not cancel out
+	x_mean = x.mean() if len(x) else 0.0
+	y_mean = y.mean() if len(y) else 0.0
+	x = x - x_mean
+	y = y - y_mean
+
+	sums = dict((name, np.bincount(groups, weights, minlength = count)) for name, weights in
+		    [('x', x), ('y', y), ('xx', x * x), ('yy', y * y), ('xy', x * y)])
+	runs = np.bincount(groups, minlength = count).astype(np.float64)
+
+	sxx = runs * sums['xx'] - sums['x'] ** 2
+	syy = runs * sums['yy'] - sums['y'] ** 2
+	sxy = runs * sums['xy'] - sums['x'] * sums['y']
+
+	fit = {'runs' : runs}
+	with np.errstate(divide = 'ignore', invalid = 'ignore'):
+		fit['r'] = sxy / np.sqrt(sxx * syy)
+		fit['slope'] = sxy / sxx
+		fit['intercept'] = (sums['y'] - fit['slope'] * sums['x']) / runs + y_mean - fit['slope'] * x_mean
+
+	return fit
+
+def group_statistics(groups, table, count):
+	""" Return a hash of per-group arrays with the Pearson 'r' and Spearman 'rho'
+	    of every relation, the slope of the miss-rate on the deviation and the
+	    'gain', the miss-rate of the least uniform quarter of the runs less that
+	    of the most uniform quarter """
+
+	statistics = {}
+	ranks = dict((name, group_ranks(groups, table[name])) for name in set([name for pair in RELATIONS for name in pair]))
+
+	for x, y in RELATIONS:
+		fit = group_fit(groups, table[x], table[y], count)
+		statistics['runs'] = fit['runs']
+		statistics['r', x, y] = fit['r']
+		statistics['rho', x, y] = group_fit(groups, ranks[x], ranks[y], count)['r']
+
+		if (x, y) == ('std', 'miss_rate'):
+			statistics['slope'] = fit['slope']
+
+	# Split the runs of every group by the rank of their deviation
+	share = ranks['std'] / np.maximum(statistics['runs'][groups] - 1, 1)
+	with np.errstate(divide = 'ignore', invalid = 'ignore'):
+		uniform = np.bincount(groups, table['miss_rate'] * (share <= QUARTER), minlength = count) / np.bincount(groups, share <= QUARTER, minlength = count)
+		skewed = np.bincount(groups, table['miss_rate'] * (share >= 1 - QUARTER), minlength = count) / np.bincount(groups, share >= 1 - QUARTER, minlength = count)
+
+	statistics['gain'] = skewed - uniform
+
+	return statistics
+
+def pooled_regression(groups, table, response, count):
+	""" Return the (coefficients, r_squared) of the least squares fit of the
+	    response on the REGRESSORS within the groups. Every group keeps its own
+	    level, so only the variation inside a leaf explains the response """
+
+	runs = np.maximum(np.bincount(groups, minlength = count), 1)
+
+	def within(column):
+		return column - (np.bincount(groups, column, minlength = count) / runs)[groups]
+
+	design = np.column_stack([within(table[name]) for name in REGRESSORS])
+	target = within(table[response])
+
+	coefficients = np.linalg.lstsq(design, target, rcond = None)[0]
+	residual = target - design.dot(coefficients)
+	total = target.dot(target)
+
+	return coefficients, (1 - residual.dot(residual) / total) if total > 0 else 0.0
+
+def leaf_labels(joined):
+	""" Return an array naming the leaf of every joined result """
+
+	return np.array(['_'.join([row[dimension] for dimension in DIMENSIONS if dimension != 'data']) for row, result in joined])
+
+def print_groups(title, labels, table):
+	""" Print a line of group statistics for every distinct label of the runs """
+
+	names, first, groups = np.unique(labels, return_index = True, return_inverse = True)
+	statistics = group_statistics(groups, table, len(names))
+
+	relations = ['%s/%s' % (LABELS[x], LABELS[y]) for x, y in RELATIONS]
+	print '\n%-28s %5s' % (title, 'runs') + ''.join(['%12s %7s' % ('r ' + relation, 'rho') for relation in relations]) + '%10s %10s' % ('slope', 'gain')
+
+	# List the groups in the numeric order of the catalog
+	for index in np.argsort(first):
+		line = '%-28s %5d' % (names[index], statistics['runs'][index])
+		line += ''.join(['%12.3f %7.3f' % (statistics['r', x, y][index], statistics['rho', x, y][index]) for x, y in RELATIONS])
+		line += '%10.3f %10.3f' % (statistics['slope'][index], statistics['gain'][index])
+		print line
+
+	return
+
+def print_report(joined, table):
+	""" Print the statistics by leaf, by corun, by utilization and for the
+	    pooled fit of all runs """
+
+	rows = [row for row, result in joined]
+
+	print_groups('Leaf', leaf_labels(joined)[table['leaf']], table)
+	print_groups('Corun', np.array(['corun ' + row['corun'] for row in rows])[table['leaf']], table)
+	print_groups('Utilization', np.array(['util ' + row['utilization'] for row in rows])[table['leaf']], table)
+
+	print '\nPooled within-leaf regression over %d runs of %d leaves' % (len(table['run']), len(rows))
+	for response in ('miss_rate', 'time'):
+		coefficients, r_squared = pooled_regression(table['leaf'], table, response, len(rows))
+		print '  %-10s = ' % (response) + ' + '.join(['%.4f * %s' % (value, name) for value, name in zip(coefficients, REGRESSORS)]) + '  (R^2 %.3f)' % (r_squared)
+
+	print '\nA positive gain means the most uniform quarter of the runs had the lower miss-rate'
+
+	return
+
+def main(argv):
+
+	# Create an internal help function for printing help information
+	def help():
+
+		print 'run_join.py [-s] [-p <platform>] [-b <benchmark>] [-l <linux>] [-a <buddy>] [-c <corun>] [-u <utilization>] [-j <jobs>] [-o <file>]'
+		print 'Joins the color and perf data of every run of the CL leaves matching the given dimensions and reports the'
+		print 'correlation of the color deviation and allowed page share with the miss-rate and time, by leaf, by corun'
+		print 'and by utilization. The dimensions take the same values, wildcards and comparisons as \'catalog.py\''
+		print 'Use -s to rescan the data tree first and -o to store the joined runs as a CSV file'
+
+		return
+
+	# Map the options to the dimensions they filter
+	options = {'-p' : 'platform', '-b' : 'benchmark', '-l' : 'linux', '-a' : 'buddy', '-c' : 'corun', '-u' : 'utilization'}
+	conditions = {}
+	scan = False
+	jobs = 1
+	output = None
+
+	try:
+		opts, args = getopt.getopt(argv, "hsp:b:l:a:c:u:j:o:", ["scan", "jobs=", "output="] + [options[option] + '=' for option in options])
+	except:
+		help()
+		sys.exit(2)
+
+	for opt, arg in opts:
+		if opt == '-h':
+			help()
+			sys.exit()
+		elif opt in ("-s", "--scan"):
+			scan = True
+		elif opt in ("-j", "--jobs"):
+			jobs = int(arg)
+		elif opt in ("-o", "--output"):
+			output = arg
+		elif opt in options:
+			conditions[options[opt]] = arg.split(',')
+		else:
+			conditions[opt[2:]] = arg.split(',')
+
+	connection = open_catalog()
+
+	# An empty catalog is always filled first
+	if scan or connection.execute('SELECT COUNT(*) FROM leaves').fetchone()[0] == 0:
+		scan_catalog(connection)
+
+	try:
+		joined = join_campaign(connection, jobs, **conditions)
+	finally:
+		close_pool()
+		connection.close()
+
+	if not joined:
+		print 'No CL leaf with a PF twin matches the given dimensions'
+		sys.exit(1)
+
+	table = join_table(joined)
+	print_report(joined, table)
+
+	# Store one line for every joined run
+	if output is not None:
+		leaves = leaf_labels(joined)
+		with open(output, 'w') as fdo:
+			fdo.write('leaf,run,std,alld_share,miss_rate,time\n')
+			fdo.writelines(['%s,%d,%.6f,%.6f,%.6f,%.6f\n' % item for item in
+					zip(leaves[table['leaf']], table['run'].tolist(), table['std'].tolist(), table['alld_share'].tolist(), table['miss_rate'].tolist(), table['time'].tolist())])
+
+	return
+
+if __name__ == "__main__":
+	# Invoke the main function
+	main(sys.argv[1:])
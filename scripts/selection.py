@@ -0,0 +1,109 @@
+########################################################################################
+#
+# File
+#	selection.py
+#
+# Description
+#	This file contains the selection of runs by order statistics. The runs with
+#	the extreme, top-k, bottom-k or percentile values of a metric are found
+#	with partial sorts over the arrays of a leaf instead of sorting every run
+#
+########################################################################################
+
+import re
+import numpy as np
+
+# Default selection, which names the figures of the extreme runs 'MN' and 'MX'
+DEFAULT_SELECTION = ['min', 'max']
+
+# A single item of a selection, e.g. 'min', 'max', 'top3', 'bottom5' or 'p90'
+item_regex = re.compile(r'^(min|max|top(\d+)|bottom(\d+)|p(\d+(?:\.\d+)?))$')
+
+def parse_selection(text):
+	""" Split a comma separated selection into its items, raising ValueError on
+	    an unknown item """
+
+	items = [item.strip().lower() for item in text.split(',') if item.strip()]
+
+	for item in items:
+		if not item_regex.match(item) or (item.startswith('p') and float(item[1:]) > 100):
+			raise ValueError, 'Unknown run selection (%s)' % (item)
+
+	return items
+
+def boundary_indices(values, count, beyond, kth):
+	""" Return the indices marked in 'beyond', followed by the lowest indices
+	    of the values equal to 'kth' up to 'count' indices in all """
+
+	indices = np.nonzero(beyond)[0]
+	ties = np.nonzero(values == kth)[0][:count - len(indices)]
+
+	return np.concatenate((indices, ties))
+
+def top_indices(values, count):
+	""" Return the indices of the 'count' largest values, largest first. Ties
+	    go to the lowest index, as in a stable sort """
+
+	count = min(count, len(values))
+	if count == 0:
+		return np.zeros(0, dtype = np.int64)
+
+	# Partition out the value of the last pick and only sort the picks
+	kth = -np.partition(-values, count - 1)[count - 1]
+	indices = boundary_indices(values, count, values > kth, kth)
+
+	return indices[np.lexsort((indices, -values[indices]))]
+
+def bottom_indices(values, count):
+	""" Return the indices of the 'count' smallest values, smallest first. Ties
+	    go to the lowest index, as in a stable sort """
+
+	count = min(count, len(values))
+	if count == 0:
+		return np.zeros(0, dtype = np.int64)
+
+	kth = np.partition(values, count - 1)[count - 1]
+	indices = boundary_indices(values, count, values < kth, kth)
+
+	return indices[np.lexsort((indices, values[indices]))]
+
+def percentile_index(values, percent):
+	""" Return the index of the run holding the given percentile, taking the
+	    nearest order statistic of a stable sort """
+
+	rank = int(round(percent / 100.0 * (len(values) - 1)))
+	kth = np.partition(values, rank)[rank]
+
+	# The runs tied with the percentile follow each other in index order
+	return np.nonzero(values == kth)[0][rank - np.count_nonzero(values < kth)]
+
+def select_runs(values, runs, selection = None):
+	""" Return a list of (type, run, value) for every item of the selection, where
+	    'type' names the figure of the run ('MN', 'MX', 'T1'.., 'B1'.., 'P90').
+	    Without a selection the DEFAULT_SELECTION is used """
+
+	selection = DEFAULT_SELECTION if selection is None else selection
+	values = np.asarray(values, dtype = np.float64)
+	runs = np.asarray(runs)
+	selected = []
+
+	if len(values) == 0:
+		return selected
+
+	for item in selection:
+		match = item_regex.match(item)
+
+		if item == 'min':
+			picks = [('MN', bottom_indices(values, 1)[0])]
+		elif item == 'max':
+			picks = [('MX', top_indices(values, 1)[0])]
+		elif match.group(2):
+			picks = [('T%d' % (rank + 1), index) for rank, index in enumerate(top_indices(values, int(match.group(2))))]
+		elif match.group(3):
+			picks = [('B%d' % (rank + 1), index) for rank, index in enumerate(bottom_indices(values, int(match.group(3))))]
+		else:
+			picks = [('P' + match.group(4).replace('.', '_'), percentile_index(values, float(match.group(4))))]
+
+		selected += [(bins_type, int(runs[index]), values[index]) for bins_type, index in picks]
+
+	return selected
@@ -0,0 +1,176 @@
+########################################################################################
+#
+# File
+#	synth_data.py
+#
+# Description
+#	This file contains a generator for synthetic data trees in the layout of
+#	'format.log'. Perf logs of the TG and XE platforms and color logs with
+#	28 / 24 color bins are written with a configurable number of runs, along
+#	with an optional memory page profile for 'mem_accesses.py'
+#
+########################################################################################
+
+import sys, getopt
+import os
+import random
+
+from perf_parser import PERF_EVENTS
+
+# Number of cache colors of each platform
+PLATFORM_COLORS = {'TG' : 28, 'XE' : 24}
+
+# Default shape of the generated tree
+UTILIZATIONS = ['25', '37', '50', '63', '75', '87', '100']
+CORUNNERS = ['00', '01', '02', '03']
+
+def perf_log_text(platform, corun, util, rng):
+	""" Return the text of a single perf log. The miss-rate and time grow with
+	    the utilization and the number of co-runners, like in real campaigns """
+
+	load = (int(util) / 100.0) * (1 + 0.25 * int(corun))
+
+	accesses = int(rng.gauss(4.0e7, 2.0e6))
+	misses = int(accesses * min(0.95, max(0.001, rng.gauss(0.05 + 0.15 * load, 0.03))))
+	time = max(0.05, rng.gauss(0.9 + 0.6 * load, 0.1))
+
+	text  = '\n Performance counter stats for \'./bandwidth -m 1536 -t 1000\':\n\n'
+	text += '%19s %-20s\n' % ('{:,}'.format(accesses), PERF_EVENTS[platform][0])
+	text += '%19s %-20s\n\n' % ('{:,}'.format(misses), PERF_EVENTS[platform][1])
+	text += '%19.9f seconds time elapsed\n\n' % (time)
+
+	return text
+
+def color_log_text(colors, util, rng):
+	""" Return the text of a single color log with the page counts of 'colors' bins """
+
+	# Spread the pages of the working set unevenly over the bins
+	mean = 30 * int(util) / 100.0
+	pages = [max(0, int(rng.gauss(mean, rng.uniform(0.5, 10.0)))) for color in range(colors)]
+
+	text = '### Total Pages : %d\n' % (sum(pages))
+	text += ''.join(['Color %2d : %d\n' % (color, count) for color, count in enumerate(pages)])
+
+	return text
+
+def write_leaf(leaf_dir, runs, text_function, *args):
+	""" Write the numbered run files of a single leaf directory """
+
+	if not os.path.isdir(leaf_dir):
+		os.makedirs(leaf_dir)
+
+	for run in range(1, runs + 1):
+		with open(os.path.join(leaf_dir, str(run)), 'w') as fdo:
+			fdo.write(text_function(*args))
+
+	return
+
+def write_tree(root, platforms = ['TG', 'XE'], benchmarks = ['BW'], linux_types = ['UN'], buddy_types = ['PL'], coruns = CORUNNERS, utilizations = UTILIZATIONS, runs = 250, seed = 1):
+	""" Write a synthetic data tree below 'root' and return the number of leaves """
+
+	rng = random.Random(seed)
+	leaves = 0
+
+	for platform in platforms:
+		for benchmark in benchmarks:
+			for linux in linux_types:
+				for buddy in buddy_types:
+					for corun in coruns:
+						for util in utilizations:
+							config_dir = os.path.join(root, 'data', platform, benchmark, linux, buddy)
+
+							write_leaf(os.path.join(config_dir, 'PF', corun, util), runs, perf_log_text, platform, corun, util, rng)
+							write_leaf(os.path.join(config_dir, 'CL', corun, util), runs, color_log_text, PLATFORM_COLORS[platform], util, rng)
+							leaves += 2
+
+	return leaves
+
+def write_mempages(root, areas = 16, pages = 100000, seed = 1):
+	""" Write a memory area profile and a page access profile for 'mem_accesses.py' """
+
+	rng = random.Random(seed)
+	mem_dir = os.path.join(root, 'data_1')
+
+	if not os.path.isdir(mem_dir):
+		os.makedirs(mem_dir)
+
+	# Lay the memory areas out with gaps between them
+	area_list = []
+	start = 0x400000
+	for area in range(areas):
+		end = start + 0x1000 * rng.randint(0x100, 0x4000)
+		area_list.append((start, end))
+		start = end + 0x1000 * rng.randint(0x10, 0x1000)
+
+	with open(os.path.join(mem_dir, 'memareas.profile'), 'w') as fdo:
+		for area, (start, end) in enumerate(area_list):
+			fdo.write('%x-%x r-xp 00000000 08:01 %d    /lib/area%d.so\n' % (start, end, 1000 + area, area))
+
+	# Scatter the accessed pages over the areas, in the unsorted order of the tool
+	with open(os.path.join(mem_dir, 'mempages.dat.out'), 'w') as fdo:
+		for page in rng.sample(xrange(0x400, start >> 12), min(pages, (start >> 12) - 0x400)):
+			fdo.write('%x : %d\n' % (page << 12, rng.randint(1, 256)))
+
+	return
+
+def main(argv):
+
+	# Create an internal help function for printing help information
+	def help():
+
+		print 'synth_data.py -o <root> [-p <platforms>] [-c <coruns>] [-u <utilizations>] [-r <runs>] [-s <seed>] [-m <pages>]'
+		print 'Writes <root>/data/<Platform>/BW/UN/PL/{PF,CL}/<Corun>/<Utilization>/<run> for every combination'
+		print 'Use -m <pages> to also write <root>/data_1 with a memory page profile of <pages> pages'
+
+		return
+
+	# Assign default values to command line arguments
+	root		= None
+	platforms	= ['TG', 'XE']
+	coruns		= CORUNNERS
+	utilizations	= UTILIZATIONS
+	runs		= 250
+	seed		= 1
+	pages		= 0
+
+	try:
+		opts, args = getopt.getopt(argv, "ho:p:c:u:r:s:m:", ["output=", "platform=", "corun=", "utilization=", "runs=", "seed=", "mempages="])
+	except:
+		help()
+		sys.exit(2)
+
+	for opt, arg in opts:
+		if opt == '-h':
+			help()
+			sys.exit()
+		elif opt in ("-o", "--output"):
+			root = arg
+		elif opt in ("-p", "--platform"):
+			platforms = arg.split(',')
+		elif opt in ("-c", "--corun"):
+			coruns = arg.split(',')
+		elif opt in ("-u", "--utilization"):
+			utilizations = arg.split(',')
+		elif opt in ("-r", "--runs"):
+			runs = int(arg)
+		elif opt in ("-s", "--seed"):
+			seed = int(arg)
+		elif opt in ("-m", "--mempages"):
+			pages = int(arg)
+
+	if root is None or [x for x in platforms if x not in PLATFORM_COLORS]:
+		help()
+		sys.exit(2)
+
+	leaves = write_tree(root, platforms, coruns = coruns, utilizations = utilizations, runs = runs, seed = seed)
+	print 'Wrote %d leaves of %d runs below %s' % (leaves, runs, os.path.join(root, 'data'))
+
+	if pages:
+		write_mempages(root, pages = pages, seed = seed)
+		print 'Wrote a profile of %d pages below %s' % (pages, os.path.join(root, 'data_1'))
+
+	return
+
+if __name__ == "__main__":
+	# Invoke the main function
+	main(sys.argv[1:])
@@ -0,0 +1,76 @@
+########################################################################################
+#
+# File
+#	worker_pool.py
+#
+# Description
+#	This file contains a process pool shared by all the scripts. Work items are
+#	spread over the worker processes and the results are always returned in
+#	the order of the items, so merging them stays deterministic
+#
+########################################################################################
+
+import multiprocessing
+
+from instrument import stage_open, timed_job, add_worker_time
+
+# The pool shared by all callers and the number of its workers
+shared_pool = None
+shared_jobs = 0
+
+def job_count(jobs):
+	""" Resolve the requested number of jobs, where 0 means every core """
+
+	if jobs == 0:
+		return multiprocessing.cpu_count()
+
+	return max(1, jobs)
+
+def get_pool(jobs):
+	""" Return the shared pool, creating it on first use """
+	global shared_pool, shared_jobs
+
+	jobs = job_count(jobs)
+
+	if shared_pool is not None and shared_jobs != jobs:
+		close_pool()
+
+	if shared_pool is None:
+		shared_pool = multiprocessing.Pool(jobs)
+		shared_jobs = jobs
+
+	return shared_pool
+
+def close_pool():
+	""" Shut down the shared pool """
+	global shared_pool, shared_jobs
+
+	if shared_pool is not None:
+		shared_pool.close()
+		shared_pool.join()
+
+	shared_pool = None
+	shared_jobs = 0
+
+	return
+
+def pool_map(function, items, jobs = 1):
+	""" Apply a top-level function to every item and return the results in order """
+
+	items = list(items)
+
+	# Small batches and serial runs are not worth the inter-process traffic
+	if job_count(jobs) == 1 or len(items) < 2:
+		return [function(item) for item in items]
+
+	pool = get_pool(jobs)
+	chunksize = max(1, len(items) / (4 * shared_jobs))
+
+	# The time of the workers is not part of this process, so while a stage
+	# is recorded every job sends its own back
+	if stage_open():
+		results = pool.map(timed_job, [(function, item) for item in items], chunksize)
+		add_worker_time(sum([times[0] for result, times in results]), sum([times[1] for result, times in results]))
+		return [result for result, times in results]
+
+	return pool.map(function, items, chunksize)